@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Find duplicate question images and point every reference at one copy.
+Usage: python3 asset_store.py [--dedupe] [--prune] [--store] [--threshold 3]
+
+The extract scripts write each crop to its own fixed filename, so identical
+artwork (a passage cropped twice, instruction art shared across booklets) is
+downloaded and cached once per name. This scans images/ and reports:
+    exact duplicates  - files whose decoded pixels hash the same (SHA-256)
+    near duplicates   - pairs whose perceptual hash (a 16x16 difference hash)
+                        differs in at most --threshold of 256 bits; these are
+                        only reported, since "almost the same" needs a human
+    unreferenced      - images no data/<exam>.json file points at
+
+The data files keep naming every image by its extracted path, so
+regenerating them (generate_nvr_json.py, ingest_text.py) cannot undo a merge.
+With --dedupe, every exact duplicate is mapped to the group's canonical file
+(the most referenced one, then the shortest path) in data/image-map.json, and
+question_bank.py writes the shards with the canonical paths. --prune deletes
+images no shard uses any more. --store goes further for deployment: every
+referenced image is copied to images/store/<content hash>.<ext> and mapped to
+that name, which server.py serves as immutable. Re-run --store after
+re-extracting images, since the map keeps pointing at the old copies.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+from PIL import Image
+
+from image_variants import VARIANT_DIR
+from question_bank import DATA_DIR, EXAMS, IMAGE_MAP_PATH, write_manifest
+
+IMAGE_DIR = "images"
+STORE_DIR = os.path.join(IMAGE_DIR, "store")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".avif", ".svg")
+
+# Perceptual hash size: HASH_SIZE x HASH_SIZE bits
+HASH_SIZE = 16
+DEFAULT_THRESHOLD = 3
+
+# Store names use this many hex characters of the content hash
+STORE_HASH_LENGTH = 16
+
+
+def data_paths():
+    """Return the editable exam data files (not the generated shards)."""
+    return [os.path.join(DATA_DIR, f"{exam}.json") for exam in EXAMS]
+
+
+def image_files(root=IMAGE_DIR):
+    """Return every PNG/JPEG under root except the store and variants, sorted."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in sorted(dirnames) if os.path.join(dirpath, d) not in (STORE_DIR, VARIANT_DIR)]
+        paths.extend(
+            os.path.join(dirpath, name).replace(os.sep, "/") for name in sorted(filenames)
+            if name.lower().endswith((".png", ".jpg", ".jpeg"))
+        )
+    return paths
+
+
+def find_references(text):
+    """Count the quoted image paths in a data file's text."""
+    counts = {}
+    for chunk in text.split('"')[1::2]:
+        if chunk.startswith(IMAGE_DIR + "/") and chunk.lower().endswith(IMAGE_EXTENSIONS):
+            counts[chunk] = counts.get(chunk, 0) + 1
+    return counts
+
+
+def load_references():
+    """
+    Read every data file and count its image references.
+
+    Returns:
+        Tuple of (data path -> text, image path -> reference count)
+    """
+    texts, counts = {}, {}
+    for path in data_paths():
+        with open(path, encoding="utf-8") as f:
+            texts[path] = f.read()
+        for image, count in find_references(texts[path]).items():
+            counts[image] = counts.get(image, 0) + count
+    return texts, counts
+
+
+def load_image_map(path=IMAGE_MAP_PATH):
+    """Return the stored map: {"duplicates": {path: canonical}, "store": {path: store path}}."""
+    image_map = {"duplicates": {}, "store": {}}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            image_map.update(json.load(f))
+    return image_map
+
+
+def save_image_map(image_map, path=IMAGE_MAP_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(image_map, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def resolve_references(references, duplicates):
+    """Count references by the file the shards use, after mapping duplicates to their canonical copy."""
+    resolved = {}
+    for path, count in references.items():
+        target = duplicates.get(path, path)
+        resolved[target] = resolved.get(target, 0) + count
+    return resolved
+
+
+def pixel_digest(image):
+    """SHA-256 of an image's decoded pixels, so re-encoded copies still match."""
+    sha = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode())
+    sha.update(image.tobytes())
+    return sha.hexdigest()
+
+
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def perceptual_hash(image, size=HASH_SIZE):
+    """
+    Difference hash: whether each pixel is brighter than its right neighbour,
+    on a (size + 1) x size greyscale thumbnail.
+
+    Returns:
+        Boolean array of size * size bits
+    """
+    thumb = image.convert("L").resize((size + 1, size), Image.Resampling.BOX)
+    pixels = np.asarray(thumb, dtype=np.int16)
+    return (pixels[:, 1:] > pixels[:, :-1]).ravel()
+
+
+def scan(paths):
+    """
+    Hash every image.
+
+    Returns:
+        Tuple of (path -> pixel digest, list of paths, bit matrix of perceptual hashes)
+    """
+    digests = {}
+    hashes = []
+    for path in paths:
+        with Image.open(path) as image:
+            digests[path] = pixel_digest(image)
+            hashes.append(perceptual_hash(image))
+    return digests, paths, np.array(hashes)
+
+
+def exact_groups(digests):
+    """Return lists of paths sharing a pixel digest (groups of two or more)."""
+    groups = {}
+    for path, digest in digests.items():
+        groups.setdefault(digest, []).append(path)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+def near_pairs(paths, hashes, digests, threshold):
+    """
+    Find pairs of distinct images whose perceptual hashes are within threshold bits.
+
+    Returns:
+        List of (distance, path_a, path_b), closest first
+    """
+    if len(paths) < 2:
+        return []
+    # Hamming distance between every pair at once
+    distances = (hashes[:, None, :] != hashes[None, :, :]).sum(axis=2)
+    rows, cols = np.nonzero(np.triu(distances <= threshold, k=1))
+    pairs = [
+        (int(distances[i, j]), paths[i], paths[j]) for i, j in zip(rows, cols)
+        if digests[paths[i]] != digests[paths[j]]
+    ]
+    return sorted(pairs)
+
+
+def canonical(group, references):
+    """Pick the copy to keep: the most referenced, then the shortest path."""
+    return min(group, key=lambda path: (-references.get(path, 0), len(path), path))
+
+
+def rewrite_references(texts, mapping):
+    """
+    Replace quoted image paths in the data files.
+
+    Args:
+        texts: Data path -> file text
+        mapping: Old image path -> new image path
+
+    Returns:
+        List of data files that changed
+    """
+    changed = []
+    for path, text in texts.items():
+        updated = text
+        for old, new in mapping.items():
+            updated = updated.replace(f'"{old}"', f'"{new}"')
+        if updated != text:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(updated)
+            texts[path] = updated
+            changed.append(path)
+    return changed
+
+
+def store_path(path):
+    """Return the content-addressed store path for an image file."""
+    extension = os.path.splitext(path)[1].lower()
+    return f"{STORE_DIR}/{file_digest(path)[:STORE_HASH_LENGTH]}{extension}"
+
+
+def publish(references):
+    """
+    Copy every referenced image into the store.
+
+    Returns:
+        Mapping of original path -> store path
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    mapping = {}
+    for path in sorted(references):
+        if path.startswith(STORE_DIR + "/") or not os.path.exists(path):
+            continue
+        target = store_path(path)
+        if not os.path.exists(target):
+            shutil.copyfile(path, target)
+        mapping[path] = target
+    return mapping
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and merge duplicate question images.")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Point references to exact duplicates at one canonical file")
+    parser.add_argument("--prune", action="store_true", help="Delete images that no data file references")
+    parser.add_argument("--store", action="store_true",
+                        help=f"Copy referenced images to {STORE_DIR}/<hash> and reference those")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help=f"Perceptual hash bits that may differ for a near duplicate "
+                             f"(of {HASH_SIZE * HASH_SIZE}, default: {DEFAULT_THRESHOLD})")
+    args = parser.parse_args()
+
+    _, references = load_references()
+    image_map = load_image_map()
+    references = resolve_references(references, image_map["duplicates"])
+    paths = image_files()
+    digests, paths, hashes = scan(paths)
+
+    groups = exact_groups(digests)
+    print(f"Scanned {len(paths)} images, {len(references)} referenced by data files\n")
+
+    print(f"Exact duplicates: {len(groups)} group(s)")
+    mapping = {}
+    for group in groups:
+        keep = canonical(group, references)
+        print(f"  {keep} ({os.path.getsize(keep) / 1024:.0f} KB)")
+        for path in group:
+            if path != keep:
+                print(f"    = {path} ({references.get(path, 0)} reference(s))")
+                mapping[path] = keep
+
+    pairs = near_pairs(paths, hashes, digests, args.threshold)
+    print(f"\nNear duplicates (<= {args.threshold} bits): {len(pairs)} pair(s)")
+    for distance, a, b in pairs:
+        print(f"  {distance:>3}  {a}  ~  {b}")
+
+    unreferenced = [path for path in paths if path not in references]
+    missing = sorted(path for path in references if not os.path.exists(path))
+    print(f"\nUnreferenced: {len(unreferenced)} image(s)")
+    for path in unreferenced:
+        print(f"  {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+    for path in missing:
+        print(f"  ! referenced but missing: {path}")
+
+    changed = False
+    if args.dedupe and mapping:
+        moved = sum(references.get(old, 0) for old in mapping)
+        duplicates = image_map["duplicates"]
+        # Earlier merges whose canonical copy is now a duplicate itself
+        for old, target in duplicates.items():
+            duplicates[old] = mapping.get(target, target)
+        duplicates.update(mapping)
+        for old in mapping:
+            references[mapping[old]] = references.get(mapping[old], 0) + references.pop(old, 0)
+        changed = True
+        print(f"\n✓ {moved} reference(s) to duplicates mapped to their canonical copy")
+
+    if args.prune:
+        # Duplicates whose references were just moved are unreferenced now too
+        for path in sorted(set(unreferenced) | {p for p in mapping if p not in references}):
+            os.remove(path)
+            print(f"✓ Removed {path}")
+
+    if args.store:
+        image_map["store"] = publish(references)
+        changed = True
+        print(f"\n✓ {len(set(image_map['store'].values()))} unique image(s) in {STORE_DIR}/ "
+              f"for {len(image_map['store'])} referenced path(s)")
+
+    if changed:
+        save_image_map(image_map)
+        print(f"✓ Updated {IMAGE_MAP_PATH}")
+        write_manifest()
+        print("✓ Regenerated test shards (re-run image_variants.py and build_precache.py before deploying)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Propose crop rectangles for a booklet instead of hand-tuning percentages.
+Usage: python3 auto_layout.py crops/maths.json [--booklet test1] [--pages 3-19] [--mode bands|diagrams] [--write]
+
+Two layouts are detected:
+    bands     - one full question per rectangle, for booklets like NVR where
+                each question is a horizontal strip. Rows of ink are found from
+                the page's row projection profile and whitespace gaps, then
+                grouped into questions at each numbered text block
+                ("12", "12.", "12)") down the left margin.
+    diagrams  - the bounding box of each figure, for booklets like maths where
+                the question text stays in HTML. Vector drawings and embedded
+                images from PyMuPDF are merged into clusters; pages without
+                vector content fall back to an XY-cut of the rendered ink with
+                the text blocks masked out.
+
+Proposals are matched to the booklet's existing crops on the same page by
+overlap. Without --write they are only printed; with --write matched crops get
+the new rect and unmatched proposals are added as new crops (outputs named by
+--output-pattern), so a new booklet needs one pass rather than a render loop.
+"""
+import argparse
+import os
+import re
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from extract import load_manifest, save_manifest
+from extract_engine import ExtractionEngine
+
+# Render zoom used for analysis; 1.0 is one pixel per point, plenty for layout
+ANALYSIS_ZOOM = 1.0
+
+# Grey level below which a pixel counts as ink
+INK_THRESHOLD = 200
+
+# Fractions of the page size
+MIN_GAP = 0.008        # whitespace that separates two rows of ink
+MIN_BAND = 0.004       # thinner rows are speckle or rules and are ignored
+MERGE_DISTANCE = 0.015 # drawings closer than this belong to the same figure
+MIN_DIAGRAM_AREA = 0.004
+PADDING = 0.006
+
+# Overlap (intersection over union) needed to treat a proposal as an existing crop
+MATCH_IOU = 0.3
+
+QUESTION_NUMBER_RE = re.compile(r"^\s*(\d{1,3})[.)]?(\s|$)")
+
+# Booklet names repeat across manifests ("test1"), so the manifest is part of the path
+DEFAULT_OUTPUT_PATTERN = "images/{manifest}/{booklet}/p{page}_{index}.png"
+
+
+def ink_mask(engine, pdf_path, page_num, threshold=INK_THRESHOLD):
+    """Render a page in grey and return a boolean array that is True where it has ink."""
+    grey = engine.crop_array(pdf_path, page_num, (0.0, 0.0, 1.0, 1.0), raster="grey", zoom=ANALYSIS_ZOOM)
+    return grey < threshold
+
+
+def find_runs(profile, min_gap, min_size):
+    """
+    Find runs of non-zero values in a projection profile.
+
+    Runs separated by fewer than min_gap empty entries are joined, and runs
+    shorter than min_size are dropped.
+
+    Args:
+        profile: 1-D array of ink counts per row or column
+        min_gap: Minimum gap length (entries) that separates two runs
+        min_size: Minimum run length (entries) to keep
+
+    Returns:
+        List of (start, end) pairs, end exclusive
+    """
+    filled = np.concatenate(([0], (profile > 0).astype(np.int8), [0]))
+    edges = np.diff(filled)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return []
+
+    # Join runs whose separating gap is too small
+    keep = np.concatenate(([True], starts[1:] - ends[:-1] >= min_gap))
+    starts = starts[keep]
+    ends = ends[np.concatenate((keep[1:], [True]))]
+
+    return [(int(s), int(e)) for s, e in zip(starts, ends) if e - s >= min_size]
+
+
+def ink_extent(mask):
+    """Return (x0, y0, x1, y1) of the ink in a mask, or None if it is empty."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def xy_cut(mask, min_gap, min_size, depth=0):
+    """
+    Recursively split a mask at whitespace gaps, alternating rows and columns.
+
+    Returns:
+        List of (x0, y0, x1, y1) boxes in mask coordinates
+    """
+    extent = ink_extent(mask)
+    if extent is None:
+        return []
+    x0, y0, x1, y1 = extent
+    region = mask[y0:y1, x0:x1]
+
+    for axis in ((0, 1) if depth % 2 == 0 else (1, 0)):
+        # axis 0: split into horizontal bands using the row profile
+        profile = region.sum(axis=1 - axis) if axis == 0 else region.sum(axis=0)
+        runs = find_runs(profile, min_gap, 1)
+        if len(runs) > 1:
+            boxes = []
+            for start, end in runs:
+                part = region[start:end, :] if axis == 0 else region[:, start:end]
+                for bx0, by0, bx1, by1 in xy_cut(part, min_gap, min_size, depth + 1):
+                    if axis == 0:
+                        boxes.append((x0 + bx0, y0 + start + by0, x0 + bx1, y0 + start + by1))
+                    else:
+                        boxes.append((x0 + start + bx0, y0 + by0, x0 + start + bx1, y0 + by1))
+            return boxes
+
+    if (x1 - x0) < min_size or (y1 - y0) < min_size:
+        return []
+    return [(x0, y0, x1, y1)]
+
+
+def merge_rects(rects, distance):
+    """
+    Merge rectangles that overlap or lie within distance of each other.
+
+    Args:
+        rects: List of fitz.Rect
+        distance: Gap (in the rects' units) below which two rects are merged
+
+    Returns:
+        List of merged fitz.Rect
+    """
+    # Plain tuples: fitz treats zero-height rects (lines) as empty and never intersecting
+    clusters = [tuple(rect) for rect in rects]
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for x0, y0, x1, y1 in clusters:
+            for index, (ox0, oy0, ox1, oy1) in enumerate(result):
+                if x0 - distance <= ox1 and ox0 <= x1 + distance and y0 - distance <= oy1 and oy0 <= y1 + distance:
+                    result[index] = (min(x0, ox0), min(y0, oy0), max(x1, ox1), max(y1, oy1))
+                    merged = True
+                    break
+            else:
+                result.append((x0, y0, x1, y1))
+        clusters = result
+    return [fitz.Rect(cluster) for cluster in clusters]
+
+
+def question_starts(page):
+    """Return the y coordinates (points) of numbered text blocks down the left margin."""
+    starts = []
+    left_margin = page.rect.width * 0.2
+    for x0, y0, _, _, text, _, block_type in page.get_text("blocks"):
+        if block_type == 0 and x0 < left_margin and QUESTION_NUMBER_RE.match(text):
+            starts.append(y0)
+    return sorted(starts)
+
+
+def to_fractions(box, width, height):
+    """Convert a pixel or point box to a padded (left, top, right, bottom) fraction tuple."""
+    x0, y0, x1, y1 = box
+    return (
+        round(max(x0 / width - PADDING, 0.0), 3),
+        round(max(y0 / height - PADDING, 0.0), 3),
+        round(min(x1 / width + PADDING, 1.0), 3),
+        round(min(y1 / height + PADDING, 1.0), 3),
+    )
+
+
+def detect_bands(page, mask, full_width=True):
+    """
+    Propose one rectangle per question strip on a page.
+
+    Args:
+        page: fitz.Page
+        mask: Ink mask of the page rendered at ANALYSIS_ZOOM
+        full_width: Span the whole page width (as the NVR crops do) rather than the ink
+
+    Returns:
+        List of (left, top, right, bottom) fractions, top to bottom
+    """
+    height, width = mask.shape
+    runs = find_runs(mask.sum(axis=1), max(int(MIN_GAP * height), 1), max(int(MIN_BAND * height), 1))
+    if not runs:
+        return []
+
+    # Group rows of ink into questions at each numbered block; without
+    # numbers, each row of ink is its own question
+    starts = [y * ANALYSIS_ZOOM for y in question_starts(page)]
+    if starts:
+        groups = {}
+        for start, end in runs:
+            owner = max((s for s in starts if s <= start + MIN_GAP * height), default=None)
+            if owner is not None:
+                groups.setdefault(owner, []).append((start, end))
+        bands = [(min(s for s, _ in rows), max(e for _, e in rows)) for _, rows in sorted(groups.items())]
+    else:
+        bands = runs
+
+    proposals = []
+    for top, bottom in bands:
+        if full_width:
+            box = (0, top, width, bottom)
+        else:
+            x0, _, x1, _ = ink_extent(mask[top:bottom])
+            box = (x0, top, x1, bottom)
+        rect = to_fractions(box, width, height)
+        proposals.append((0.0, rect[1], 1.0, rect[3]) if full_width else rect)
+    return proposals
+
+
+def detect_diagrams(page, mask):
+    """
+    Propose one rectangle per figure on a page.
+
+    Args:
+        page: fitz.Page
+        mask: Ink mask of the page rendered at ANALYSIS_ZOOM
+
+    Returns:
+        List of (left, top, right, bottom) fractions, top to bottom
+    """
+    page_rect = page.rect
+    page_area = page_rect.width * page_rect.height
+    text_blocks = [fitz.Rect(block[:4]) for block in page.get_text("blocks") if block[6] == 0]
+
+    rects = [drawing["rect"] for drawing in page.get_drawings()]
+    rects += [fitz.Rect(block[:4]) for block in page.get_text("blocks") if block[6] == 1]
+    # Ignore page-wide rules and frames
+    rects = [rect for rect in rects if rect.width < page_rect.width * 0.95 or rect.height < page_rect.height * 0.95]
+
+    if rects:
+        distance = MERGE_DISTANCE * page_rect.width
+        clusters = merge_rects(rects, distance)
+        clusters = [c for c in clusters if c.width * c.height >= MIN_DIAGRAM_AREA * page_area]
+        # Pull in labels (axis numbers, option letters) that touch a figure
+        for index, cluster in enumerate(clusters):
+            grown = cluster + (-distance, -distance, distance, distance)
+            for block in text_blocks:
+                if block.intersects(grown) and block.width < cluster.width:
+                    cluster = cluster | block
+            clusters[index] = cluster
+        boxes = [tuple(c) for c in merge_rects(clusters, 0)]
+        width, height = page_rect.width, page_rect.height
+    else:
+        # No vector content (a scanned booklet): cut the ink with the text removed
+        height, width = mask.shape
+        figure_mask = mask.copy()
+        for block in text_blocks:
+            x0, y0, x1, y1 = (int(v * ANALYSIS_ZOOM) for v in block)
+            figure_mask[y0:y1 + 1, x0:x1 + 1] = False
+        min_size = int(np.sqrt(MIN_DIAGRAM_AREA) * width)
+        boxes = xy_cut(figure_mask, max(int(MERGE_DISTANCE * width), 1), min_size)
+
+    proposals = [to_fractions(box, width, height) for box in boxes]
+    return sorted(proposals, key=lambda rect: (rect[1], rect[0]))
+
+
+def iou(a, b):
+    """Intersection over union of two (left, top, right, bottom) tuples."""
+    ix = max(min(a[2], b[2]) - max(a[0], b[0]), 0.0)
+    iy = max(min(a[3], b[3]) - max(a[1], b[1]), 0.0)
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def match_proposals(proposals, crops):
+    """
+    Pair proposals with existing crops on the same page by best overlap.
+
+    Returns:
+        List of (proposal, crop or None)
+    """
+    unused = list(crops)
+    pairs = []
+    for proposal in proposals:
+        best = max(unused, key=lambda crop: iou(proposal, crop["rect"]), default=None)
+        if best is not None and iou(proposal, best["rect"]) >= MATCH_IOU:
+            unused.remove(best)
+            pairs.append((proposal, best))
+        else:
+            pairs.append((proposal, None))
+    return pairs
+
+
+def parse_pages(spec, page_count):
+    """Parse a page list like "3-19,21" (0-indexed) into a sorted list."""
+    if not spec:
+        return list(range(page_count))
+    pages = set()
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        pages.update(range(int(first), int(last or first) + 1))
+    return sorted(page for page in pages if 0 <= page < page_count)
+
+
+def segment_booklet(engine, booklet, pages, mode, full_width=True):
+    """
+    Run detection on each page of a booklet.
+
+    Returns:
+        Dict of page number -> list of proposals
+    """
+    doc = engine.open(booklet["pdf"])
+    results = {}
+    for page_num in parse_pages(pages, doc.page_count):
+        mask = ink_mask(engine, booklet["pdf"], page_num)
+        page = doc[page_num]
+        if mode == "bands":
+            results[page_num] = detect_bands(page, mask, full_width)
+        else:
+            results[page_num] = detect_diagrams(page, mask)
+    return results
+
+
+def apply_proposals(booklet, results, output_pattern, manifest_name):
+    """
+    Write proposals into a booklet's crops.
+
+    Args:
+        booklet: Booklet dict from the manifest
+        results: segment_booklet() result
+        output_pattern: Output path for new crops, with {manifest}, {booklet},
+            {page} and {index} fields
+        manifest_name: Manifest file stem, e.g. "maths"
+
+    Returns:
+        Tuple of (updated, added) counts
+    """
+    updated = added = 0
+    for page_num, proposals in results.items():
+        existing = [crop for crop in booklet["crops"] if crop["page"] == page_num]
+        for index, (proposal, crop) in enumerate(match_proposals(proposals, existing), start=1):
+            if crop is not None:
+                if tuple(crop["rect"]) != proposal:
+                    crop["rect"] = list(proposal)
+                    updated += 1
+                continue
+            crop_id = f"p{page_num}-{index}"
+            booklet["crops"].append({
+                "id": crop_id,
+                "page": page_num,
+                "rect": list(proposal),
+                "output": output_pattern.format(manifest=manifest_name, booklet=booklet["name"],
+                                                page=page_num, index=index),
+                "description": f"Auto-detected region {index} (page {page_num})",
+            })
+            added += 1
+    booklet["crops"].sort(key=lambda crop: (crop["page"], crop["rect"][1]))
+    return updated, added
+
+
+def print_proposals(booklet, results):
+    for page_num, proposals in results.items():
+        existing = [crop for crop in booklet["crops"] if crop["page"] == page_num]
+        for proposal, crop in match_proposals(proposals, existing):
+            rect = "[" + ", ".join(f"{v:.3f}" for v in proposal) + "]"
+            if crop is None:
+                print(f"  page {page_num:>3}  {rect}  new")
+            else:
+                print(f"  page {page_num:>3}  {rect}  {crop['id']} (was {crop['rect']}, "
+                      f"overlap {iou(proposal, crop['rect']):.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose crop rectangles from a booklet's page layout.")
+    parser.add_argument("manifest", help="Crop manifest, e.g. crops/maths.json")
+    parser.add_argument("--booklet", help="Booklet name (default: every booklet in the manifest)")
+    parser.add_argument("--pages", help="Pages to analyse, 0-indexed, e.g. 3-19,21 (default: all)")
+    parser.add_argument("--mode", choices=["bands", "diagrams"], default="diagrams",
+                        help="Detect whole question strips or individual figures (default: diagrams)")
+    parser.add_argument("--ink-width", action="store_true",
+                        help="In bands mode, trim strips to the ink instead of the full page width")
+    parser.add_argument("--output-pattern", default=DEFAULT_OUTPUT_PATTERN,
+                        help=f"Output path for new crops (default: {DEFAULT_OUTPUT_PATTERN})")
+    parser.add_argument("--write", action="store_true", help="Write the proposals into the manifest")
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.manifest)
+    manifest_name = os.path.splitext(os.path.basename(args.manifest))[0]
+    booklets = [b for b in manifest["booklets"] if not args.booklet or b["name"] == args.booklet]
+    if not booklets:
+        raise SystemExit(f"No booklet named {args.booklet!r} in {args.manifest}")
+
+    with ExtractionEngine() as engine:
+        for booklet in booklets:
+            print(f"{booklet['name']}: {booklet['pdf']} ({args.mode})")
+            results = segment_booklet(engine, booklet, args.pages, args.mode, not args.ink_width)
+            print_proposals(booklet, results)
+            if args.write:
+                updated, added = apply_proposals(booklet, results, args.output_pattern, manifest_name)
+                print(f"✓ {updated} crops updated, {added} added")
+
+    if args.write:
+        save_manifest(args.manifest, manifest)
+        print(f"\nManifest written: {args.manifest}")
+        print("Run extract.py to render the changed crops.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Benchmark the PDF extraction pipeline on synthetic booklets.
+Usage: python3 benchmark.py [--quick] [--repeat 3] [--save-baseline] [--tolerance 0.2]
+
+The real booklets under exams/ are not in the repo, so this draws multi-page
+PDFs with vector shapes and text laid out like the NVR booklets (five
+full-width question strips per page) and the maths booklets (question text
+with a chart or grid), then runs the same engine calls the extract scripts
+make: parse each page into a display list, render every crop and encode it.
+
+Each case runs in a fresh process so peak RSS is per case. Wall time is the
+best of --repeat runs. Results are compared with benchmark-baseline.json and
+the script exits with status 1 if any case is slower or uses more memory than
+the baseline allows; --save-baseline records the current numbers instead.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import fitz  # PyMuPDF
+
+from extract_engine import ENGINE_VERSION, RASTER_MODES, ExtractionEngine
+from extract_trace import peak_rss_mb
+from image_codec import write_image
+
+BASELINE_PATH = "benchmark-baseline.json"
+DEFAULT_TOLERANCE = 0.2
+
+LAYOUTS = ["nvr", "maths"]
+PAGE_COUNTS = [4, 16]
+ZOOMS = [2, 3, 4]
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+NVR_ROWS = 5
+MATHS_CROPS = [(0.15, 0.1, 0.85, 0.42), (0.15, 0.55, 0.85, 0.85)]
+
+BLUE = (0.1, 0.3, 0.8)
+BLACK = (0, 0, 0)
+GREY = (0.6, 0.6, 0.6)
+
+
+def draw_shape(page, rng, box):
+    """Draw one random NVR-style figure (polygon, circle or hatched square) inside box."""
+    cx, cy = (box.x0 + box.x1) / 2, (box.y0 + box.y1) / 2
+    r = min(box.width, box.height) * rng.uniform(0.2, 0.4)
+    fill = rng.choice([None, BLACK, GREY, (1, 1, 1)])
+    kind = rng.choice(["polygon", "circle", "hatched"])
+    if kind == "circle":
+        page.draw_circle((cx, cy), r, color=BLACK, fill=fill, width=1)
+    elif kind == "polygon":
+        sides = rng.randint(3, 8)
+        start = rng.uniform(0, 2 * math.pi)
+        points = [
+            (cx + r * math.cos(start + i * 2 * math.pi / sides), cy + r * math.sin(start + i * 2 * math.pi / sides))
+            for i in range(sides)
+        ]
+        page.draw_polyline(points + points[:1], color=BLACK, fill=fill, width=1)
+    else:
+        square = fitz.Rect(cx - r, cy - r, cx + r, cy + r)
+        page.draw_rect(square, color=BLACK, width=1)
+        for i in range(1, 8):
+            offset = 2 * r * i / 8
+            page.draw_line((square.x0 + offset, square.y0), (square.x0, square.y0 + offset), color=BLACK, width=0.5)
+
+
+def draw_nvr_page(page, rng, page_num):
+    page.insert_text((40, 40), f"Non-Verbal Reasoning  -  page {page_num + 1}", fontsize=11)
+    strip_height = PAGE_HEIGHT * 0.16
+    for row in range(NVR_ROWS):
+        top = PAGE_HEIGHT * 0.08 + row * strip_height
+        page.insert_text((20, top + 20), str(page_num * NVR_ROWS + row + 1), fontsize=12, color=BLUE)
+        box_width = (PAGE_WIDTH - 80) / 10
+        for i in range(10):
+            box = fitz.Rect(50 + i * box_width, top + 10, 50 + (i + 1) * box_width - 6, top + strip_height - 30)
+            page.draw_rect(box, color=BLACK, width=0.8)
+            draw_shape(page, rng, box)
+            if i >= 5:
+                page.insert_text((box.x0 + box.width / 2 - 3, box.y1 + 14), "ABCDE"[i - 5], fontsize=10)
+
+
+def draw_maths_page(page, rng, page_num):
+    page.insert_text((40, 40), f"Maths  -  page {page_num + 1}", fontsize=11)
+    for index, (left, top, right, bottom) in enumerate(MATHS_CROPS):
+        question = page_num * len(MATHS_CROPS) + index + 1
+        text_rect = fitz.Rect(40, PAGE_HEIGHT * top - 40, PAGE_WIDTH - 40, PAGE_HEIGHT * top)
+        page.insert_textbox(text_rect, f"{question}. Use the chart to answer the question. "
+                            "Write your answer in the box on the answer sheet.", fontsize=10)
+        area = fitz.Rect(PAGE_WIDTH * left, PAGE_HEIGHT * top, PAGE_WIDTH * right, PAGE_HEIGHT * bottom)
+        # Grid with axes and a bar chart on top
+        for i in range(11):
+            x = area.x0 + area.width * i / 10
+            y = area.y0 + area.height * i / 10
+            page.draw_line((x, area.y0), (x, area.y1), color=GREY, width=0.3)
+            page.draw_line((area.x0, y), (area.x1, y), color=GREY, width=0.3)
+            page.insert_text((area.x0 - 14, area.y1 - area.height * i / 10 + 3), str(i * 10), fontsize=6)
+        page.draw_rect(area, color=BLACK, width=1)
+        bar_width = area.width / 12
+        for i in range(6):
+            height = area.height * rng.uniform(0.1, 0.9)
+            bar = fitz.Rect(area.x0 + bar_width * (2 * i + 0.5), area.y1 - height,
+                            area.x0 + bar_width * (2 * i + 1.5), area.y1)
+            page.draw_rect(bar, color=BLACK, fill=rng.choice([GREY, (0.2, 0.5, 0.9), (0.9, 0.5, 0.2)]), width=0.8)
+
+
+def make_booklet(path, layout, pages, seed=0):
+    """
+    Write a synthetic booklet PDF.
+
+    Args:
+        path: Output PDF path
+        layout: "nvr" or "maths"
+        pages: Number of pages
+        seed: Random seed, so every run draws the same booklet
+    """
+    rng = random.Random(seed)
+    draw = draw_nvr_page if layout == "nvr" else draw_maths_page
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        draw(page, rng, page_num)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def booklet_crops(layout, pages):
+    """Return (page, rect) crops matching the layout's real manifests."""
+    if layout == "nvr":
+        rects = [(0.0, 0.08 + 0.16 * row, 1.0, 0.24 + 0.16 * row) for row in range(NVR_ROWS)]
+    else:
+        rects = MATHS_CROPS
+    return [(page, rect) for page in range(pages) for rect in rects]
+
+
+def run_case(pdf_path, layout, pages, zoom, output_dir, raster="rgb"):
+    """
+    Run one extraction case; called in a fresh worker process.
+
+    Returns:
+        Dict of timings (seconds), counts, output bytes and peak RSS
+    """
+    crops = booklet_crops(layout, pages)
+    timings = {"parse": 0.0, "render": 0.0, "encode": 0.0}
+    output_bytes = 0
+
+    start = time.perf_counter()
+    with ExtractionEngine(zoom=zoom) as engine:
+        for index, (page_num, rect) in enumerate(crops):
+            t0 = time.perf_counter()
+            engine.display_list(pdf_path, page_num)
+            t1 = time.perf_counter()
+            image = engine.crop(pdf_path, page_num, rect, raster=raster)
+            t2 = time.perf_counter()
+            output_path = os.path.join(output_dir, f"{layout}-{index}.png")
+            output_bytes += write_image(image, output_path)["bytes"]
+            t3 = time.perf_counter()
+            timings["parse"] += t1 - t0
+            timings["render"] += t2 - t1
+            timings["encode"] += t3 - t2
+    wall = time.perf_counter() - start
+
+    return {
+        "wallSeconds": wall,
+        "stageSeconds": timings,
+        "crops": len(crops),
+        "outputBytes": output_bytes,
+        "peakRssMb": peak_rss_mb(),
+    }
+
+
+def run_isolated(pdf_path, layout, pages, zoom, output_dir, raster):
+    """Run a case in a new process, so peak RSS is not inherited from earlier cases."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(run_case, pdf_path, layout, pages, zoom, output_dir, raster).result()
+
+
+def case_name(layout, pages, zoom, raster="rgb"):
+    name = f"{layout}-p{pages}-z{zoom}"
+    return name if raster == "rgb" else f"{name}-{raster}"
+
+
+def run_benchmarks(layouts, page_counts, zooms, repeat, raster="rgb"):
+    """
+    Run every (layout, pages, zoom) case.
+
+    Returns:
+        Dict of case name -> result (best wall time over the repeats)
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as tmp:
+        for layout in layouts:
+            for pages in page_counts:
+                pdf_path = os.path.join(tmp, f"{layout}-{pages}.pdf")
+                make_booklet(pdf_path, layout, pages)
+                for zoom in zooms:
+                    runs = [run_isolated(pdf_path, layout, pages, zoom, tmp, raster) for _ in range(repeat)]
+                    best = min(runs, key=lambda run: run["wallSeconds"])
+                    best["peakRssMb"] = max(run["peakRssMb"] for run in runs)
+                    result = {
+                        "layout": layout,
+                        "pages": pages,
+                        "zoom": zoom,
+                        "raster": raster,
+                        "crops": best["crops"],
+                        "wallSeconds": round(best["wallSeconds"], 4),
+                        "pagesPerSecond": round(pages / best["wallSeconds"], 2),
+                        "cropsPerSecond": round(best["crops"] / best["wallSeconds"], 2),
+                        "stageSeconds": {k: round(v, 4) for k, v in best["stageSeconds"].items()},
+                        "outputBytes": best["outputBytes"],
+                        "peakRssMb": round(best["peakRssMb"], 1),
+                    }
+                    name = case_name(layout, pages, zoom, raster)
+                    results[name] = result
+                    print_result(name, result)
+    return results
+
+
+def print_result(name, result):
+    stages = result["stageSeconds"]
+    print(f"  {name:<14} {result['wallSeconds']:>7.3f} s  {result['pagesPerSecond']:>7.2f} pages/s  "
+          f"{result['cropsPerSecond']:>7.2f} crops/s  "
+          f"(parse {stages['parse']:.3f}, render {stages['render']:.3f}, encode {stages['encode']:.3f})  "
+          f"peak {result['peakRssMb']:>6.1f} MB")
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "engineVersion": ENGINE_VERSION,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline.
+
+    Returns:
+        List of regression messages (empty if every case is within tolerance)
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            print(f"  {name}: no baseline")
+            continue
+        for key, label in (("wallSeconds", "wall time"), ("peakRssMb", "peak RSS")):
+            change = result[key] / base[key] - 1 if base[key] else 0.0
+            marker = "✗" if change > tolerance else "✓"
+            print(f"  {marker} {name:<14} {label:<9} {base[key]:>8} -> {result[key]:>8} ({change:+.0%})")
+            if change > tolerance:
+                regressions.append(f"{name} {label} {change:+.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF extraction on synthetic booklets.")
+    parser.add_argument("--quick", action="store_true", help="Only 4-page booklets at zoom 3")
+    parser.add_argument("--raster", choices=RASTER_MODES, default="rgb",
+                        help="Pixel format to render crops in (default: rgb)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is kept (default: 3)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help=f"Baseline file (default: {BASELINE_PATH})")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed slowdown/growth before failing (default: {DEFAULT_TOLERANCE:.0%})")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    page_counts, zooms = ([4], [3]) if args.quick else (PAGE_COUNTS, ZOOMS)
+    print(f"Benchmarking extraction: layouts {LAYOUTS}, pages {page_counts}, zooms {zooms}, "
+          f"best of {args.repeat}")
+    results = run_benchmarks(LAYOUTS, page_counts, zooms, args.repeat, args.raster)
+
+    report = {
+        "generatedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(),
+        "cases": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                # Keep cases that were not run this time (e.g. with --quick)
+                report["cases"] = {**json.load(f)["cases"], **results}
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\n✓ Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {args.baseline} ({baseline['generatedAt']}):")
+    if baseline["environment"] != report["environment"]:
+        print("  ! Baseline was recorded in a different environment; timings may not be comparable")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n✗ {len(regressions)} regression(s): " + ", ".join(regressions))
+        sys.exit(1)
+    print("\n✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
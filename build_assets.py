@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Build a deployable copy of the app in dist/ with minified, fingerprinted assets.
+Usage: python3 build_assets.py [--output dist]
+
+The source pages load js/app.js and css/style.css by fixed names, so browsers
+have to revalidate them on every visit. This writes:
+    dist/js/app.<hash>.js, dist/css/style.<hash>.css
+                  - minified and named by a hash of their content. server.py
+                    serves such names as immutable, so an unchanged file is
+                    never fetched again and a changed one gets a new URL
+    dist/*.html   - the three pages pointing at those names. index.html also
+                    inlines the stylesheet rules for what is visible on first
+                    load (the exam selector) and loads the full stylesheet and
+                    web font without blocking first paint
+    dist/data, dist/images, dist/sw.js
+                  - copies of the source files (only changed files are copied)
+It first runs image_variants.py, so dist/images gets the smaller copies of
+every image, and rewrites the shards in dist/data with each image's copies
+for srcset. It then writes the precache manifest and the .gz/.br copies inside
+dist/. Serve the result with `python3 server.py --directory dist`.
+
+rjsmin and rcssmin are used when installed. Otherwise a conservative built-in
+minifier strips comments and indentation. It leaves string, template and regex
+literals untouched, and it keeps any line break that semicolon insertion could
+depend on.
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import shutil
+from html.parser import HTMLParser
+
+try:
+    import rjsmin
+except ImportError:  # optional: the built-in minifier gets most of the way
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+import build_precache
+import image_variants
+import precompress
+import question_bank
+
+DEFAULT_OUTPUT = "dist"
+
+PAGES = ["index.html", "performance.html", "mistakes.html"]
+SCRIPTS = ["js/app.js"]
+STYLESHEETS = ["css/style.css"]
+
+# Pages whose first screen is static markup, so the rules it needs can be
+# inlined and the stylesheet loaded after first paint. The other pages build
+# their content in app.js, which would flash unstyled without the full sheet.
+CRITICAL_CSS_PAGES = ["index.html"]
+
+# Copied into the output as they are
+STATIC_FILES = ["sw.js"]
+STATIC_DIRS = ["data", "images"]
+
+# Characters of the content hash used in fingerprinted names
+FINGERPRINT_LENGTH = 10
+
+# Characters and keywords after which "/" starts a regex rather than a division
+REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "instanceof",
+                  "new", "void", "delete", "throw", "yield", "await"}
+# Whitespace next to these is never needed
+JS_PUNCTUATION = set("{}()[];,:=<>?!&|*")
+# A line break after or before these cannot end a statement, so it can go
+JS_CONTINUES_AFTER = set("{([,;=:?&|<>!*")
+JS_CONTINUES_BEFORE = set("})],;:?=")
+JS_WORD = re.compile(r"[\w$]+")
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+STYLESHEET_LINK = re.compile(r'<link (?=[^>]*rel="stylesheet")[^>]*href="([^"]+)"[^>]*>')
+
+
+def _skip_string(src, i, quote):
+    j = i + 1
+    while src[j] != quote:
+        if src[j] == "\n":
+            raise ValueError(f"Unterminated string at offset {i}")
+        j += 2 if src[j] == "\\" else 1
+    return j + 1
+
+
+def _skip_regex(src, i):
+    j = i + 1
+    in_class = False
+    while in_class or src[j] != "/":
+        if src[j] == "\n":
+            raise ValueError(f"Unterminated regex at offset {i}")
+        if src[j] == "\\":
+            j += 1
+        elif src[j] == "[":
+            in_class = True
+        elif src[j] == "]":
+            in_class = False
+        j += 1
+    j += 1
+    while j < len(src) and src[j].isalpha():
+        j += 1
+    return j
+
+
+def _starts_regex(out):
+    tokens = [token for token in out[-3:] if token not in (" ", "\n")]
+    if not tokens:
+        return True
+    last = tokens[-1]
+    if last in ("+", "-") and len(tokens) > 1 and tokens[-2] == last:
+        return False  # a++ / b
+    return last[-1] in REGEX_PRECEDERS or last in REGEX_KEYWORDS
+
+
+def _emit_space(out, space, following):
+    """Append the whitespace needed between the last token and following, if any."""
+    if not out:
+        return
+    previous = out[-1][-1]
+    if space == "\n" and previous not in JS_CONTINUES_AFTER and following not in JS_CONTINUES_BEFORE:
+        out.append("\n")
+    elif previous in JS_PUNCTUATION or following in JS_PUNCTUATION:
+        # "a < !--b" must not become an HTML-style comment opener
+        if previous == "<" and following == "!":
+            out.append(" ")
+    else:
+        out.append(" ")
+
+
+def _js_template(src, i, out):
+    start = j = i + 1
+    out.append("`")
+    while src[j] != "`":
+        if src[j] == "\\":
+            j += 2
+        elif src.startswith("${", j):
+            out.append(src[start:j + 2])
+            j = start = _js_code(src, j + 2, out, nested=True)
+        else:
+            j += 1
+    out.append(src[start:j + 1])
+    return j + 1
+
+
+def _js_code(src, i, out, nested=False):
+    """
+    Copy code from src[i:] to out without comments or unneeded whitespace.
+
+    With nested, stops after the "}" that closes a template's ${...}.
+
+    Returns:
+        Index after the consumed text
+    """
+    depth = 0
+    space = ""
+    while i < len(src):
+        c = src[i]
+        if c in " \t\r\n":
+            space = "\n" if c == "\n" or space == "\n" else " "
+            i += 1
+            continue
+        if src.startswith("//", i):
+            end = src.find("\n", i)
+            i = len(src) if end < 0 else end
+            continue
+        if src.startswith("/*", i):
+            end = src.index("*/", i + 2)
+            space = "\n" if space == "\n" or "\n" in src[i:end] else " "
+            i = end + 2
+            continue
+
+        if space:
+            _emit_space(out, space, c)
+            space = ""
+        if c in "'\"":
+            j = _skip_string(src, i, c)
+        elif c == "`":
+            i = _js_template(src, i, out)
+            continue
+        elif c == "/" and _starts_regex(out):
+            j = _skip_regex(src, i)
+        elif JS_WORD.match(src, i):
+            j = JS_WORD.match(src, i).end()
+        else:
+            if nested and c == "{":
+                depth += 1
+            elif nested and c == "}":
+                if depth == 0:
+                    out.append(c)
+                    return i + 1
+                depth -= 1
+            j = i + 1
+        out.append(src[i:j])
+        i = j
+    return i
+
+
+def minify_js(source):
+    """Minify JavaScript, with rjsmin if installed."""
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    out = []
+    _js_code(source, 0, out)
+    return "".join(out).strip() + "\n"
+
+
+def minify_css(source):
+    """Minify CSS, with rcssmin if installed."""
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+    parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/)', source, flags=re.S)
+    out = []
+    for index, part in enumerate(parts):
+        if index % 2:
+            if not part.startswith("/*"):
+                out.append(part)
+            continue
+        part = re.sub(r"\s+", " ", part)
+        part = re.sub(r" ?([{};,>]) ?", r"\1", part)
+        out.append(part.replace(": ", ":"))
+    return "".join(out).replace(";}", "}").strip() + "\n"
+
+
+def parse_rules(css):
+    """
+    Split stylesheet text into rules.
+
+    Returns:
+        List of (prelude, body) pairs; "@media" bodies are left as text
+    """
+    rules = []
+    i = 0
+    while True:
+        start = css.find("{", i)
+        if start < 0:
+            return rules
+        depth, j = 1, start + 1
+        while depth:
+            if css[j] in "'\"":
+                j = _skip_string(css, j, css[j])
+                continue
+            depth += {"{": 1, "}": -1}.get(css[j], 0)
+            j += 1
+        rules.append((css[i:start].strip(), css[start + 1:j - 1]))
+        i = j
+
+
+def split_selectors(prelude):
+    """Split a selector list on top-level commas."""
+    selectors, depth, start = [], 0, 0
+    for i, c in enumerate(prelude):
+        depth += {"(": 1, ")": -1}.get(c, 0)
+        if c == "," and depth == 0:
+            selectors.append(prelude[start:i].strip())
+            start = i + 1
+    selectors.append(prelude[start:].strip())
+    return selectors
+
+
+def selector_names(selector):
+    """Return the (tags, classes, ids) a selector requires, ignoring pseudo-classes and attributes."""
+    simple = re.sub(r"::?[\w-]+(\([^)]*\))?|\[[^\]]*\]", "", selector)
+    return (
+        set(re.findall(r"(?:^|[\s>+~])([a-zA-Z][\w-]*)", simple)),
+        set(re.findall(r"\.([\w-]+)", simple)),
+        set(re.findall(r"#([\w-]+)", simple)),
+    )
+
+
+class PageElements(HTMLParser):
+    """
+    Collect the tags, classes and ids used in a page.
+
+    "visible" leaves out everything inside a hidden element: a ".screen" that is
+    not ".active", or anything with an inline display: none.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.all = (set(), set(), set())
+        self.visible = (set(), set(), set())
+        self._hidden = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        style = re.sub(r"\s", "", attrs.get("style") or "")
+        hidden = (bool(self._hidden and self._hidden[-1])
+                  or ("screen" in classes and "active" not in classes)
+                  or "display:none" in style)
+        targets = [self.all] if hidden else [self.all, self.visible]
+        for tags, class_names, ids in targets:
+            tags.add(tag)
+            class_names.update(classes)
+            if attrs.get("id"):
+                ids.add(attrs["id"])
+        if tag not in VOID_ELEMENTS:
+            self._hidden.append(hidden)
+
+    def handle_endtag(self, tag):
+        if tag not in VOID_ELEMENTS and self._hidden:
+            self._hidden.pop()
+
+
+def _matches(selector, names):
+    tags, classes, ids = selector_names(selector)
+    return tags <= names[0] and classes <= names[1] and ids <= names[2]
+
+
+def critical_css(css, page):
+    """
+    Pick the rules a page needs for its first paint.
+
+    Keeps the selectors that match the elements visible on load, plus rules
+    that hide (display: none) any element on the page, so the rest stays out of
+    sight until the full stylesheet arrives, and the keyframes those rules use.
+
+    Args:
+        css: Minified stylesheet text
+        page: PageElements fed with the page's HTML
+    """
+    kept = []
+    keyframes = {}
+    for prelude, body in parse_rules(css):
+        if prelude.startswith("@keyframes"):
+            keyframes[prelude.split()[-1]] = f"{prelude}{{{body}}}"
+        elif prelude.startswith("@media"):
+            inner = critical_css(body, page)
+            if inner:
+                kept.append(f"{prelude}{{{inner}}}")
+        elif not prelude.startswith("@"):
+            hides = re.search(r"display:\s*none", body)
+            selectors = [s for s in split_selectors(prelude)
+                         if _matches(s, page.visible) or (hides and _matches(s, page.all))]
+            if selectors:
+                kept.append(f"{','.join(selectors)}{{{body}}}")
+    text = "".join(kept)
+    used = [rule for name, rule in keyframes.items() if re.search(rf"animation[^;}}]*\b{re.escape(name)}\b", text)]
+    return "".join(used) + text
+
+
+def fingerprint(path, data):
+    """Return path with a content hash before its extension, e.g. js/app.3f9c2a1b4d.js."""
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]}{extension}"
+
+
+def write_text(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def sync_file(source, target):
+    """Copy source to target unless target already has its size and mtime."""
+    if os.path.exists(target):
+        a, b = os.stat(source), os.stat(target)
+        if a.st_size == b.st_size and int(a.st_mtime) == int(b.st_mtime):
+            return False
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    shutil.copy2(source, target)
+    return True
+
+
+def sync_tree(source_dir, target_dir):
+    """
+    Mirror a directory, skipping compressed and temporary build artefacts.
+
+    Returns:
+        Tuple of (files copied, files removed)
+    """
+    copied = removed = 0
+    wanted = set()
+    for dirpath, _, filenames in os.walk(source_dir):
+        for name in filenames:
+            if name.endswith(build_precache.SKIP_SUFFIXES):
+                continue
+            relative = os.path.relpath(os.path.join(dirpath, name), source_dir)
+            wanted.add(relative)
+            copied += sync_file(os.path.join(source_dir, relative), os.path.join(target_dir, relative))
+
+    for dirpath, _, filenames in os.walk(target_dir):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            relative = os.path.relpath(path, target_dir)
+            # Compressed copies are managed by precompress.py
+            source_relative = re.sub(r"\.(gz|br)$", "", relative)
+            if source_relative not in wanted:
+                os.remove(path)
+                removed += 1
+    return copied, removed
+
+
+def async_stylesheet(href):
+    """Markup that loads a stylesheet without blocking rendering."""
+    return (f'<link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+            f'<noscript><link rel="stylesheet" href="{href}"></noscript>')
+
+
+def gzip_size(data):
+    return len(gzip.compress(data, compresslevel=9, mtime=0))
+
+
+def build_assets(output):
+    """
+    Minify and fingerprint the scripts and stylesheets into output.
+
+    Returns:
+        Dict of source path -> (fingerprinted path, minified text)
+    """
+    assets = {}
+    for path, minify in [(path, minify_js) for path in SCRIPTS] + [(path, minify_css) for path in STYLESHEETS]:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        minified = minify(source)
+        data = minified.encode("utf-8")
+        target = fingerprint(path, data)
+        assets[path] = (target, minified)
+
+        # Drop earlier builds of this asset; the pages about to be written no longer use them
+        directory = os.path.join(output, os.path.dirname(path))
+        stem, extension = os.path.splitext(os.path.basename(path))
+        pattern = re.compile(rf"{re.escape(stem)}\.[0-9a-f]{{{FINGERPRINT_LENGTH}}}{re.escape(extension)}(\.gz|\.br)?$")
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if pattern.match(name) and not name.startswith(os.path.basename(target)):
+                    os.remove(os.path.join(directory, name))
+        write_text(os.path.join(output, target), minified)
+
+        before, after = source.encode("utf-8"), data
+        print(f"✓ {target}: {len(before) / 1024:.1f} KB -> {len(after) / 1024:.1f} KB "
+              f"({gzip_size(before) / 1024:.1f} KB -> {gzip_size(after) / 1024:.1f} KB gzipped)")
+    return assets
+
+
+def build_page(page, assets, output):
+    """Write a page with fingerprinted references (and critical CSS) into output."""
+    with open(page, encoding="utf-8") as f:
+        html = f.read()
+
+    if page in CRITICAL_CSS_PAGES:
+        elements = PageElements()
+        elements.feed(html)
+
+        def replace(match):
+            href = match.group(1)
+            if href in assets:
+                target, css = assets[href]
+                inline = critical_css(css, elements)
+                print(f"✓ {page}: {len(inline.encode('utf-8')) / 1024:.1f} KB of {href} inlined")
+                return f"<style>{inline}</style>\n    {async_stylesheet(target)}"
+            # Third-party sheets (the web font) must not hold up first paint either
+            return async_stylesheet(href) if href.startswith("https://") else match.group(0)
+
+        html = STYLESHEET_LINK.sub(replace, html)
+
+    for path, (target, _) in assets.items():
+        html = html.replace(f'"{path}"', f'"{target}"')
+    write_text(os.path.join(output, page), html)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a minified, fingerprinted copy of the app.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"Output directory (default: {DEFAULT_OUTPUT})")
+    args = parser.parse_args()
+
+    if rjsmin is None or rcssmin is None:
+        print("rjsmin/rcssmin not installed; using the built-in minifier (pip install rjsmin rcssmin)")
+
+    # Not committed, so generated for every build (unchanged images are skipped)
+    image_variants.build_variants()
+    print()
+
+    assets = build_assets(args.output)
+    for page in PAGES:
+        build_page(page, assets, args.output)
+
+    copied = removed = 0
+    for path in STATIC_FILES:
+        copied += sync_file(path, os.path.join(args.output, path))
+    for directory in STATIC_DIRS:
+        tree_copied, tree_removed = sync_tree(directory, os.path.join(args.output, directory))
+        copied += tree_copied
+        removed += tree_removed
+    print(f"✓ {copied} file(s) copied, {removed} removed")
+
+    # The shards, precache manifest and compressed copies describe the built files
+    cwd = os.getcwd()
+    os.chdir(args.output)
+    try:
+        question_bank.write_manifest(variants=True)
+        manifest = build_precache.write_precache_manifest()
+        for path in precompress.iter_assets():
+            precompress.precompress(path)
+    finally:
+        os.chdir(cwd)
+    print(f"✓ {args.output}/{build_precache.PRECACHE_MANIFEST_PATH} (version {manifest['version']})")
+    print(f"\nServe with: python3 server.py --directory {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Write precache-manifest.json for the service worker (sw.js).
+Usage: python3 build_precache.py
+
+The manifest lists the app shell (HTML pages, js/, css/, data/manifest.json)
+and, per test, the shard (or question pack) and images that test uses, each with a content hash
+and size. The service worker precaches the shell on install and a test's group
+when it is selected, and after a deploy refetches only entries whose hash
+changed. Run it after regenerating data or images (question_bank.py does not
+run it for you).
+"""
+import hashlib
+import json
+import os
+
+from question_bank import MANIFEST_PATH, test_asset_paths
+
+PRECACHE_MANIFEST_PATH = "precache-manifest.json"
+
+SHELL_FILES = ["index.html", "performance.html", "mistakes.html", MANIFEST_PATH]
+SHELL_DIRS = ["js", "css"]
+
+# Build artefacts that are never requested by the browser
+SKIP_SUFFIXES = (".gz", ".br", ".tmp")
+
+
+def file_entry(path):
+    """Return the manifest entry (url, hash, size) for a file."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return {"url": path.replace(os.sep, "/"), "hash": sha.hexdigest()[:16], "size": os.path.getsize(path)}
+
+
+def shell_paths():
+    paths = list(SHELL_FILES)
+    for directory in SHELL_DIRS:
+        for dirpath, _, filenames in os.walk(directory):
+            paths.extend(
+                os.path.join(dirpath, name) for name in sorted(filenames)
+                if not name.endswith(SKIP_SUFFIXES)
+            )
+    return paths
+
+
+def build_manifest():
+    """
+    Build the precache manifest from the files on disk.
+
+    Returns:
+        Dict with a version, the shell entries and per-test entry groups keyed
+        "<exam>/<test>"
+    """
+    with open(MANIFEST_PATH, encoding="utf-8") as f:
+        question_manifest = json.load(f)
+
+    entries = {}
+
+    def entry(path):
+        if path not in entries:
+            entries[path] = file_entry(path)
+        return entries[path]
+
+    shell = [entry(path) for path in shell_paths()]
+    # The performance and mistakes pages read every exam's question index
+    shell.extend(entry(exam_entry["index"]) for exam_entry in question_manifest["exams"].values()
+                 if "index" in exam_entry)
+
+    tests = {}
+    for exam, exam_entry in question_manifest["exams"].items():
+        for test_key, summary in exam_entry["tests"].items():
+            if summary["questionCount"] == 0:
+                continue
+            with open(summary["shard"], encoding="utf-8") as f:
+                assets = test_asset_paths(json.load(f))
+            missing = [path for path in assets if not os.path.exists(path)]
+            for path in missing:
+                print(f"  ! {exam}/{test_key}: missing {path}")
+            # The app fetches the question pack instead of the shard when there is one
+            tests[f"{exam}/{test_key}"] = [entry(summary.get("pack", summary["shard"]))] + [
+                entry(path) for path in assets if path not in missing
+            ]
+
+    version = hashlib.sha256(
+        "".join(f"{e['url']}:{e['hash']}\n" for e in sorted(entries.values(), key=lambda e: e["url"])).encode()
+    ).hexdigest()[:16]
+
+    return {"version": version, "shell": shell, "tests": tests}
+
+
+def write_precache_manifest(path=PRECACHE_MANIFEST_PATH):
+    """Build the manifest, write it to path and return it."""
+    manifest = build_manifest()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+        f.write("\n")
+    return manifest
+
+
+def main():
+    manifest = write_precache_manifest()
+
+    shell_bytes = sum(e["size"] for e in manifest["shell"])
+    print(f"✓ {PRECACHE_MANIFEST_PATH} (version {manifest['version']})")
+    print(f"  shell: {len(manifest['shell'])} files, {shell_bytes / 1024:.0f} KB")
+    for key, group in manifest["tests"].items():
+        print(f"  {key}: {len(group)} files, {sum(e['size'] for e in group) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
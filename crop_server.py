@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Local backend for pdf_crop_tool.html: page tiles, crop previews and saving crops.
+Usage: python3 crop_server.py [port] [--bind ADDRESS] [--cache-dir .tile-cache] [--quiet]
+
+Then open http://localhost:8001/pdf_crop_tool.html. Nothing is loaded from the
+internet and the browser never parses a PDF. Pages are rendered here by the
+extraction engine, so each page is interpreted once into a display list and
+every zoom level and preview of that page reuses it.
+
+    GET  /api/booklets - every booklet in crops/*.json with its page sizes,
+                         crops and the tile levels
+    GET  /api/tile     - one 256 px PNG tile of a page at a zoom level
+                         (?manifest=crops/maths.json&booklet=test1&page=3
+                         &level=2&x=0&y=1&v=<pdf digest>)
+    GET  /api/preview  - the crop exactly as extract.py would write it, with
+                         the booklet's and crop's render and encode settings
+                         (?manifest=...&booklet=...&page=3&rect=l,t,r,b[&id=q4])
+    POST /api/crops    - {"manifest", "booklet", "crop": {"id", "page", "rect",
+                         "output", "description"}}; updates the crop with that
+                         id, or adds it, and saves the manifest
+
+The tool loads a page's smallest level (one tile) first and then the sharpest
+level the screen needs. Tiles are cached on disk under --cache-dir by the
+PDF's SHA-256, so a booklet that has not changed is never rendered twice,
+and the tile URLs carry the digest so browsers keep them too.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import posixpath
+import tempfile
+import threading
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from extract import MANIFEST_DIR, extract_crop, iter_crops, load_manifest, pdf_digest, save_manifest
+from extract_engine import ENGINE_VERSION, ExtractionEngine
+from server import IMMUTABLE_CACHE, StaticHandler, StaticServer
+
+DEFAULT_PORT = 8001
+DEFAULT_CACHE_DIR = ".tile-cache"
+
+TILE_SIZE = 256
+# Render zoom of each tile level; level 0 fits an A4 page in a single tile
+TILE_ZOOMS = (0.25, 0.5, 1, 2, 4)
+
+# Crop keys the tool edits; any other settings on an existing crop are kept
+EDITABLE_KEYS = ("page", "rect", "output", "description")
+
+# Largest accepted POST body
+MAX_BODY = 64 * 1024
+
+# Directory every crop output must be written under
+IMAGE_DIR = "images"
+
+
+def parse_rect(value):
+    """
+    Parse and check a crop rectangle.
+
+    Args:
+        value: "left,top,right,bottom" or a list of four page fractions
+
+    Returns:
+        List of four fractions rounded to 3 places
+
+    Raises:
+        ValueError: If it is not a non-empty rectangle inside the page
+    """
+    parts = value.split(",") if isinstance(value, str) else value
+    if not isinstance(parts, list) or len(parts) != 4:
+        raise ValueError("rect must be [left, top, right, bottom]")
+    try:
+        rect = [round(float(part), 3) for part in parts]
+    except (TypeError, ValueError):
+        raise ValueError("rect values must be numbers") from None
+    left, top, right, bottom = rect
+    if not (0.0 <= left < right <= 1.0 and 0.0 <= top < bottom <= 1.0):
+        raise ValueError("rect must be a non-empty rectangle within 0-1")
+    return rect
+
+
+def parse_output(value):
+    """
+    Check a crop's output path.
+
+    Returns:
+        The normalised path, e.g. "images/maths_q4_grid.png"
+
+    Raises:
+        ValueError: If it is not a .png path under images/
+    """
+    if not isinstance(value, str) or not value.lower().endswith(".png"):
+        raise ValueError("output must be a .png path")
+    path = posixpath.normpath(value.replace("\\", "/"))
+    if posixpath.isabs(path) or not path.startswith(IMAGE_DIR + "/"):
+        raise ValueError(f"output must be under {IMAGE_DIR}/")
+    return path
+
+
+class Booklets:
+    """
+    The booklets in the crop manifests and one engine to render them with.
+
+    MuPDF is not thread-safe, so rendering holds a lock; tiles already on
+    disk are served without it.
+
+    Args:
+        cache_dir: Directory for rendered tiles
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.engine = ExtractionEngine()
+        self.lock = threading.Lock()
+        # pdf_digest() remembers each PDF's hash by size and mtime
+        self.state = {"pdfs": {}}
+
+    def manifest_paths(self):
+        return sorted(glob.glob(os.path.join(MANIFEST_DIR, "*.json")))
+
+    def find(self, manifest_path, name):
+        """
+        Return (manifest, booklet) for a manifest path and booklet name.
+
+        Raises:
+            KeyError: If the manifest is not in crops/ or has no such booklet
+        """
+        if manifest_path not in self.manifest_paths():
+            raise KeyError(f"Unknown manifest {manifest_path!r}")
+        manifest = load_manifest(manifest_path)
+        for booklet in manifest["booklets"]:
+            if booklet["name"] == name:
+                if not os.path.exists(booklet["pdf"]):
+                    raise KeyError(f"{booklet['pdf']} not found")
+                return manifest, booklet
+        raise KeyError(f"No booklet {name!r} in {manifest_path}")
+
+    def version(self, pdf_path):
+        """Short digest of a PDF's bytes and the engine version, used in tile paths and URLs."""
+        with self.lock:
+            digest = pdf_digest(pdf_path, self.state)
+        return f"{digest[:16]}-{ENGINE_VERSION}"
+
+    def describe(self, manifest_path, booklet):
+        """Return the tool's view of a booklet: pages, crops and tile version."""
+        entry = {
+            "manifest": manifest_path,
+            "name": booklet["name"],
+            "title": booklet.get("title", booklet["name"]),
+            "pdf": booklet["pdf"],
+            "crops": [{key: crop[key] for key in ("id",) + EDITABLE_KEYS if key in crop}
+                      for crop in booklet["crops"]],
+        }
+        if not os.path.exists(booklet["pdf"]):
+            entry["missing"] = True
+            return entry
+        entry["version"] = self.version(booklet["pdf"])
+        with self.lock:
+            doc = self.engine.open(booklet["pdf"])
+            entry["pages"] = [[round(page.rect.width, 2), round(page.rect.height, 2)] for page in doc]
+        return entry
+
+    def describe_all(self):
+        return [self.describe(path, booklet)
+                for path in self.manifest_paths()
+                for booklet in load_manifest(path)["booklets"]]
+
+    def page_size(self, pdf_path, page_num):
+        with self.lock:
+            doc = self.engine.open(pdf_path)
+            if not 0 <= page_num < doc.page_count:
+                raise ValueError(f"page must be 0-{doc.page_count - 1}")
+            return doc[page_num].rect
+
+    def tile(self, pdf_path, page_num, level, x, y):
+        """
+        Return a tile's PNG bytes, rendering and caching it on first use.
+
+        Raises:
+            ValueError: If the page, level or tile position is out of range
+        """
+        if not 0 <= level < len(TILE_ZOOMS):
+            raise ValueError(f"level must be 0-{len(TILE_ZOOMS) - 1}")
+        path = os.path.join(self.cache_dir, self.version(pdf_path), f"p{page_num}", f"z{level}", f"{x}_{y}.png")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+
+        rect = self.page_size(pdf_path, page_num)
+        zoom = TILE_ZOOMS[level]
+        width, height = rect.width * zoom, rect.height * zoom
+        if not (0 <= x < math.ceil(width / TILE_SIZE) and 0 <= y < math.ceil(height / TILE_SIZE)):
+            raise ValueError("tile is outside the page")
+        # Tile edges fall on whole pixels of the level, so neighbours meet exactly
+        coords = (x * TILE_SIZE / width, y * TILE_SIZE / height,
+                  min((x + 1) * TILE_SIZE / width, 1.0), min((y + 1) * TILE_SIZE / height, 1.0))
+        with self.lock:
+            data = self.engine.render_pixmap(pdf_path, page_num, coords, zoom=zoom).tobytes("png")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return data
+
+    def preview(self, booklet, crop):
+        """
+        Extract a crop into a temporary file, as extract.py would write it.
+
+        Args:
+            booklet: Booklet dict from the manifest
+            crop: Crop dict with at least page and rect (and id to use an
+                existing crop's settings)
+
+        Returns:
+            Tuple of (file bytes, content type, image_codec record)
+        """
+        existing = {c["id"]: c for c in booklet["crops"]}.get(crop.get("id"), {})
+        resolved = next(resolved for _, resolved in iter_crops({"booklets": [
+            dict(booklet, crops=[dict(existing, **crop, output="preview.png")])]}))
+        # Alternates are not shown; skip encoding them
+        resolved.pop("alternates", None)
+        with tempfile.TemporaryDirectory(prefix="crop-preview-") as tmp_dir:
+            output_path = os.path.join(tmp_dir, "preview.png")
+            with self.lock:
+                record = extract_crop(self.engine, resolved, output_path)
+            written = record.get("path", output_path)
+            with open(written, "rb") as f:
+                data = f.read()
+        content_type = "image/svg+xml" if written.endswith(".svg") else "image/png"
+        return data, content_type, record
+
+    def save(self, manifest_path, name, crop):
+        """
+        Update the crop with crop["id"] in a booklet, or add it, and write the manifest.
+
+        Returns:
+            Tuple of (the saved crop, True if it was added)
+
+        Raises:
+            KeyError: If the manifest or booklet is unknown
+            ValueError: If the crop is malformed
+        """
+        crop_id = crop.get("id")
+        if not isinstance(crop_id, str) or not crop_id.strip():
+            raise ValueError("crop needs an id")
+        updates = {key: crop[key] for key in EDITABLE_KEYS if crop.get(key) not in (None, "")}
+        if "rect" in updates:
+            updates["rect"] = parse_rect(updates["rect"])
+        if "output" in updates:
+            updates["output"] = parse_output(updates["output"])
+        if "description" in updates and not isinstance(updates["description"], str):
+            raise ValueError("description must be a string")
+        # bool is an int subclass; "page": true must not become page 1
+        if "page" in updates and (isinstance(updates["page"], bool) or not isinstance(updates["page"], int)):
+            raise ValueError("page must be an integer")
+
+        with self.lock:
+            # Re-read under the lock so two saves cannot overwrite each other
+            manifest, booklet = self.find(manifest_path, name)
+            page_count = self.engine.open(booklet["pdf"]).page_count
+            if "page" in updates and not 0 <= updates["page"] < page_count:
+                raise ValueError(f"page must be 0-{page_count - 1}")
+
+            existing = next((c for c in booklet["crops"] if c["id"] == crop_id.strip()), None)
+            if existing is None:
+                missing = [key for key in ("page", "rect", "output") if key not in updates]
+                if missing:
+                    raise ValueError(f"a new crop needs {', '.join(missing)}")
+                existing = {"id": crop_id.strip()}
+                booklet["crops"].append(existing)
+                added = True
+            else:
+                added = False
+            existing.update(updates)
+            save_manifest(manifest_path, manifest)
+        return existing, added
+
+
+class CropHandler(StaticHandler):
+    """StaticHandler plus the crop tool's /api/ routes."""
+
+    booklets = None
+
+    def query(self):
+        return {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+
+    def send_bytes(self, data, content_type, cache_control, headers=()):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", cache_control)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        route = urlsplit(self.path).path
+        if not route.startswith("/api/"):
+            super().do_GET()
+            return
+        query = self.query()
+        try:
+            if route == "/api/booklets":
+                self.send_json(HTTPStatus.OK, {"tileSize": TILE_SIZE, "zooms": TILE_ZOOMS,
+                                               "booklets": self.booklets.describe_all()})
+                return
+
+            _, booklet = self.booklets.find(query.get("manifest"), query.get("booklet"))
+            page_num = int(query.get("page", ""))
+            if route == "/api/tile":
+                data = self.booklets.tile(booklet["pdf"], page_num, int(query.get("level", "")),
+                                          int(query.get("x", "")), int(query.get("y", "")))
+                # The URL names the PDF digest, so a current tile never changes
+                current = query.get("v") == self.booklets.version(booklet["pdf"])
+                self.send_bytes(data, "image/png", IMMUTABLE_CACHE if current else "no-cache")
+            elif route == "/api/preview":
+                crop = {"page": page_num, "rect": parse_rect(query.get("rect", ""))}
+                if query.get("id"):
+                    crop["id"] = query["id"]
+                self.booklets.page_size(booklet["pdf"], page_num)
+                data, content_type, record = self.booklets.preview(booklet, crop)
+                self.send_bytes(data, content_type, "no-store", [
+                    ("X-Crop-Mode", record["mode"]),
+                    ("X-Crop-Size", f"{record['width']}x{record['height']}"),
+                    ("X-Crop-Bytes", str(len(data))),
+                    ("X-Crop-Fallback", record.get("fallback", "")),
+                ])
+            else:
+                self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+        except KeyError as error:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": error.args[0]})
+        except ValueError as error:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(error) or "Bad request"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/api/crops":
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self.send_json(HTTPStatus.LENGTH_REQUIRED, {"error": "Content-Length required"})
+            return
+        if length > MAX_BODY:
+            self.close_connection = True
+            self.send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": f"Body over {MAX_BODY} bytes"})
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(length))
+            if not isinstance(payload, dict) or not isinstance(payload.get("crop"), dict):
+                raise ValueError('Expected {"manifest", "booklet", "crop": {...}}')
+            crop, added = self.booklets.save(payload.get("manifest"), payload.get("booklet"), payload["crop"])
+        except KeyError as error:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": error.args[0]})
+            return
+        except (ValueError, UnicodeDecodeError) as error:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(error)})
+            return
+        self.log_message("Saved crop %s in %s (%s)", crop["id"], payload["manifest"], "added" if added else "updated")
+        self.send_json(HTTPStatus.OK, {"crop": crop, "added": added})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the PDF crop tool with server-side page tiles and previews.")
+    parser.add_argument("port", nargs="?", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--bind", default="localhost", help="Address to bind (default: localhost)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Directory for rendered tiles (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--quiet", action="store_true", help="Do not log each request")
+    args = parser.parse_args()
+
+    CropHandler.quiet = args.quiet
+    CropHandler.booklets = Booklets(args.cache_dir)
+    handler = partial(CropHandler, directory=os.getcwd())
+    with StaticServer((args.bind, args.port), handler) as httpd:
+        print(f"Crop tool on http://{args.bind}:{args.port}/pdf_crop_tool.html, tiles in {args.cache_dir}/")
+        print("Press Ctrl+C to stop")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopped")
+        finally:
+            CropHandler.booklets.engine.close()
+
+
+if __name__ == "__main__":
+    main()
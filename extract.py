@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Extract question images from the crop manifests in crops/.
+Usage: python3 extract.py [crops/maths.json ...] [--force] [--jobs N] [--trace report.json] [--profile out.prof] [--stats]
+
+Each manifest lists booklets (a source PDF plus default render settings) and the
+crops taken from them (page, rect, output). Resolution can be set on the booklet
+or overridden per crop with "zoom", "dpi" or a target pixel "width", so NVR rows
+can be rendered smaller than dense graphs. "raster" renders black-and-white
+booklets straight to "grey" or "1"-bit instead of RGB. "encode" picks the PNG
+mode (default "auto": 1-bit, grey or palette when the crop allows it) and
+"alternates" lists extra formats such as ["webp", "avif"]; see image_codec.py.
+"format": "svg" exports vector artwork as an SVG beside the PNG path instead
+(see vector_export.py) and points the data files at it; crops on scanned pages
+still come out as PNGs. Every crop is hashed from the PDF bytes, the crop rect
+and its render settings; crops whose hash matches the last run and whose output
+still exists are skipped, so only changed crops are rebuilt.
+
+With --jobs N the pending crops are grouped by (pdf, page) and spread across a
+process pool; each worker keeps its own open documents and page cache, and
+every output is written atomically.
+
+--trace report.json (or .csv) times each stage (open, parse, rasterise, encode
+and so on; see extract_trace.py) per page and per booklet, with bytes written
+and peak memory, and prints where the time went. --tracemalloc adds each page's
+peak Python heap. --profile out.prof runs under cProfile (in one process) and
+prints the hottest functions; open the file with `python3 -m pstats out.prof`.
+
+--stats also encodes every rebuilt crop as a plain RGB PNG, to record the
+codec's savings in crops/.codec-manifest.json. It is off by default because
+that reference encode costs about as much as the real one.
+"""
+import argparse
+import contextlib
+import cProfile
+import glob
+import hashlib
+import json
+import os
+import pstats
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from extract_engine import ENGINE_VERSION, ExtractionEngine, DEFAULT_CACHE_PAGES, print_cache_report, svg_output
+from extract_trace import Tracer, print_report, summarise, write_report
+from image_codec import print_savings, update_codec_manifest
+
+MANIFEST_DIR = "crops"
+STATE_PATH = os.path.join(MANIFEST_DIR, ".state.json")
+
+# Crop keys that set the output resolution (a target pixel width wins over
+# DPI, which wins over zoom) and the pixel format ("rgb", "grey" or "1")
+RENDER_KEYS = ("zoom", "dpi", "width", "raster")
+
+# Crop keys for the output codec stage (see image_codec.py)
+ENCODE_KEYS = ("encode", "alternates")
+
+# Output formats a crop can be written in ("format" key, default "png")
+OUTPUT_FORMATS = ("png", "svg")
+
+# Booklet keys that are inherited by every crop in the booklet
+BOOKLET_DEFAULTS = ("pdf", "format") + RENDER_KEYS + ENCODE_KEYS
+
+# Crop keys that do not affect the rendered pixels
+NON_RENDER_KEYS = ("id", "output", "description")
+
+
+def load_manifest(path):
+    """Load a crop manifest and return its dict."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    """
+    Write a crop manifest, keeping one crop per line so diffs stay readable.
+
+    Args:
+        path: Manifest path
+        manifest: Dict with a "booklets" list
+    """
+    booklets = []
+    for booklet in manifest["booklets"]:
+        lines = ["    {"]
+        for key, value in booklet.items():
+            if key != "crops":
+                lines.append(f"      {json.dumps(key)}: {json.dumps(value)},")
+        crops = ",\n".join("        " + json.dumps(crop) for crop in booklet["crops"])
+        lines.append('      "crops": [')
+        lines.append(crops)
+        lines.append("      ]")
+        lines.append("    }")
+        booklets.append("\n".join(lines))
+
+    # Written to a temporary file and renamed, so readers never see half a manifest
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write('{\n  "booklets": [\n')
+        f.write(",\n".join(booklets))
+        f.write("\n  ]\n}\n")
+    os.replace(tmp_path, path)
+
+
+def iter_crops(manifest):
+    """Yield (booklet, crop) pairs with booklet defaults applied to each crop."""
+    for booklet in manifest["booklets"]:
+        for crop in booklet["crops"]:
+            resolved = {key: booklet[key] for key in BOOKLET_DEFAULTS if key in booklet}
+            resolved.update(crop)
+            yield booklet, resolved
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {"pdfs": {}, "outputs": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def pdf_digest(pdf_path, state):
+    """
+    Return the SHA-256 of a PDF's bytes.
+
+    The digest is remembered in state alongside the file's size and mtime, so
+    an unchanged booklet is not re-read on every run.
+    """
+    stat = os.stat(pdf_path)
+    cached = state["pdfs"].get(pdf_path)
+    if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+        return cached["sha256"]
+
+    sha = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    state["pdfs"][pdf_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    return digest
+
+
+def crop_hash(crop, pdf_sha256):
+    """Hash everything that determines a crop's pixels."""
+    settings = {key: value for key, value in crop.items() if key not in NON_RENDER_KEYS}
+    settings["pdf"] = pdf_sha256
+    settings["engine"] = ENGINE_VERSION
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def written_bytes(codec):
+    """Bytes a codec record put on disk, alternates included."""
+    return codec["bytes"] + sum(alternate["bytes"] for alternate in codec["alternates"].values())
+
+
+def extract_crop(engine, crop, output_path=None, stats=False):
+    """
+    Render and encode one resolved crop with its render, encode and format settings.
+
+    Args:
+        engine: ExtractionEngine to render with
+        crop: Crop dict with booklet defaults applied (see iter_crops)
+        output_path: Where to write it instead of crop["output"]
+        stats: Also record the RGB PNG reference size (see image_codec.py)
+
+    Returns:
+        The image_codec record describing the written files
+    """
+    options = {key: crop[key] for key in RENDER_KEYS + ENCODE_KEYS if key in crop}
+    output_path = output_path or crop["output"]
+    output_format = crop.get("format", "png")
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"{crop['output']}: format must be one of {OUTPUT_FORMATS}, not {output_format!r}")
+    extract = engine.extract_svg if output_format == "svg" else engine.extract
+    return extract(crop["pdf"], crop["page"], crop["rect"], output_path, stats=stats, **options)
+
+
+def extract_page(engine, pdf_path, page_num, crops, tracer=None, stats=False):
+    """
+    Extract every pending crop from one page.
+
+    Args:
+        engine: ExtractionEngine to render with
+        pdf_path: Path to the source PDF
+        page_num: Page number (0-indexed)
+        crops: List of resolved crop dicts on that page
+        tracer: Active extract_trace.Tracer to record the page on, or None
+        stats: Also record each crop's RGB PNG reference size
+
+    Returns:
+        Tuple of (codec records by output path, cache hits, cache misses,
+        the page's trace record or None)
+    """
+    hits, misses = engine.cache.hits, engine.cache.misses
+    records = {}
+    with tracer.page(pdf_path, page_num) if tracer else contextlib.nullcontext() as page_trace:
+        for crop in crops:
+            codec = extract_crop(engine, crop, stats=stats)
+            records[crop["output"]] = codec
+            if page_trace is not None:
+                page_trace["crops"] += 1
+                page_trace["bytes"] += written_bytes(codec)
+    return records, engine.cache.hits - hits, engine.cache.misses - misses, page_trace
+
+
+# Per-process engine (and tracer, with --trace) used by --jobs workers; each
+# worker keeps its own open documents
+_worker_engine = None
+_worker_tracer = None
+
+
+def _init_worker(max_pages, trace=None):
+    global _worker_engine, _worker_tracer
+    _worker_engine = ExtractionEngine(max_pages=max_pages)
+    if trace is not None:
+        _worker_tracer = Tracer(trace_memory=trace == "memory")
+        _worker_tracer.start()
+
+
+def _extract_page_in_worker(pdf_path, page_num, crops, stats):
+    return extract_page(_worker_engine, pdf_path, page_num, crops, _worker_tracer, stats)
+
+
+def update_references(records):
+    """
+    Point the data files at each rebuilt crop's file, .svg or .png.
+
+    Args:
+        records: Dict of output path -> codec record from this run
+
+    Returns:
+        List of data files that changed
+    """
+    mapping = {}
+    for output_path, codec in records.items():
+        written = codec.get("path", output_path)
+        if written != output_path:
+            mapping[output_path] = written
+        elif os.path.exists(svg_output(output_path)):
+            # Switched back from "format": "svg"
+            mapping[svg_output(output_path)] = output_path
+    if not mapping:
+        return []
+
+    # Only needed when references move; it pulls in NumPy for its hashing
+    from asset_store import load_references, rewrite_references
+    from question_bank import write_manifest
+
+    texts, _ = load_references()
+    changed = rewrite_references(texts, mapping)
+    if changed:
+        for path in changed:
+            print(f"✓ Updated {path}")
+        write_manifest()
+    return changed
+
+
+def run(manifest_paths, force=False, max_pages=DEFAULT_CACHE_PAGES, jobs=1,
+        trace_path=None, trace_memory=False, stats=False):
+    """
+    Extract every crop in the given manifests, skipping unchanged outputs.
+
+    Args:
+        manifest_paths: List of manifest file paths
+        force: Rebuild every crop even when its hash is unchanged
+        max_pages: Size of the page-raster cache (per worker)
+        jobs: Number of worker processes; pages are distributed across them
+        trace_path: Write a per-stage timing report here (.json or .csv)
+        trace_memory: Record each page's peak Python heap in the report too
+        stats: Encode every crop as RGB PNG too, to record the codec savings
+
+    Returns:
+        Tuple of (rebuilt, skipped) counts
+    """
+    state = load_state()
+    skipped = 0
+    start = time.perf_counter()
+
+    # Group pending crops by (pdf, page) so each page is rendered by one worker
+    pages = {}
+    labels = {}
+    digests = {}
+    booklet_names = {}
+    for manifest_path in manifest_paths:
+        manifest_name = os.path.splitext(os.path.basename(manifest_path))[0]
+        for booklet, crop in iter_crops(load_manifest(manifest_path)):
+            output_path = crop["output"]
+            # Names such as "test1" repeat across manifests; titles do not
+            booklet_label = booklet.get("title") or f"{manifest_name}/{booklet['name']}"
+            booklet_names.setdefault(crop["pdf"], booklet_label)
+            digest = crop_hash(crop, pdf_digest(crop["pdf"], state))
+
+            # An SVG crop on a scanned page is written to the PNG path instead
+            written = os.path.exists(output_path) or os.path.exists(svg_output(output_path))
+            if not force and state["outputs"].get(output_path) == digest and written:
+                skipped += 1
+                continue
+
+            pages.setdefault((crop["pdf"], crop["page"]), []).append(crop)
+            labels[output_path] = f"{booklet_label} {crop['id']}"
+            digests[output_path] = digest
+
+    rebuilt = hits = misses = 0
+    codec_records = {}
+    trace = None if trace_path is None else "memory" if trace_memory else "time"
+    trace_pages = []
+
+    def record(result):
+        nonlocal rebuilt, hits, misses
+        records, page_hits, page_misses, page_trace = result
+        hits += page_hits
+        misses += page_misses
+        if page_trace is not None:
+            trace_pages.append(page_trace)
+        for output_path, codec in records.items():
+            state["outputs"][output_path] = digests[output_path]
+            codec_records[output_path] = codec
+            rebuilt += 1
+            if codec["mode"] == "svg":
+                print(f"✓ {labels[output_path]}: {codec['path']} "
+                      f"({codec['bytes'] / 1024:.1f} KB, PNG {codec['rasterBytes'] / 1024:.0f} KB)")
+            else:
+                fallback = " from scanned page" if codec.get("fallback") else ""
+                print(f"✓ {labels[output_path]}: {output_path} ({codec['mode']}{fallback}, {codec['bytes'] / 1024:.0f} KB)")
+
+    try:
+        if jobs > 1 and len(pages) > 1:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                     initargs=(max_pages, trace)) as pool:
+                futures = [pool.submit(_extract_page_in_worker, pdf_path, page_num, crops, stats)
+                           for (pdf_path, page_num), crops in pages.items()]
+                for future in as_completed(futures):
+                    record(future.result())
+        else:
+            tracer = Tracer(trace_memory) if trace else None
+            with ExtractionEngine(max_pages=max_pages) as engine, tracer or contextlib.nullcontext():
+                for (pdf_path, page_num), crops in pages.items():
+                    record(extract_page(engine, pdf_path, page_num, crops, tracer, stats))
+    finally:
+        # Keep the hashes of everything written so far, even if a page failed
+        save_state(state)
+        update_codec_manifest(codec_records)
+        update_references(codec_records)
+
+    print()
+    print(f"{rebuilt} crops rebuilt, {skipped} unchanged")
+    print_savings(codec_records)
+    print_cache_report(hits, misses, max_pages)
+
+    if trace_path:
+        report = summarise(trace_pages, booklet_names, time.perf_counter() - start)
+        write_report(report, trace_path)
+        print_report(report)
+        print(f"✓ Trace written to {trace_path}")
+
+    return rebuilt, skipped
+
+
+def main(default_manifests=None):
+    parser = argparse.ArgumentParser(description="Extract question images from crop manifests.")
+    parser.add_argument("manifests", nargs="*",
+                        help=f"Manifest files (default: every {MANIFEST_DIR}/*.json)")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild every crop, ignoring the stored hashes")
+    parser.add_argument("--cache-pages", type=int, default=DEFAULT_CACHE_PAGES,
+                        help="Number of page rasters kept in memory per worker")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Worker processes to spread pages across")
+    parser.add_argument("--trace", metavar="REPORT",
+                        help="Write per-stage timings, bytes and peak memory per page and booklet (.json or .csv)")
+    parser.add_argument("--stats", action="store_true",
+                        help="Also measure each crop as an RGB PNG and report the codec savings")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="With --trace, also record each page's peak Python heap (slower)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Run under cProfile, save the stats to FILE and print the hottest functions")
+    args = parser.parse_args()
+
+    manifests = (args.manifests or default_manifests
+                 or sorted(glob.glob(os.path.join(MANIFEST_DIR, "*.json"))))
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.cache_pages < 1:
+        parser.error("--cache-pages must be at least 1")
+    jobs = args.jobs
+    if args.tracemalloc and not args.trace:
+        parser.error("--tracemalloc needs --trace")
+    if args.profile and jobs > 1:
+        # cProfile only sees the process it runs in
+        print("! --profile runs in a single process; ignoring --jobs")
+        jobs = 1
+
+    options = dict(force=args.force, max_pages=args.cache_pages, jobs=jobs,
+                   trace_path=args.trace, trace_memory=args.tracemalloc, stats=args.stats)
+    if not args.profile:
+        return run(manifests, **options)
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(run, manifests, **options)
+    finally:
+        profiler.dump_stats(args.profile)
+        print(f"\nHottest functions (cumulative time; full stats in {args.profile}):")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Shared PDF crop engine used by the extraction scripts.
+
+Each crop renders only its own clip rectangle straight from the PDF, at a
+resolution chosen per asset (zoom, DPI or a target pixel width). Pages are
+interpreted once into a display list and kept in a small LRU cache keyed by
+(pdf path, page index), so every crop on a page reuses the parsed content and
+memory stays bounded by the cache size rather than the number of questions.
+
+Rendered pixmaps are handed to PIL (or NumPy) straight from the sample buffer
+rather than through an intermediate bytes copy. Black-and-white booklets can be
+rendered straight to greyscale or 1-bit ("raster" of "grey" or "1"), a third of
+the memory of RGB or less.
+"""
+import os
+
+import fitz  # PyMuPDF
+from PIL import Image
+from collections import OrderedDict
+from functools import lru_cache
+
+from extract_trace import stage
+from image_codec import convert, encoded_size, to_bilevel, write_image
+from vector_export import clip_to_svg, is_vector_clip, write_svg
+
+# Bump when a change to the engine alters the rendered pixels, so that
+# incremental builds know to regenerate existing outputs
+ENGINE_VERSION = 3
+
+DEFAULT_ZOOM = 3  # 3x zoom for quality
+DEFAULT_CACHE_PAGES = 4
+
+# Pixel formats a crop can be rendered in
+RASTER_MODES = ("rgb", "grey", "1")
+
+
+def print_cache_report(hits, misses, max_pages):
+    """Print page cache statistics."""
+    total = hits + misses
+    rate = (hits / total * 100) if total else 0.0
+    print(f"Page cache: {hits} hits, {misses} misses "
+          f"({rate:.0f}% hit rate, max {max_pages} pages)")
+
+
+class PageCache:
+    """
+    LRU cache of parsed pages (PyMuPDF display lists).
+
+    Args:
+        max_pages: Maximum number of pages held at once
+    """
+
+    def __init__(self, max_pages=DEFAULT_CACHE_PAGES):
+        if max_pages < 1:
+            raise ValueError("max_pages must be at least 1")
+        self.max_pages = max_pages
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+
+    def get(self, key, load):
+        """
+        Return the cached entry for key, calling load() on a miss.
+
+        Args:
+            key: Tuple starting with (pdf path, page index)
+            load: Zero-argument callable producing the entry
+        """
+        if key in self._pages:
+            self.hits += 1
+            self._pages.move_to_end(key)
+            return self._pages[key]
+
+        self.misses += 1
+        entry = load()
+        self._pages[key] = entry
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self._pages.clear()
+
+    def __len__(self):
+        return len(self._pages)
+
+
+def resolve_zoom(clip, zoom=None, dpi=None, width=None):
+    """
+    Work out the render zoom for a clip rectangle.
+
+    A target pixel width wins over DPI, which wins over an explicit zoom.
+
+    Args:
+        clip: fitz.Rect being rendered (in PDF points)
+        zoom: Scale factor relative to 72 DPI
+        dpi: Target resolution in dots per inch
+        width: Target output width in pixels
+    """
+    if width:
+        return width / clip.width
+    if dpi:
+        return dpi / 72
+    return zoom or DEFAULT_ZOOM
+
+
+def clip_rect(page_rect, crop_coords):
+    """
+    Convert percentage crop coordinates into a rectangle in PDF points.
+
+    Args:
+        page_rect: fitz.Rect of the whole page
+        crop_coords: Tuple of (left, top, right, bottom) as percentages (0.0 to 1.0)
+    """
+    return fitz.Rect(
+        page_rect.x0 + page_rect.width * crop_coords[0],
+        page_rect.y0 + page_rect.height * crop_coords[1],
+        page_rect.x0 + page_rect.width * crop_coords[2],
+        page_rect.y0 + page_rect.height * crop_coords[3],
+    )
+
+
+@lru_cache(maxsize=None)
+def _pixmap_array_type():
+    # NumPy is only needed for array output (auto_layout.py); extraction workers
+    # never import it, which keeps their resident memory down
+    import numpy as np
+
+    class PixmapArray(np.ndarray):
+        """NumPy view of a pixmap's samples that keeps the pixmap alive."""
+        pixmap = None
+
+    return PixmapArray
+
+
+def pixmap_to_array(pix):
+    """
+    Wrap a pixmap's samples as a NumPy array without copying.
+
+    The samples belong to MuPDF and are freed with the pixmap, so the returned
+    view holds a reference to it; slices of the view keep it alive in turn.
+
+    Returns:
+        uint8 array of shape (height, width) for one channel, otherwise
+        (height, width, channels)
+    """
+    import numpy as np
+
+    flat = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    array = flat.reshape(pix.height, pix.stride)[:, :pix.width * pix.n]
+    array = array.reshape(pix.height, pix.width) if pix.n == 1 else array.reshape(pix.height, pix.width, pix.n)
+    view = array.view(_pixmap_array_type())
+    view.pixmap = pix
+    return view
+
+
+def pixmap_to_image(pix):
+    """
+    Convert a PyMuPDF pixmap to a PIL image straight from its sample buffer.
+
+    Greyscale pixmaps are mapped without copying (the image keeps the pixmap
+    alive); PIL stores RGB with a padding byte per pixel, so colour is copied
+    once, with no intermediate bytes object.
+    """
+    mode = {1: "L", 3: "RGB", 4: "RGBA"}[pix.n]
+    image = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+    if image.readonly:
+        image.pixmap = pix
+    return image
+
+
+def svg_output(output_path):
+    """Return the SVG path used for a crop whose manifest output is a PNG."""
+    return os.path.splitext(output_path)[0] + ".svg"
+
+
+class ExtractionEngine:
+    """
+    Opens PDFs on demand and renders crop regions from cached display lists.
+
+    Args:
+        max_pages: Size of the page cache
+        zoom: Default render zoom used when a crop does not specify a resolution
+    """
+
+    def __init__(self, max_pages=DEFAULT_CACHE_PAGES, zoom=DEFAULT_ZOOM):
+        self.zoom = zoom
+        self.cache = PageCache(max_pages)
+        self._docs = {}
+
+    def open(self, pdf_path):
+        """Return the open document for pdf_path, opening it on first use."""
+        doc = self._docs.get(pdf_path)
+        if doc is None:
+            with stage("open"):
+                doc = fitz.open(pdf_path)
+            self._docs[pdf_path] = doc
+        return doc
+
+    def _parse_page(self, pdf_path, page_num):
+        doc = self.open(pdf_path)
+        with stage("parse"):
+            return doc[page_num].get_displaylist()
+
+    def display_list(self, pdf_path, page_num):
+        """Return the page's display list, interpreting the page on first use."""
+        return self.cache.get((pdf_path, page_num), lambda: self._parse_page(pdf_path, page_num))
+
+    def text_dict(self, pdf_path, page_num):
+        """Return the page's text layer (blocks, lines and spans) from its cached display list."""
+        text_page = self.display_list(pdf_path, page_num).get_textpage()
+        # Newer PyMuPDF returns the low-level MuPDF object here
+        if not isinstance(text_page, fitz.TextPage):
+            text_page = fitz.TextPage(text_page)
+        return text_page.extractDICT(sort=True)
+
+    def render_page(self, pdf_path, page_num, zoom=None):
+        """
+        Render a whole page as a PIL image.
+
+        Args:
+            pdf_path: Path to the source PDF
+            page_num: Page number (0-indexed)
+            zoom: Render zoom (defaults to the engine zoom)
+        """
+        return self.crop(pdf_path, page_num, (0.0, 0.0, 1.0, 1.0), zoom=zoom)
+
+    def render_pixmap(self, pdf_path, page_num, crop_coords, zoom=None, dpi=None, width=None, raster="rgb"):
+        """
+        Render only the requested region of a page to a pixmap.
+
+        Args:
+            pdf_path: Path to the source PDF
+            page_num: Page number (0-indexed)
+            crop_coords: Tuple of (left, top, right, bottom) as percentages (0.0 to 1.0)
+            zoom: Render zoom (defaults to the engine zoom)
+            dpi: Render resolution in dots per inch (overrides zoom)
+            width: Target output width in pixels (overrides dpi and zoom)
+            raster: One of RASTER_MODES; "grey" and "1" render a single channel
+        """
+        if raster not in RASTER_MODES:
+            raise ValueError(f"raster must be one of {RASTER_MODES}, not {raster!r}")
+        display_list = self.display_list(pdf_path, page_num)
+        clip = clip_rect(display_list.rect, crop_coords)
+        scale = resolve_zoom(clip, zoom or self.zoom, dpi, width)
+        colorspace = fitz.csRGB if raster == "rgb" else fitz.csGRAY
+        with stage("rasterise"):
+            return display_list.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=colorspace,
+                                           alpha=False, clip=clip)
+
+    def crop(self, pdf_path, page_num, crop_coords, raster="rgb", **render):
+        """
+        Render only the requested region of a page as a PIL image.
+
+        Takes the same arguments as render_pixmap(). The image shares the
+        pixmap's memory, except in "1" mode, which thresholds it to 1-bit.
+        """
+        pix = self.render_pixmap(pdf_path, page_num, crop_coords, raster=raster, **render)
+        with stage("image"):
+            image = pixmap_to_image(pix)
+            return to_bilevel(image) if raster == "1" else image
+
+    def crop_array(self, pdf_path, page_num, crop_coords, raster="grey", **render):
+        """
+        Render only the requested region of a page as a NumPy array (no copy).
+
+        Takes the same arguments as render_pixmap(); "1" gives a boolean ink mask.
+        """
+        array = pixmap_to_array(self.render_pixmap(
+            pdf_path, page_num, crop_coords, raster="rgb" if raster == "rgb" else "grey", **render))
+        return array < 128 if raster == "1" else array
+
+    def extract(self, pdf_path, page_num, crop_coords, output_path,
+                encode="auto", alternates=(), stats=False, **render):
+        """
+        Render a region of a page, encode it and save it to output_path.
+
+        Args:
+            encode: Encode mode for image_codec.write_image ("auto" picks the smallest)
+            alternates: Extra formats to write beside the PNG, e.g. ("webp",)
+            stats: Also record the RGB PNG reference size ("rgbBytes")
+            render: Render keywords passed to crop() (zoom, dpi, width, raster)
+
+        Returns:
+            The image_codec record describing the written files
+        """
+        image = self.crop(pdf_path, page_num, crop_coords, **render)
+        return write_image(image, output_path, encode, alternates, stats)
+
+    def extract_svg(self, pdf_path, page_num, crop_coords, output_path,
+                    encode="auto", alternates=(), stats=False, **render):
+        """
+        Export a region as SVG beside output_path, or as a raster on scanned pages.
+
+        The region is also rendered as it would be for a PNG, so the record can
+        compare the two sizes; on a page with images under the crop that raster
+        is written to output_path instead.
+
+        Returns:
+            The image_codec record; "path" is the file written and
+            "rasterBytes" the size the PNG would have been
+        """
+        image = self.crop(pdf_path, page_num, crop_coords, **render)
+        page = self.open(pdf_path)[page_num]
+        clip = clip_rect(page.rect, crop_coords)
+        with stage("svg"):
+            vector = is_vector_clip(page, clip)
+        if not vector:
+            record = write_image(image, output_path, encode, alternates, stats)
+            record.update(path=output_path, fallback="scanned")
+            return record
+
+        # Outside the "svg" stage: a display-list miss is timed as "parse"
+        text = self.text_dict(pdf_path, page_num)
+        with stage("svg"):
+            # Every crop on the page shares one pass over its drawings
+            drawings = self.cache.get((pdf_path, page_num, "drawings"), page.get_drawings)
+            svg = clip_to_svg(page, clip, drawings, text)
+        svg_path = svg_output(output_path)
+        with stage("save"):
+            write_svg(svg, svg_path)
+        record = {
+            "mode": "svg",
+            "width": image.width,
+            "height": image.height,
+            "bytes": len(svg.encode("utf-8")),
+            "path": svg_path,
+            "alternates": {},
+        }
+        with stage("stats"):
+            record["rasterBytes"] = encoded_size(convert(image, encode), "PNG", optimize=True)
+            if stats:
+                record["rgbBytes"] = encoded_size(image.convert("RGB"), "PNG")
+        return record
+
+    def report(self):
+        """Print page cache statistics for the run."""
+        print_cache_report(self.cache.hits, self.cache.misses, self.cache.max_pages)
+
+    def close(self):
+        self.cache.clear()
+        for doc in self._docs.values():
+            doc.close()
+        self._docs.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and memory tracing for the extraction pipeline.
+
+The engine and codec mark their work with `with stage("rasterise"):`. Without
+an active Tracer (the default) that is a shared no-op context, so a normal run
+pays one global lookup per stage. extract.py --trace activates one, and every
+page extracted is recorded with:
+    stages       - seconds per stage (STAGES; "other" is the page time not
+                   covered by any stage: bookkeeping and the print per file)
+    crops, bytes - crops written and bytes on disk, alternates included
+    peakRssMb    - the process's peak resident memory once the page is done,
+                   which includes MuPDF's and PIL's buffers
+    pyPeakBytes  - with --tracemalloc, the peak Python heap during the page
+                   (tracemalloc does not see MuPDF or PIL allocations)
+Pages are summed per booklet and for the run, and written as JSON, or as CSV
+with one row per page and per booklet.
+"""
+import contextlib
+import csv
+import json
+import sys
+import time
+import tracemalloc
+
+# Stages in pipeline order
+STAGES = (
+    "open",        # fitz.open of a booklet
+    "parse",       # interpreting a page into a display list
+    "rasterise",   # rendering the crop's clip to a pixmap
+    "image",       # wrapping the pixmap as a PIL image (and 1-bit thresholding)
+    "convert",     # picking the encode mode and converting to it
+    "save",        # PNG (or SVG) encoding and the atomic write
+    "stats",       # reference encodes: the PNG size of SVG crops, and RGB with --stats
+    "alternates",  # WebP/AVIF copies
+    "svg",         # collecting the vector drawings and text for an SVG crop
+)
+
+_tracer = None
+_NO_OP = contextlib.nullcontext()
+
+
+def stage(name):
+    """Return a context manager that times name on the active tracer, if any."""
+    return _NO_OP if _tracer is None else _tracer.stage(name)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (0 where unavailable)."""
+    # POSIX only; imported here so the pipeline, which imports this module,
+    # still runs on Windows
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Tracer:
+    """
+    Collects per-page stage timings while active.
+
+    Args:
+        trace_memory: Also record each page's peak Python heap with tracemalloc
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.pages = []
+        self._page = None
+
+    def start(self):
+        global _tracer
+        _tracer = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        global _tracer
+        _tracer = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._page is not None:
+                stages = self._page["stages"]
+                stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+    @contextlib.contextmanager
+    def page(self, pdf_path, page_num):
+        """
+        Record one page; yields the page dict so the caller can add crops and bytes.
+        """
+        record = {"pdf": pdf_path, "page": page_num, "crops": 0, "bytes": 0, "seconds": 0.0, "stages": {}}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._page = record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self._page = None
+            record["seconds"] = time.perf_counter() - start
+            record["stages"]["other"] = max(0.0, record["seconds"] - sum(record["stages"].values()))
+            record["peakRssMb"] = round(peak_rss_mb(), 1)
+            if self.trace_memory:
+                record["pyPeakBytes"] = tracemalloc.get_traced_memory()[1]
+            self.pages.append(record)
+
+
+def _add_stages(total, stages):
+    for name, seconds in stages.items():
+        total[name] = total.get(name, 0.0) + seconds
+
+
+def _ordered(stages):
+    order = {name: index for index, name in enumerate(STAGES + ("other",))}
+    return {name: round(stages[name], 6) for name in sorted(stages, key=lambda name: order.get(name, len(order)))}
+
+
+def summarise(pages, booklet_names=None, wall_seconds=None):
+    """
+    Sum page records per booklet and for the whole run.
+
+    Args:
+        pages: Page dicts from Tracer.page(), from any number of processes
+        booklet_names: Optional dict of pdf path -> booklet label
+        wall_seconds: Elapsed time of the run (less than the page total with --jobs)
+
+    Returns:
+        Report dict with "run", "booklets" and "pages"
+    """
+    booklet_names = booklet_names or {}
+    booklets = {}
+    for record in pages:
+        booklet = booklets.setdefault(record["pdf"], {
+            "pdf": record["pdf"], "booklet": booklet_names.get(record["pdf"], ""),
+            "pages": 0, "crops": 0, "bytes": 0, "seconds": 0.0, "stages": {}, "peakRssMb": 0.0,
+        })
+        booklet["pages"] += 1
+        booklet["crops"] += record["crops"]
+        booklet["bytes"] += record["bytes"]
+        booklet["seconds"] += record["seconds"]
+        booklet["peakRssMb"] = max(booklet["peakRssMb"], record["peakRssMb"])
+        if "pyPeakBytes" in record:
+            booklet["pyPeakBytes"] = max(booklet.get("pyPeakBytes", 0), record["pyPeakBytes"])
+        _add_stages(booklet["stages"], record["stages"])
+
+    run = {"pages": len(pages), "crops": 0, "bytes": 0, "seconds": 0.0, "stages": {},
+           "peakRssMb": max((record["peakRssMb"] for record in pages), default=0.0)}
+    if wall_seconds is not None:
+        run["wallSeconds"] = round(wall_seconds, 3)
+    for booklet in booklets.values():
+        run["crops"] += booklet["crops"]
+        run["bytes"] += booklet["bytes"]
+        run["seconds"] += booklet["seconds"]
+        _add_stages(run["stages"], booklet["stages"])
+
+    for entry in [run] + list(booklets.values()) + list(pages):
+        entry["seconds"] = round(entry["seconds"], 6)
+        entry["stages"] = _ordered(entry["stages"])
+    for record in pages:
+        record["booklet"] = booklet_names.get(record["pdf"], "")
+    return {"run": run, "booklets": list(booklets.values()), "pages": sorted(pages, key=lambda r: (r["pdf"], r["page"]))}
+
+
+def write_report(report, path):
+    """Write a report as JSON, or as CSV when path ends in .csv."""
+    if not path.endswith(".csv"):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+            f.write("\n")
+        return
+
+    stages = list(report["run"]["stages"])
+    fields = ["level", "booklet", "pdf", "page", "pages", "crops", "bytes", "seconds"] + \
+             [f"{name}_s" for name in stages] + ["peak_rss_mb", "py_peak_bytes"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        rows = [("booklet", entry) for entry in report["booklets"]] + [("page", entry) for entry in report["pages"]]
+        for level, entry in rows:
+            writer.writerow(
+                [level, entry.get("booklet", ""), entry["pdf"], entry.get("page", ""), entry.get("pages", 1),
+                 entry["crops"], entry["bytes"], entry["seconds"]]
+                + [entry["stages"].get(name, 0.0) for name in stages]
+                + [entry["peakRssMb"], entry.get("pyPeakBytes", "")]
+            )
+
+
+def print_report(report, slowest=5):
+    """Print the stage breakdown per booklet and the slowest pages."""
+    run = report["run"]
+    if not run["pages"]:
+        return
+    print(f"\nTrace: {run['pages']} pages, {run['crops']} crops, {run['bytes'] / 1024:.0f} KB written, "
+          f"peak RSS {run['peakRssMb']:.0f} MB")
+    for entry in [run] + report["booklets"]:
+        label = "all booklets" if entry is run else (entry["booklet"] or entry["pdf"])
+        total = entry["seconds"] or 1.0
+        breakdown = ", ".join(f"{name} {seconds / total:.0%}" for name, seconds in entry["stages"].items()
+                              if seconds / total >= 0.01)
+        print(f"  {label}: {entry['seconds']:.2f} s ({breakdown})")
+    pages = sorted(report["pages"], key=lambda r: -r["seconds"])[:slowest]
+    print("  Slowest pages:")
+    for record in pages:
+        top = max(record["stages"], key=record["stages"].get)
+        print(f"    {record['booklet'] or record['pdf']} page {record['page']}: {record['seconds']:.3f} s "
+              f"({record['crops']} crops, mostly {top})")
@@ -1,10 +1,33 @@
 #!/usr/bin/env python3
 """
 Generate the non-verbal-reasoning.json file with all questions, images, and answers.
+Usage: python3 generate_nvr_json.py [--atlas section|test]
+
+With --atlas, each section (20 questions) or whole test is packed into a sprite
+atlas and every question gets a "sprite" (atlas file plus pixel rectangle)
+instead of a standalone "image" path, cutting a test from 80 image requests to
+a few. The per-test shards and data/manifest.json are refreshed afterwards.
+
+Answers already in data/non-verbal-reasoning.json are kept, so a key imported
+with ingest_text.py ("fields": ["correctAnswer"]) survives a rebuild; the lists
+below only fill in questions the file does not have yet. Questions the file
+already points at an SVG export (extract.py, "format": "svg") keep it.
 """
+import argparse
 import json
+import os
+
+from question_bank import load_image_map, write_manifest
+from sprite_atlas import build_atlas
+
+parser = argparse.ArgumentParser(description="Generate data/non-verbal-reasoning.json.")
+parser.add_argument("--atlas", choices=["section", "test"],
+                    help="Pack question images into one atlas per section or per test")
+args = parser.parse_args()
+
+output_path = "data/non-verbal-reasoning.json"
 
-# Answer keys from the Parent's Guide
+# Fallback answer keys, typed in from the Parent's Guide
 answers = {
     "test1": [
         # Section 1 (Q1-20)
@@ -58,7 +81,7 @@ section_instructions = {
     4: "Decode the pattern"
 }
 
-def create_question(question_num, test_name, answer):
+def create_question(question_num, test_name, answer, image):
     """Create a question object."""
     # Determine which section this question belongs to
     if 1 <= question_num <= 20:
@@ -74,7 +97,7 @@ def create_question(question_num, test_name, answer):
         "id": question_num,
         "question": f"Question {question_num}",
         "instruction": section_instructions[section],
-        "image": f"images/non-verbal-reasoning/{test_name}/q{question_num}.png",
+        "image": image,
         "options": [
             {"letter": "A", "text": "A"},
             {"letter": "B", "text": "B"},
@@ -82,19 +105,84 @@ def create_question(question_num, test_name, answer):
             {"letter": "D", "text": "D"},
             {"letter": "E", "text": "E"}
         ],
-        "correctAnswer": answer
+        "correctAnswer": answer,
+        "category": "Pattern Completion"
+    }
+
+def load_existing_answers(path):
+    """Return {test name: {question id: correctAnswer}} from the current data file."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        existing = json.load(f)
+    return {
+        test_name: {q["id"]: q["correctAnswer"] for q in test.get("questions", []) if q.get("correctAnswer")}
+        for test_name, test in existing.items()
+    }
+
+def load_existing_images(path):
+    """Return {test name: {question id: image}} from the current data file."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        existing = json.load(f)
+    return {
+        test_name: {q["id"]: q["image"] for q in test.get("questions", []) if q.get("image")}
+        for test_name, test in existing.items()
     }
 
+def question_image_path(test_name, question_num, existing_image=None):
+    path = f"images/non-verbal-reasoning/{test_name}/q{question_num}.png"
+    # extract.py points the data file at the SVG beside the PNG for crops with
+    # "format": "svg"; keep that reference
+    if existing_image == os.path.splitext(path)[0] + ".svg":
+        return existing_image
+    return path
+
+def apply_atlases(test_name, questions, mode):
+    """Replace each question's image with its rectangle in a sprite atlas."""
+    group_size = 20 if mode == "section" else len(questions)
+
+    for start in range(0, len(questions), group_size):
+        group = questions[start:start + group_size]
+        suffix = f"section{start // group_size + 1}" if mode == "section" else "all"
+        atlas_path = f"images/non-verbal-reasoning/{test_name}/atlas-{suffix}.png"
+
+        # SVG exports scale on their own and stay standalone images
+        group = [q for q in group if not q["image"].endswith(".svg")]
+        if not group:
+            continue
+        # Read each image from the file the shards serve; asset_store.py --prune
+        # may have removed a duplicate's extracted copy
+        sources = {q["image"]: image_map.get(q["image"], q["image"]) for q in group}
+        sprites = build_atlas(list(sources.values()), atlas_path)
+        for question in group:
+            question["sprite"] = sprites[sources[question.pop("image")]]
+
+        print(f"  {atlas_path}: {len(group)} questions")
+
 # Build the complete data structure
 data = {}
+image_map = load_image_map()
+existing_answers = load_existing_answers(output_path)
+existing_images = load_existing_images(output_path)
+kept = 0
 
 for test_name in ["test1", "test2", "test3"]:
     test_num = test_name[-1]
     questions = []
 
     for q_num in range(1, 81):
-        answer = answers[test_name][q_num - 1]
-        questions.append(create_question(q_num, test_name, answer))
+        answer = existing_answers.get(test_name, {}).get(q_num)
+        if answer:
+            kept += 1
+        else:
+            answer = answers[test_name][q_num - 1]
+        image = question_image_path(test_name, q_num, existing_images.get(test_name, {}).get(q_num))
+        questions.append(create_question(q_num, test_name, answer, image))
+
+    if args.atlas:
+        apply_atlases(test_name, questions, args.atlas)
 
     data[test_name] = {
         "title": f"Non-Verbal Reasoning Test {test_num}",
@@ -102,12 +190,14 @@ for test_name in ["test1", "test2", "test3"]:
     }
 
 # Write to file
-output_path = "data/non-verbal-reasoning.json"
 with open(output_path, 'w') as f:
     json.dump(data, f, indent=2)
 
+# Refresh the per-test shards and data/manifest.json the app loads from
+write_manifest()
+
 print(f"✓ Successfully generated {output_path}")
 print(f"  - 3 tests created")
 print(f"  - 80 questions per test")
-print(f"  - 240 total questions")
+print(f"  - 240 total questions ({kept} answers kept from the existing file)")
 print(f"\nFile size: {len(json.dumps(data, indent=2))} bytes")
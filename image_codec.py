@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Pick the smallest PNG encoding for a question image and write optional alternates.
+Usage: python3 image_codec.py images/non-verbal-reasoning [--alternates webp avif] [--dry-run]
+
+Most booklet crops are black line-art, so storing them as 24-bit RGB wastes most
+of the file. Each image is classified as:
+    1    - greyscale that is almost entirely black or white (saved as 1-bit)
+    L    - other greyscale (8-bit grey)
+    P    - colour that fits a 256-colour palette (exactly, or with a mean
+           error under QUANTISE_MAX_ERROR for anti-aliased edges)
+    RGB  - everything else (left as full colour)
+
+Byte sizes, plus any WebP/AVIF alternates, are recorded in
+crops/.codec-manifest.json. With stats=True (extract.py --stats) each image is
+also encoded as plain RGB PNG for reference, so the savings can be tracked
+across runs; that second encode is skipped by default because it costs about
+as much as the real one.
+"""
+import argparse
+import io
+import json
+import os
+
+from PIL import Image, ImageChops, ImageStat, features
+
+from extract_trace import stage
+
+# A build report, kept beside extract.py's crops/.state.json rather than in the
+# served images/ tree
+CODEC_MANIFEST_PATH = os.path.join("crops", ".codec-manifest.json")
+
+ENCODE_MODES = ("auto", "1", "L", "P", "RGB")
+ALTERNATE_FORMATS = ("webp", "avif")
+
+# Share of pixels that must be near-black or near-white before a greyscale
+# image is stored as 1-bit; anti-aliased line art comfortably clears this
+BILEVEL_FRACTION = 0.99
+BILEVEL_DARK = 64
+BILEVEL_LIGHT = 192
+
+# Maximum channel difference still treated as grey
+GREY_TOLERANCE = 2
+
+# Largest mean per-channel error (0-255) accepted when quantising a colour
+# image with more than 256 colours down to a palette
+QUANTISE_MAX_ERROR = 1.0
+
+
+def save_atomic(image, output_path, **params):
+    """
+    Save a PIL image so readers never see a partially written file.
+
+    The image is written to a temporary file in the same directory and then
+    renamed over output_path, which is atomic on POSIX and Windows.
+
+    Args:
+        params: Extra encoder options passed to Image.save()
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    ext = os.path.splitext(output_path)[1].lower()
+    image_format = Image.registered_extensions()[ext]
+    tmp_path = os.path.join(output_dir, f".{os.path.basename(output_path)}.{os.getpid()}.tmp")
+    try:
+        image.save(tmp_path, format=image_format, **params)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def is_greyscale(rgb):
+    """Return True if every pixel has (near) equal R, G and B values."""
+    r, g, b = rgb.split()
+    for a, c in ((r, g), (g, b)):
+        if ImageChops.difference(a, c).getextrema()[1] > GREY_TOLERANCE:
+            return False
+    return True
+
+
+def is_bilevel(grey):
+    """Return True if a greyscale image is almost entirely black or white."""
+    histogram = grey.histogram()
+    extremes = sum(histogram[:BILEVEL_DARK]) + sum(histogram[BILEVEL_LIGHT:])
+    return extremes >= BILEVEL_FRACTION * sum(histogram)
+
+
+def to_bilevel(grey):
+    """Threshold a greyscale image to 1-bit at mid-grey."""
+    return grey.convert("L").point(lambda v: 255 if v >= 128 else 0, "1")
+
+
+def exact_palette(rgb, colors):
+    """Map an image with at most 256 colours onto a palette of exactly those colours."""
+    palette = Image.new("P", (1, 1))
+    palette.putpalette([channel for _, color in colors for channel in color])
+    return rgb.quantize(palette=palette, dither=Image.Dither.NONE)
+
+
+def quantise(rgb):
+    """
+    Reduce an image to a 256-colour palette if that is visually lossless.
+
+    Returns:
+        The palette image, or None if the mean per-channel error is too high
+    """
+    paletted = rgb.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    error = ImageStat.Stat(ImageChops.difference(rgb, paletted.convert("RGB"))).mean
+    if sum(error) / len(error) > QUANTISE_MAX_ERROR:
+        return None
+    return paletted
+
+
+def convert(image, mode="auto"):
+    """
+    Convert an image to an encode mode.
+
+    With mode "auto" the smallest safe mode is chosen: 1-bit for black-and-white
+    line art, 8-bit grey for other greyscale, a palette when the colours fit in
+    256 entries (exactly or within QUANTISE_MAX_ERROR), otherwise RGB.
+    """
+    if image.mode in ("1", "L") and mode in ("auto", "1", "L"):
+        # Rendered in grey already: skip the RGB copy and colour checks
+        if mode == "L" or (mode == "auto" and image.mode == "L" and not is_bilevel(image)):
+            return image.convert("L")
+        return image if image.mode == "1" else to_bilevel(image)
+
+    rgb = image.convert("RGB")
+    colors = rgb.getcolors(maxcolors=256)
+
+    if mode == "auto":
+        if is_greyscale(rgb):
+            mode = "1" if is_bilevel(rgb.convert("L")) else "L"
+        elif colors is not None:
+            return exact_palette(rgb, colors)
+        else:
+            return quantise(rgb) or rgb
+
+    if mode == "1":
+        return to_bilevel(rgb)
+    if mode == "L":
+        return rgb.convert("L")
+    if mode == "P":
+        if colors is not None:
+            return exact_palette(rgb, colors)
+        return rgb.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    return rgb
+
+
+def classify(image):
+    """Return the mode "auto" encoding would store an image in."""
+    return convert(image).mode
+
+
+def encoded_size(image, image_format, **params):
+    """Return the byte size of an image encoded in memory."""
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **params)
+    return buffer.tell()
+
+
+def write_image(image, output_path, encode="auto", alternates=(), stats=False):
+    """
+    Encode an image to output_path and write any alternate formats beside it.
+
+    Args:
+        image: PIL image
+        output_path: Destination PNG path
+        encode: One of ENCODE_MODES
+        alternates: Iterable of ALTERNATE_FORMATS keys, e.g. ("webp", "avif")
+        stats: Also measure the image as an RGB PNG ("rgbBytes")
+
+    Returns:
+        Dict describing the encoding, for the codec manifest
+    """
+    with stage("convert"):
+        encoded = convert(image, encode)
+    with stage("save"):
+        save_atomic(encoded, output_path, optimize=True)
+
+    record = {
+        "mode": encoded.mode,
+        "width": encoded.width,
+        "height": encoded.height,
+        "bytes": os.path.getsize(output_path),
+        "alternates": {},
+    }
+    if stats:
+        with stage("stats"):
+            record["rgbBytes"] = encoded_size(image.convert("RGB"), "PNG")
+
+    base = os.path.splitext(output_path)[0]
+    for name in alternates:
+        if not features.check(name):
+            print(f"  ! {name} is not supported by this Pillow build, skipping")
+            continue
+        alt_path = f"{base}.{name}"
+        # WebP/AVIF have no 1-bit mode; encode from greyscale instead
+        alt_image = encoded.convert("L") if encoded.mode == "1" else encoded
+        with stage("alternates"):
+            if name == "webp":
+                save_atomic(alt_image, alt_path, lossless=True, method=6)
+            else:
+                save_atomic(alt_image.convert("RGB"), alt_path, quality=80)
+        record["alternates"][name] = {"path": alt_path, "bytes": os.path.getsize(alt_path)}
+
+    return record
+
+
+def load_codec_manifest(path=CODEC_MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def update_codec_manifest(records, path=CODEC_MANIFEST_PATH):
+    """
+    Merge per-image records into the codec manifest and refresh its totals.
+
+    A record without "rgbBytes" (written without stats) keeps the reference
+    size measured for that path on an earlier run, if any; the savings totals
+    cover only images with a reference size.
+
+    Args:
+        records: Dict of output path -> record from write_image()
+        path: Manifest path
+    """
+    if not records:
+        return
+    manifest = load_codec_manifest(path)
+    images = manifest.get("images", {})
+    for output_path, record in records.items():
+        previous = images.get(output_path, {})
+        if "rgbBytes" not in record and "rgbBytes" in previous:
+            record = dict(record, rgbBytes=previous["rgbBytes"])
+        images[output_path] = record
+
+    measured = [record for record in images.values() if "rgbBytes" in record]
+    rgb_bytes = sum(record["rgbBytes"] for record in measured)
+    manifest = {
+        "totals": {
+            "images": len(images),
+            "bytes": sum(record["bytes"] for record in images.values()),
+            "measuredImages": len(measured),
+            "rgbBytes": rgb_bytes,
+            "savedBytes": rgb_bytes - sum(record["bytes"] for record in measured),
+        },
+        "images": dict(sorted(images.items())),
+    }
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def print_savings(records):
+    measured = [record for record in records.values() if "rgbBytes" in record]
+    rgb_bytes = sum(record["rgbBytes"] for record in measured)
+    png_bytes = sum(record["bytes"] for record in measured)
+    if rgb_bytes:
+        print(f"Encoded {len(measured)} images: {rgb_bytes / 1024:.0f} KB as RGB -> "
+              f"{png_bytes / 1024:.0f} KB ({(1 - png_bytes / rgb_bytes) * 100:.0f}% smaller)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode existing question images.")
+    parser.add_argument("paths", nargs="+", help="PNG files or directories to re-encode")
+    parser.add_argument("--encode", choices=ENCODE_MODES, default="auto",
+                        help="Force an encode mode instead of detecting it")
+    parser.add_argument("--alternates", nargs="*", choices=ALTERNATE_FORMATS, default=[],
+                        help="Also write these formats beside each PNG")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report the mode each image would be stored in")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(".png"))
+        else:
+            files.append(path)
+
+    records = {}
+    for path in files:
+        with Image.open(path) as image:
+            image.load()
+        if args.dry_run:
+            print(f"  {classify(image):>3}  {path}")
+            continue
+        original_bytes = os.path.getsize(path)
+        records[path] = write_image(image, path, args.encode, args.alternates)
+        # Measure savings against the file as it was, not a fresh RGB encode
+        records[path]["rgbBytes"] = original_bytes
+        print(f"✓ {records[path]['mode']:>3}  {path}")
+
+    update_codec_manifest(records)
+    print_savings(records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Write smaller copies of every question image for responsive loading.
+Usage: python3 image_variants.py [--widths 480 960] [--force]
+
+The crops are rendered for a large screen (NVR strips are about 1800 px wide),
+so a phone would otherwise download the desktop file. For each image that a
+question or passage displays, this writes a copy at each width in the ladder
+that is clearly smaller than the original:
+    images/non-verbal-reasoning/test1/q1.png
+    -> images/variants/non-verbal-reasoning/test1/q1-480w.png, ...-960w.png
+Black-and-white line art is stored as 16-level grey (a 4-bit palette PNG), which
+keeps the anti-aliasing that scaling adds at half the size of 8-bit grey.
+
+It records every image's size and variants in images/variants.json (which is
+committed; images/variants/ is not), and question_bank.py copies the sizes into
+each test shard's "images" map so the app can set width/height and reserve
+the layout space before the image arrives. build_assets.py runs this and
+writes the shards in dist/ with the variants too, for srcset/sizes. SVGs get a
+size but no variants. Images whose bytes have not changed since the last run
+are skipped. Run it after extracting or deduplicating images (including
+asset_store.py --store); it regenerates the shards itself.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from PIL import Image
+
+from image_codec import classify, write_image
+from question_bank import EXAMS, IMAGE_INFO_PATH, load_exam, test_asset_paths, write_manifest
+
+IMAGE_DIR = "images"
+VARIANT_DIR = os.path.join(IMAGE_DIR, "variants")
+
+# Rendered widths to offer besides the original: a phone, and a phone at 2x
+# or a laptop. A 1440 px copy of 1-bit line art comes out nearly as large as
+# the original, so high-density desktops just take the original.
+DEFAULT_WIDTHS = (480, 960)
+
+# A variant must be at most this fraction of the original's width, or the
+# original is served instead
+MAX_VARIANT_FRACTION = 0.85
+
+# Grey levels kept in scaled-down greyscale copies
+GREY_LEVELS = 16
+
+SVG_SIZE = re.compile(r'<svg[^>]*\bwidth="([\d.]+)"[^>]*\bheight="([\d.]+)"')
+
+
+def displayed_images():
+    """Return the images the app shows with <img> (not sprite atlases), by their served paths, sorted."""
+    paths = set()
+    for exam in EXAMS:
+        for test in load_exam(exam).values():
+            atlases = {q["sprite"]["src"] for q in test.get("questions", []) if q.get("sprite")}
+            paths.update(path for path in test_asset_paths(test) if path not in atlases)
+    return sorted(paths)
+
+
+def variant_path(path, width):
+    """Return the path of an image's copy at width, mirroring images/ under images/variants/."""
+    relative = os.path.relpath(path, IMAGE_DIR)
+    stem, extension = os.path.splitext(relative)
+    return f"{VARIANT_DIR}/{stem}-{width}w{extension}".replace(os.sep, "/")
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:16]
+
+
+def svg_size(path):
+    """Return an SVG's (width, height) from its root element, or None."""
+    with open(path, encoding="utf-8") as f:
+        match = SVG_SIZE.search(f.read(4096))
+    return (round(float(match.group(1))), round(float(match.group(2)))) if match else None
+
+
+def grey_levels(image, levels=GREY_LEVELS):
+    """Round a greyscale image to evenly spaced levels so it fits a small palette."""
+    step = 255 / (levels - 1)
+    return image.convert("L").point(lambda v: round(round(v / step) * step))
+
+
+def build_entry(path, widths):
+    """
+    Write an image's variants.
+
+    Returns:
+        Dict with the source hash, width, height and variants ([path, width,
+        bytes] from smallest to the original itself)
+    """
+    if path.lower().endswith(".svg"):
+        width, height = svg_size(path) or (0, 0)
+        return {"hash": file_hash(path), "width": width, "height": height, "variants": []}
+
+    with Image.open(path) as image:
+        image.load()
+    width, height = image.size
+    # Resample in grey or colour; a 1-bit source has no levels to average
+    source = image.convert("L") if image.mode == "1" else image
+
+    variants = []
+    for target in sorted(widths):
+        if target > width * MAX_VARIANT_FRACTION:
+            break
+        resized = source.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+        # Scaled-down line art is anti-aliased grey; thresholding it to 1-bit
+        # would erase the thinnest lines
+        encode = "auto"
+        if classify(resized) in ("1", "L"):
+            resized, encode = grey_levels(resized), "P"
+        output_path = variant_path(path, target)
+        record = write_image(resized, output_path, encode)
+        variants.append([output_path, target, record["bytes"]])
+    if variants:
+        variants.append([path, width, os.path.getsize(path)])
+    return {"hash": file_hash(path), "width": width, "height": height, "variants": variants}
+
+
+def load_info(path=IMAGE_INFO_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_info(info, path=IMAGE_INFO_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=1)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def is_current(entry, path, widths):
+    """Return True if a previous entry still matches the image and the ladder."""
+    return (
+        entry is not None
+        and entry.get("widths") == list(widths)
+        and entry["hash"] == file_hash(path)
+        and all(os.path.exists(variant) for variant, _, _ in entry["variants"])
+    )
+
+
+def build_variants(widths=DEFAULT_WIDTHS, force=False):
+    """
+    Write the variants of every displayed image, update images/variants.json
+    and regenerate the shards.
+
+    Args:
+        widths: Variant widths in pixels
+        force: Rewrite every variant, even for unchanged images
+    """
+    widths = sorted(set(widths))
+    previous = load_info().get("images", {})
+    images = {}
+    built = 0
+    for path in displayed_images():
+        if not os.path.exists(path):
+            print(f"  ! referenced but missing: {path}")
+            continue
+        entry = previous.get(path)
+        if force or not is_current(entry, path, widths):
+            entry = dict(build_entry(path, widths), widths=widths)
+            built += 1
+            sizes = ", ".join(f"{width}w {size / 1024:.0f} KB" for _, width, size in entry["variants"])
+            print(f"✓ {path}: {sizes or 'no variants'}")
+        images[path] = entry
+
+    # Remove the copies of images that are no longer displayed or were resized
+    kept = {variant for entry in images.values() for variant, _, _ in entry["variants"]}
+    removed = 0
+    for entry in previous.values():
+        for variant, _, _ in entry["variants"]:
+            if variant not in kept and variant.startswith(VARIANT_DIR + "/") and os.path.exists(variant):
+                os.remove(variant)
+                removed += 1
+
+    save_info({"images": images})
+    original = sum(entry["variants"][-1][2] for entry in images.values() if entry["variants"])
+    smallest = sum(entry["variants"][0][2] for entry in images.values() if entry["variants"])
+    print(f"\n{built} image(s) rebuilt, {len(images) - built} unchanged, {removed} stale variant(s) removed")
+    if original:
+        print(f"Smallest variants: {smallest / 1024:.0f} KB vs {original / 1024:.0f} KB at full size")
+
+    write_manifest()
+    print(f"✓ {IMAGE_INFO_PATH} and test shards updated")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write responsive width variants of question images.")
+    parser.add_argument("--widths", nargs="+", type=int, default=list(DEFAULT_WIDTHS),
+                        help=f"Variant widths in pixels (default: {' '.join(map(str, DEFAULT_WIDTHS))})")
+    parser.add_argument("--force", action="store_true", help="Rewrite every variant")
+    args = parser.parse_args()
+
+    build_variants(args.widths, args.force)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Read question text, options and answer keys from booklet text layers.
+Usage: python3 ingest_text.py ingest/maths.json [--write] [--patch changes.diff]
+       python3 ingest_text.py --exam maths --test test3 --booklet BOOKLET.pdf [--answers GUIDE.pdf]
+
+A job file lists the tests to ingest; each job names its booklet and answer
+guide, so a new exam year is one file and one run:
+    {"jobs": [{"exam": "maths", "test": "test3", "title": "Maths Test 3",
+               "booklet": "exams/Maths/Maths_3_Test Booklet.pdf", "pages": "2-17",
+               "answers": "exams/Maths/Parent's Guide.pdf", "answerSection": "3",
+               "fields": ["question", "options", "correctAnswer"]}]}
+"pages" (0-indexed, as in auto_layout.py) and "answerSection" (the "Test N" /
+"Paper N" heading in a guide covering several tests) are optional. "fields"
+limits what is taken from the PDFs; an NVR job, whose questions are images,
+would list only "correctAnswer".
+
+Every page's text layer is read once from the extraction engine's display
+list (the same parsed page extract.py crops from). Questions are found by
+their running number (1., 2., ... in order, so chart labels and page numbers
+are not mistaken for questions), options by A-E labels either one per line
+or several to a line, and the answer key by number/letter pairs. Lines that
+repeat on most pages (running headers and footers) are dropped.
+
+The result is merged into data/<exam>.json, keeping the fields the PDFs do
+not carry (category, image, sprite, explanation), and the changes are
+printed. Nothing is written without --write; --patch saves a unified diff of
+the data files for review.
+"""
+import argparse
+import difflib
+import json
+import os
+import re
+
+from auto_layout import parse_pages
+from extract_engine import ExtractionEngine
+from question_bank import DATA_DIR, write_manifest
+
+# Fields the text layer can supply
+INGEST_FIELDS = ("question", "instruction", "options", "correctAnswer")
+
+QUESTION_RE = re.compile(r"^(\d{1,3})\s*[.)]?\s+(\S.*)$|^(\d{1,3})[.)]$")
+# An option label: "A", "A.", "A)" or "(A)" followed by the option text
+OPTION_RE = re.compile(r"(?:^|\s{2,})(\(?([A-Z])([.)]?))\s+(.+?)(?=\s{2,}\(?[A-Z][.)]?\s|$)")
+LABEL_RE = re.compile(r"^\(?([A-Z])[.)]?$")
+ANSWER_RE = re.compile(r"(?<![\w.])(\d{1,3})\s*[.):]?\s+([A-Z](?:\s*(?:,|&|and)\s*[A-Z])*)(?![\w])")
+SECTION_RE = re.compile(r"^(?:test|paper)\s*(\d+)\b", re.IGNORECASE)
+# Booklet furniture that is never part of a question
+IGNORE_RE = re.compile(
+    r"^(?:\d+|page \d+( of \d+)?|(please )?turn over|go on to the next page|end of (the )?(test|paper)|"
+    r"continue on the next page)$",
+    re.IGNORECASE,
+)
+
+# A line in the top or bottom MARGIN share of the page that repeats on at
+# least REPEAT_SHARE of the pages is a running header or footer
+MARGIN = 0.08
+REPEAT_SHARE = 0.5
+# Gap between spans (in points) that separates columns on one line
+SPAN_GAP = 12
+# Runs of whitespace inside a span; two or more mark a column break
+WIDE_SPACE_RE = re.compile(r"\s{2,}")
+
+
+def normalise_spaces(text):
+    """Collapse padding to a double space and other whitespace to one space."""
+    return "  ".join(" ".join(part.split()) for part in WIDE_SPACE_RE.split(text.strip()))
+
+
+def page_lines(engine, pdf_path, page_num):
+    """
+    Read one page's text lines in reading order.
+
+    Returns:
+        List of (text, block number, in margin) tuples; spans more than
+        SPAN_GAP apart are joined with a double space, and padding of two or
+        more spaces inside a span becomes a double space, so "A 12   B 15"
+        keeps its columns either way
+    """
+    lines = []
+    page = engine.text_dict(pdf_path, page_num)
+    top, bottom = page["height"] * MARGIN, page["height"] * (1 - MARGIN)
+    for block_num, block in enumerate(page["blocks"]):
+        if block.get("type") != 0:
+            continue
+        for line in block["lines"]:
+            groups, last_x = [], None
+            for span in line["spans"]:
+                if last_x is None or span["bbox"][0] - last_x > SPAN_GAP:
+                    groups.append("")
+                groups[-1] += span["text"]
+                last_x = span["bbox"][2]
+            text = "  ".join(normalise_spaces(group) for group in groups if group.strip())
+            if text:
+                lines.append((text, block_num, not top <= line["bbox"][1] <= bottom))
+    return lines
+
+
+def document_lines(engine, pdf_path, pages=None):
+    """
+    Read the text lines of a whole PDF, without running headers and footers.
+
+    Returns:
+        List of (text, block key) pairs; the block key is (page, block number)
+    """
+    doc = engine.open(pdf_path)
+    per_page = {page: page_lines(engine, pdf_path, page) for page in parse_pages(pages, doc.page_count)}
+
+    # Count each margin line once per page, with digits masked so "Page 3" matches "Page 4"
+    seen = {}
+    for lines in per_page.values():
+        for key in {re.sub(r"\d+", "#", text) for text, _, margin in lines if margin}:
+            seen[key] = seen.get(key, 0) + 1
+    repeated = {key for key, count in seen.items() if len(per_page) >= 3 and count >= REPEAT_SHARE * len(per_page)}
+
+    return [
+        (text, (page, block))
+        for page, lines in per_page.items()
+        for text, block, margin in lines
+        if not (margin and re.sub(r"\d+", "#", text) in repeated)
+    ]
+
+
+def parse_options(text, next_letter):
+    """
+    Parse option labels on a line, continuing from next_letter.
+
+    Returns:
+        List of (letter, text), or [] if the line does not start with next_letter
+    """
+    options = []
+    for match in OPTION_RE.finditer(text):
+        _, letter, _, option = match.groups()
+        if letter != chr(ord(next_letter) + len(options)):
+            break
+        options.append((letter, option.strip()))
+    # "A bag holds..." starts a sentence, not an option list: a lone unpunctuated
+    # first label only counts when its text is short
+    if len(options) == 1 and next_letter == "A":
+        match = OPTION_RE.match(text)
+        if match.group(3) == "" and not match.group(1).startswith("(") and len(options[0][1].split()) > 4:
+            return []
+    return options
+
+
+def join_lines(lines):
+    """Join stem lines: a space within a text block, a blank line between blocks."""
+    paragraphs, last_block = [], None
+    for text, block in lines:
+        if block == last_block:
+            paragraphs[-1] += " " + text
+        else:
+            paragraphs.append(text)
+        last_block = block
+    return "\n\n".join(paragraphs)
+
+
+def parse_questions(lines):
+    """
+    Split booklet lines into questions.
+
+    Returns:
+        List of question dicts (id, question, options, and instruction when a
+        block of text precedes a run of questions)
+    """
+    questions = []
+    current = None
+    stem, pending, instruction = [], [], None
+    label = None  # an option letter on a line of its own, waiting for its text
+
+    def finish():
+        if current is not None:
+            current["question"] = join_lines(stem)
+            if instruction:
+                current["instruction"] = instruction
+
+    for text, block in lines:
+        if label:
+            current["options"].append({"letter": label, "text": text})
+            label = None
+            continue
+        match = QUESTION_RE.match(text)
+        number = match and int(match.group(1) or match.group(3))
+        if match and number == len(questions) + 1:
+            finish()
+            if pending:
+                instruction = join_lines(pending)
+                pending = []
+            current = {"id": number, "question": "", "options": []}
+            questions.append(current)
+            stem, label = [(match.group(2), block)] if match.group(2) else [], None
+            continue
+        if current is None:
+            pending.append((text, block))
+            continue
+
+        next_letter = chr(ord("A") + len(current["options"]))
+        if LABEL_RE.match(text) and LABEL_RE.match(text).group(1) == next_letter:
+            label = next_letter
+            continue
+        options = parse_options(text, next_letter)
+        if options:
+            current["options"].extend({"letter": letter, "text": option} for letter, option in options)
+        elif IGNORE_RE.match(text):
+            continue
+        elif not current["options"]:
+            stem.append((text, block))
+        else:
+            # Text after the options introduces the next questions
+            pending.append((text, block))
+    finish()
+    return questions
+
+
+def parse_answers(lines, section=None):
+    """
+    Read an answer key: "1 B", "2. D", "3) A, C" pairs in any table layout.
+
+    Args:
+        lines: Text lines of the answer guide
+        section: Only read the part under a "Test N" / "Paper N" heading
+
+    Returns:
+        Dict of question number -> list of answer letters
+    """
+    answers = {}
+    current_section = None
+    for text, _ in lines:
+        heading = SECTION_RE.match(text)
+        if heading:
+            current_section = heading.group(1)
+            continue
+        if section is not None and current_section != str(section):
+            continue
+        for number, letters in ANSWER_RE.findall(text):
+            answers.setdefault(int(number), re.findall(r"[A-Z]", letters))
+    return answers
+
+
+def build_test(job, engine, guides):
+    """
+    Ingest one job into a test dict in the data file schema.
+
+    Args:
+        job: Job dict (see the module docstring)
+        engine: ExtractionEngine shared by every job
+        guides: Answer guide path -> its lines, filled as guides are read
+    """
+    questions = []
+    if job.get("booklet"):
+        questions = parse_questions(document_lines(engine, job["booklet"], job.get("pages")))
+    if job.get("answers"):
+        if job["answers"] not in guides:
+            guides[job["answers"]] = document_lines(engine, job["answers"])
+        answers = parse_answers(guides[job["answers"]], job.get("answerSection"))
+        by_id = {question["id"]: question for question in questions}
+        for number, letters in sorted(answers.items()):
+            question = by_id.get(number)
+            if question is None:
+                if job.get("booklet"):
+                    continue  # an answer for a number the booklet does not have
+                question = by_id[number] = {"id": number}
+                questions.append(question)
+            if len(letters) > 1:
+                question["correctAnswers"] = letters
+            else:
+                question["correctAnswer"] = letters[0]
+    test = {"questions": sorted(questions, key=lambda q: q["id"])}
+    if job.get("title"):
+        test["title"] = job["title"]
+    return test
+
+
+def merge_test(existing, ingested, fields=INGEST_FIELDS):
+    """
+    Merge ingested questions into an existing test.
+
+    Only the listed fields are taken from the PDFs, and only where the text
+    layer supplied a value; every other field of an existing question is kept.
+
+    Returns:
+        The merged test dict
+    """
+    merged = json.loads(json.dumps(existing or {"questions": []}))
+    if "title" in ingested and not merged.get("title"):
+        merged["title"] = ingested["title"]
+    by_id = {question["id"]: question for question in merged.setdefault("questions", [])}
+
+    for question in ingested["questions"]:
+        target = by_id.get(question["id"])
+        if target is None:
+            target = by_id[question["id"]] = {"id": question["id"]}
+            merged["questions"].append(target)
+        for field in fields:
+            if field == "correctAnswer" and question.get("correctAnswers"):
+                target.pop("correctAnswer", None)
+                target["correctAnswers"] = question["correctAnswers"]
+            elif question.get(field):
+                if field == "correctAnswer":
+                    target.pop("correctAnswers", None)
+                target[field] = question[field]
+
+    merged["questions"].sort(key=lambda q: q["id"])
+    return merged
+
+
+def shorten(value, width=70):
+    text = json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+def describe_changes(existing, merged, ingested):
+    """Return one line per question change between two versions of a test."""
+    old = {q["id"]: q for q in (existing or {}).get("questions", [])}
+    new = {q["id"]: q for q in merged["questions"]}
+    found = {q["id"] for q in ingested["questions"]}
+    changes, missing = [], []
+    for qid in sorted(set(old) | set(new)):
+        if qid not in old:
+            changes.append(f"  + Q{qid}: {shorten(new[qid].get('question', ''))}")
+            continue
+        if qid not in found:
+            missing.append(f"Q{qid}")
+            continue
+        for field in sorted(set(old[qid]) | set(new[qid])):
+            if old[qid].get(field) != new[qid].get(field):
+                changes.append(f"  ~ Q{qid} {field}: {shorten(old[qid].get(field))} -> "
+                               f"{shorten(new[qid].get(field))}")
+    if missing:
+        changes.append(f"  ? Not found in the PDFs (kept as they are): {', '.join(missing)}")
+    return changes
+
+
+def load_jobs(args):
+    if args.jobs:
+        jobs = []
+        for path in args.jobs:
+            with open(path, encoding="utf-8") as f:
+                jobs.extend(json.load(f)["jobs"])
+        return jobs
+    if not (args.exam and args.test and (args.booklet or args.answers)):
+        raise SystemExit("Give a job file, or --exam, --test and --booklet and/or --answers")
+    job = {"exam": args.exam, "test": args.test, "booklet": args.booklet, "answers": args.answers,
+           "pages": args.pages, "answerSection": args.answer_section}
+    if args.fields:
+        job["fields"] = args.fields.split(",")
+    return [job]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest questions and answers from booklet text layers.")
+    parser.add_argument("jobs", nargs="*", help="Job files, e.g. ingest/maths-2026.json")
+    parser.add_argument("--exam", help="Exam key for a single job")
+    parser.add_argument("--test", help="Test key for a single job, e.g. test3")
+    parser.add_argument("--booklet", help="Test booklet PDF")
+    parser.add_argument("--pages", help="Booklet pages to read, 0-indexed, e.g. 2-17 (default: all)")
+    parser.add_argument("--answers", help="Answer guide PDF")
+    parser.add_argument("--answer-section", help='Read answers under the "Test N" / "Paper N" heading N')
+    parser.add_argument("--fields", help=f"Comma-separated fields to take (default: {','.join(INGEST_FIELDS)})")
+    parser.add_argument("--patch", help="Write a unified diff of the data files to this path")
+    parser.add_argument("--write", action="store_true", help="Update data/<exam>.json and the shards")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args)
+    originals, updated = {}, {}
+    guides = {}
+
+    with ExtractionEngine() as engine:
+        for job in jobs:
+            exam = job["exam"]
+            if exam not in updated:
+                with open(os.path.join(DATA_DIR, f"{exam}.json"), encoding="utf-8") as f:
+                    originals[exam] = f.read()
+                updated[exam] = json.loads(originals[exam])
+
+            ingested = build_test(job, engine, guides)
+            existing = updated[exam].get(job["test"])
+            merged = merge_test(existing, ingested, job.get("fields", INGEST_FIELDS))
+            updated[exam][job["test"]] = merged
+
+            answered = sum(1 for q in ingested["questions"] if "correctAnswer" in q or "correctAnswers" in q)
+            print(f"{exam}/{job['test']}: {len(ingested['questions'])} questions, {answered} answers")
+            changes = describe_changes(existing, merged, ingested)
+            print("\n".join(changes) if changes else "  (no changes)")
+
+    diff = []
+    for exam, text in originals.items():
+        path = os.path.join(DATA_DIR, f"{exam}.json")
+        new_text = json.dumps(updated[exam], indent=2, ensure_ascii=False)
+        diff.extend(difflib.unified_diff(text.splitlines(keepends=True), new_text.splitlines(keepends=True),
+                                         f"a/{path}", f"b/{path}"))
+        if args.write and new_text != text:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(new_text)
+            print(f"✓ Updated {path}")
+
+    if args.patch:
+        with open(args.patch, "w", encoding="utf-8") as f:
+            f.writelines(diff)
+        print(f"✓ Diff written to {args.patch}")
+    if args.write and diff:
+        write_manifest()
+        print("✓ Regenerated test shards (re-run build_precache.py before deploying)")
+    elif diff and not args.write:
+        print("\nRe-run with --write to apply.")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,7 +39,16 @@ const examTimerDefaults = {
 
 // Test progress persistence
 const STORAGE_KEY = 'elevenPlusTestProgress';
+// Legacy history blob, migrated into IndexedDB on first load
 const HISTORY_STORAGE_KEY = 'elevenPlusTestHistory';
+const HISTORY_DB_NAME = 'elevenPlusHistory';
+const HISTORY_DB_VERSION = 2;
+const HISTORY_STORE = 'results';
+// Per-day/week/month aggregates for the trends view, updated as results are saved
+const ROLLUP_STORE = 'rollups';
+const ROLLUP_AGGREGATIONS = ['day', 'week', 'month'];
+// Cap for the localStorage fallback when IndexedDB is unavailable
+const HISTORY_FALLBACK_LIMIT = 100;
 const TEST_SETUP_STORAGE_KEY = 'elevenPlusTestSetup';
 const DEFAULT_TEST_SETUP = {
     questionCount: 'all',
@@ -130,8 +139,7 @@ function checkForSavedProgress() {
 
     // Verify the saved data is valid
     if (!savedProgress.currentExam || !savedProgress.currentTest ||
-        !questionDatabase[savedProgress.currentExam] ||
-        !questionDatabase[savedProgress.currentExam][savedProgress.currentTest]) {
+        !getTestSummary(savedProgress.currentExam, savedProgress.currentTest)) {
         clearTestProgress();
         return;
     }
@@ -146,7 +154,7 @@ function showResumeModal(savedProgress) {
     const startFreshButton = document.getElementById('start-fresh-button');
 
     // Get test title for display
-    const testData = questionDatabase[savedProgress.currentExam][savedProgress.currentTest];
+    const testData = getTestSummary(savedProgress.currentExam, savedProgress.currentTest);
     const testTitle = testData.title || savedProgress.currentTest;
     const examTitleMap = {
         'maths': 'Maths',
@@ -191,7 +199,16 @@ function showResumeModal(savedProgress) {
     modal.style.display = 'flex';
 }
 
-function resumeTest(savedProgress) {
+async function resumeTest(savedProgress) {
+    let testData;
+    try {
+        testData = await loadTestShard(savedProgress.currentExam, savedProgress.currentTest);
+    } catch (error) {
+        console.error('Failed to load test questions:', error);
+        alert('Failed to load this test. Please check your connection and try again.');
+        return;
+    }
+
     // Restore state
     currentExam = savedProgress.currentExam;
     currentTest = savedProgress.currentTest;
@@ -210,8 +227,6 @@ function resumeTest(savedProgress) {
     lastTrackedQuestionIndex = null;
     lastTrackedQuestionTestKey = null;
 
-    const testData = questionDatabase[currentExam][currentTest];
-
     // Setup passage if present
     const passageTitleElement = document.getElementById('passage-title');
     const passageTextElement = document.getElementById('passage-text');
@@ -224,7 +239,8 @@ function resumeTest(savedProgress) {
     if (testData.passageImage) {
         const imagePaths = Array.isArray(testData.passageImage) ? testData.passageImage : [testData.passageImage];
         passageTextElement.innerHTML = imagePaths.map((src, index) =>
-            `<img src="${src}" alt="Reading passage page ${index + 1}" class="passage-image">`
+            `<img src="${src}"${imageAttributes(getImageInfo(testData, src))} ` +
+            `alt="Reading passage page ${index + 1}" class="passage-image">`
         ).join('');
         passageTextElement.classList.add('has-image');
     } else if (testData.passage) {
@@ -545,12 +561,12 @@ function updateQuestionCountOptions(totalQuestions) {
 }
 
 function updateSharedTimerPreview() {
-    if (!currentExam || !selectedTestKey || !questionDatabase[currentExam]) {
+    const testSummary = currentExam && selectedTestKey ? getTestSummary(currentExam, selectedTestKey) : null;
+    if (!testSummary) {
         updateTimerPreview(currentExam, 0, 'all');
         return;
     }
-    const testData = questionDatabase[currentExam][selectedTestKey];
-    const totalQuestions = testData && testData.questions ? testData.questions.length : 0;
+    const totalQuestions = testSummary.questionCount;
     const select = document.getElementById('question-count-select');
     const selectedValue = select ? select.value : 'all';
     updateTimerPreview(currentExam, totalQuestions, selectedValue);
@@ -570,11 +586,16 @@ function updateSelectedTestUI() {
 
 function setSelectedTest(testKey) {
     selectedTestKey = testKey;
-    const testData = currentExam && questionDatabase[currentExam]
-        ? questionDatabase[currentExam][selectedTestKey]
-        : null;
-    const totalQuestions = testData && testData.questions ? testData.questions.length : 0;
+    const testSummary = currentExam ? getTestSummary(currentExam, selectedTestKey) : null;
+    const totalQuestions = testSummary ? testSummary.questionCount : 0;
     updateQuestionCountOptions(totalQuestions);
+
+    // Start fetching the questions while the student picks their options
+    if (testSummary) {
+        loadTestShard(currentExam, selectedTestKey).catch(error => {
+            console.error('Failed to prefetch test questions:', error);
+        });
+    }
     updateSelectedTestUI();
     updateSharedTimerPreview();
 }
@@ -677,30 +698,48 @@ function stopTimerCountdown() {
 }
 
 // Data loading configuration
-const dataFiles = {
-    'maths': 'data/maths.json',
-    'english': 'data/english.json',
-    'verbal-reasoning': 'data/verbal-reasoning.json',
-    'non-verbal-reasoning': 'data/non-verbal-reasoning.json',
-    'verbal-skills': 'data/verbal-skills.json'
-};
+// The manifest lists every test (title, question count, categories, shard path);
+// a test's questions are fetched from its shard only when it is started.
+// Both are generated by question_bank.py.
+const QUESTION_MANIFEST_URL = 'data/manifest.json';
+let questionManifest = null;
+const testShardRequests = {};
+
+let questionManifestRequest = null;
+const examIndexRequests = {};
+// Loaded exam indexes (question_bank.py): examType -> { categories, questions }
+const examIndexes = {};
+
+// Fetch the manifest once; later calls share the same request
+function fetchQuestionManifest() {
+    if (!questionManifestRequest) {
+        questionManifestRequest = fetch(QUESTION_MANIFEST_URL)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(manifest => {
+                questionManifest = manifest;
+                Object.keys(manifest.exams).forEach(examType => {
+                    questionDatabase[examType] = questionDatabase[examType] || {};
+                });
+                return manifest;
+            })
+            .catch(error => {
+                questionManifestRequest = null;
+                throw error;
+            });
+    }
+    return questionManifestRequest;
+}
 
-// Load all question data
+// Load the question bank manifest
 async function loadQuestionData() {
     try {
-        const loadPromises = Object.entries(dataFiles).map(async ([key, filepath]) => {
-            const response = await fetch(filepath);
-            const data = await response.json();
-            return { key, data };
-        });
-
-        const results = await Promise.all(loadPromises);
-
-        results.forEach(({ key, data }) => {
-            questionDatabase[key] = data;
-        });
-
-        console.log('Question data loaded successfully');
+        await fetchQuestionManifest();
+        console.log('Question manifest loaded successfully');
         return true;
     } catch (error) {
         console.error('Error loading question data:', error);
@@ -709,8 +748,192 @@ async function loadQuestionData() {
     }
 }
 
+// Fetch an exam's question index (category, answer and image per question)
+function loadExamIndex(examType) {
+    if (!examIndexRequests[examType]) {
+        examIndexRequests[examType] = fetchQuestionManifest()
+            .then(manifest => {
+                const exam = manifest.exams[examType];
+                if (!exam || !exam.index) {
+                    throw new Error(`No index for ${examType}`);
+                }
+                return fetch(`${exam.index}?v=${exam.indexHash}`);
+            })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(index => {
+                examIndexes[examType] = index;
+                return index;
+            })
+            .catch(error => {
+                delete examIndexRequests[examType];
+                throw error;
+            });
+    }
+    return examIndexRequests[examType];
+}
+
+// Load the indexes for every exam in the test history; missing ones are skipped
+function loadHistoryIndexes() {
+    const examTypes = new Set(getTestHistory().map(test => test.examType));
+    return Promise.all(Array.from(examTypes).map(examType => loadExamIndex(examType).catch(error => {
+        console.warn(`Question index unavailable for ${examType}:`, error);
+    })));
+}
+
+// Index entry for a question: { category, correctAnswer, asset }, or null
+function lookupQuestion(examType, testKey, questionId) {
+    const index = examIndexes[examType];
+    const entry = index && index.questions[`${testKey}/${questionId}`];
+    if (!entry) {
+        return null;
+    }
+    const [categoryIndex, answer, asset] = entry;
+    return {
+        category: index.categories[categoryIndex].name,
+        correctAnswer: Array.isArray(answer) ? answer.join(', ') : answer,
+        asset
+    };
+}
+
+// Manifest entry for a test, or null if it does not exist
+function getTestSummary(examType, testKey) {
+    const exam = questionManifest && questionManifest.exams[examType];
+    return exam && exam.tests[testKey] ? exam.tests[testKey] : null;
+}
+
+// Rebuild a test from a question pack (see question_pack.py for the format)
+function decodeQuestionPack(pack) {
+    if (pack.format !== 'question-pack' || pack.version !== 1) {
+        throw new Error('Unsupported question pack');
+    }
+    const { strings, templates } = pack;
+    const questions = Array.from({ length: pack.count || 0 }, () => ({}));
+
+    pack.columns.forEach(([key, kind, data, missing]) => {
+        const skip = new Set(missing || []);
+        questions.forEach((question, row) => {
+            if (skip.has(row)) {
+                return;
+            }
+            if (kind === 'range') {
+                question[key] = data + row;
+            } else if (kind === 'chars') {
+                question[key] = data[row];
+            } else if (kind === 'str') {
+                question[key] = strings[data[row]];
+            } else if (kind === 'options') {
+                question[key] = templates[data[row]].map(([letter, text]) => ({
+                    letter: strings[letter],
+                    text: strings[text]
+                }));
+            } else {
+                question[key] = data[row];
+            }
+        });
+    });
+
+    const test = { ...pack.meta };
+    if (pack.count !== null) {
+        test.questions = questions;
+    }
+    return test;
+}
+
+// Parse the binary pack form: "QPK1", header length, JSON header, typed arrays
+function readBinaryQuestionPack(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'QPK1') {
+        throw new Error('Not a binary question pack');
+    }
+    const headerLength = view.getUint32(4, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+    const base = 8 + headerLength;
+    const arrayTypes = { 1: Uint8Array, 2: Uint16Array, 4: Uint32Array };
+    const read = ref => new arrayTypes[ref.width](buffer, base + ref.offset, ref.count);
+
+    const columns = header.columns.map(column => (
+        column[2] !== null && typeof column[2] === 'object' && !Array.isArray(column[2])
+            ? [column[0], column[1], read(column[2]), ...column.slice(3)]
+            : column
+    ));
+    const lengths = read(header.templates.lengths);
+    const pairs = read(header.templates.pairs);
+    const templates = [];
+    let position = 0;
+    lengths.forEach(length => {
+        const template = [];
+        for (let i = 0; i < length; i++) {
+            template.push([pairs[position], pairs[position + 1]]);
+            position += 2;
+        }
+        templates.push(template);
+    });
+    return { ...header, columns, templates };
+}
+
+// Fetch a test's questions into questionDatabase (once per test)
+function loadTestShard(examType, testKey) {
+    const requestKey = `${examType}/${testKey}`;
+    if (!testShardRequests[requestKey]) {
+        const summary = getTestSummary(examType, testKey);
+        if (!summary) {
+            return Promise.reject(new Error(`Unknown test: ${requestKey}`));
+        }
+        // Question packs (question_pack.py) replace the shard when the manifest lists one
+        const url = summary.pack ? `${summary.pack}?v=${summary.packHash}` : `${summary.shard}?v=${summary.hash}`;
+        testShardRequests[requestKey] = fetch(url)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                if (!summary.pack) {
+                    return response.json();
+                }
+                if (summary.pack.endsWith('.qpk')) {
+                    return response.arrayBuffer().then(buffer => decodeQuestionPack(readBinaryQuestionPack(buffer)));
+                }
+                return response.json().then(decodeQuestionPack);
+            })
+            .then(testData => {
+                questionDatabase[examType][testKey] = testData;
+                precacheTest(examType, testKey);
+                return testData;
+            })
+            .catch(error => {
+                // Allow a retry on the next attempt
+                delete testShardRequests[requestKey];
+                throw error;
+            });
+    }
+    return testShardRequests[requestKey];
+}
+
+// Ask the service worker to keep a test's shard and images for offline use
+function precacheTest(examType, testKey) {
+    if ('serviceWorker' in navigator && navigator.serviceWorker.controller) {
+        navigator.serviceWorker.controller.postMessage({ type: 'precache-test', examType, testKey });
+    }
+}
+
+function registerServiceWorker() {
+    if (!('serviceWorker' in navigator) || location.protocol === 'file:') {
+        return;
+    }
+    navigator.serviceWorker.register('sw.js').catch(error => {
+        console.warn('Service worker registration failed:', error);
+    });
+}
+
 // Initialize app
 document.addEventListener('DOMContentLoaded', async () => {
+    registerServiceWorker();
+
     // Check for debug mode
     const urlParams = new URLSearchParams(window.location.search);
     debugMode = urlParams.get('debug') === 'true';
@@ -718,15 +941,22 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     if (isPerformancePage()) {
         setupEventListeners();
+        await loadTestHistory();
         initPerformancePage();
         return;
     }
     if (isMistakesPage()) {
         setupEventListeners();
+        await loadTestHistory();
         initMistakesPage();
         return;
     }
 
+    // Read history in the background for the mistakes and trends modals
+    loadTestHistory();
+    // Send results left over from an earlier offline visit
+    flushResultEvents();
+
     window.addEventListener('beforeunload', () => {
         trackTestAbandoned('unload');
     });
@@ -822,8 +1052,8 @@ function setupEventListeners() {
                 saveTestSetupPreferences();
             }
             if (typeof gtag !== 'undefined') {
-                const testData = currentExam && selectedTestKey && questionDatabase[currentExam]
-                    ? questionDatabase[currentExam][selectedTestKey]
+                const testData = currentExam && selectedTestKey
+                    ? getTestSummary(currentExam, selectedTestKey)
                     : null;
                 gtag('event', 'timer_toggled', {
                     'exam_type': currentExam,
@@ -941,7 +1171,7 @@ function showScreen(screenId) {
 function selectExam(examType) {
     currentExam = examType;
     selectedTestKey = null;
-    const examData = questionDatabase[examType];
+    const examTests = questionManifest.exams[examType].tests;
 
     // Track exam selection in Google Analytics
     if (typeof gtag !== 'undefined') {
@@ -967,9 +1197,9 @@ function selectExam(examType) {
     const testList = document.getElementById('test-list');
     testList.innerHTML = '';
 
-    Object.keys(examData).forEach(testKey => {
-        const test = examData[testKey];
-        if (test.questions && test.questions.length > 0) {
+    Object.keys(examTests).forEach(testKey => {
+        const test = examTests[testKey];
+        if (test.questionCount > 0) {
             // Create test card container
             const testCard = document.createElement('div');
             testCard.className = 'test-card selectable';
@@ -980,7 +1210,7 @@ function selectExam(examType) {
             testInfo.className = 'test-info';
             testInfo.innerHTML = `
                 <div class="test-title">${test.title}</div>
-                <div class="test-question-count">• ${test.questions.length} questions</div>
+                <div class="test-question-count">• ${test.questionCount} questions</div>
             `;
             testCard.appendChild(testInfo);
 
@@ -1023,7 +1253,16 @@ function initTestSetupForExam(examType) {
     updateSharedTimerPreview();
 }
 
-function startTest(testKey) {
+async function startTest(testKey) {
+    let testData;
+    try {
+        testData = await loadTestShard(currentExam, testKey);
+    } catch (error) {
+        console.error('Failed to load test questions:', error);
+        alert('Failed to load this test. Please check your connection and try again.');
+        return;
+    }
+
     clearTestProgress(); // Clear any existing saved progress
     currentTest = testKey;
     currentQuestionIndex = 0;
@@ -1039,7 +1278,6 @@ function startTest(testKey) {
     questionStartTime = null;
     currentlyTimingQuestionId = null;
 
-    const testData = questionDatabase[currentExam][currentTest];
     const fullQuestionSet = testData.questions || [];
     const totalQuestions = fullQuestionSet.length;
 
@@ -1087,7 +1325,8 @@ function startTest(testKey) {
     if (testData.passageImage) {
         const imagePaths = Array.isArray(testData.passageImage) ? testData.passageImage : [testData.passageImage];
         passageTextElement.innerHTML = imagePaths.map((src, index) =>
-            `<img src="${src}" alt="Reading passage page ${index + 1}" class="passage-image">`
+            `<img src="${src}"${imageAttributes(getImageInfo(testData, src))} ` +
+            `alt="Reading passage page ${index + 1}" class="passage-image">`
         ).join('');
         passageTextElement.classList.add('has-image');
     } else if (testData.passage) {
@@ -1146,7 +1385,7 @@ function showDebugPanel() {
     let debugHTML = '<div class="debug-panel"><button class="debug-panel-toggle" onclick="toggleDebugPanel()" title="Toggle navigation">◀</button><h3>Debug: Questions</h3><ul class="debug-question-list">';
     questions.forEach((q, index) => {
         const answered = isQuestionAnswered(q) ? '✓' : '';
-        const hasImage = q.image ? '*' : '';
+        const hasImage = q.image || q.sprite ? '*' : '';
         const current = index === currentQuestionIndex ? 'current' : '';
         debugHTML += `<li class="${current}" data-index="${index}" onclick="jumpToQuestion(${index})">
             <span class="q-num">Q${q.id}${hasImage}</span> ${answered}
@@ -1283,13 +1522,15 @@ function displayQuestion() {
 
     // Display image if present (before question text)
     const imageContainer = document.getElementById('question-image');
-    if (question.image) {
-        imageContainer.innerHTML = `<img src="${question.image}" alt="Question ${question.id} diagram">`;
+    if (question.image || question.sprite) {
+        imageContainer.innerHTML = renderQuestionImage(question, `Question ${question.id} diagram`,
+            getImageInfo(testData, question.image));
         imageContainer.style.display = 'block';
     } else {
         imageContainer.innerHTML = '';
         imageContainer.style.display = 'none';
     }
+    prefetchQuestionImage(testData, questions[currentQuestionIndex + 1]);
 
     // Display question text (always shown)
     const questionTextElement = document.getElementById('question-text');
@@ -1482,6 +1723,15 @@ function selectOption(questionId, letter) {
     }
     saveTestProgress(); // Save progress after answer selection
 
+    if (selections.includes(letter)) {
+        queueResultEvent('option_selected', {
+            exam_type: currentExam,
+            test_key: currentTest,
+            question_id: questionId,
+            option_letter: letter
+        });
+    }
+
     if (typeof gtag !== 'undefined') {
         const testData = questionDatabase[currentExam] && questionDatabase[currentExam][currentTest];
         gtag('event', 'option_selected', {
@@ -1596,9 +1846,6 @@ function calculateResults() {
     // Display time efficiency insights
     displayTimeEfficiencyInsights();
 
-    // Display performance comparison if available
-    displayPerformanceComparison();
-
     // Track test completion in Google Analytics
     if (typeof gtag !== 'undefined') {
         const testData = questionDatabase[currentExam][currentTest];
@@ -1621,8 +1868,9 @@ function calculateResults() {
         });
     }
 
-    // Save test result to history for trend tracking
-    saveTestResultToHistory();
+    // Save test result to history for trend tracking, then compare it with
+    // the previous attempt at the same test
+    saveTestResultToHistory().then(displayPerformanceComparison);
 }
 
 function reviewAnswers() {
@@ -1766,20 +2014,16 @@ function calculateCategoryTimings() {
 }
 
 // Performance comparison display
-function displayPerformanceComparison() {
-    const history = getTestHistory(currentExam);
-
-    // Filter for same test
-    const sameTestHistory = history.filter(result => result.testKey === currentTest);
+async function displayPerformanceComparison() {
+    // The two most recent attempts at this test, newest first
+    const { results } = await queryTestHistory({ examType: currentExam, testKey: currentTest, limit: 2 });
 
-    if (sameTestHistory.length < 2) {
+    if (results.length < 2) {
         // Need at least 2 attempts to compare
         return;
     }
 
-    // Current result is the last one
-    const currentResult = sameTestHistory[sameTestHistory.length - 1];
-    const previousResult = sameTestHistory[sameTestHistory.length - 2];
+    const [currentResult, previousResult] = results;
 
     // Calculate deltas
     const scoreDelta = currentResult.percentage - previousResult.percentage;
@@ -1837,6 +2081,76 @@ function displayPerformanceComparison() {
     comparisonContainer.style.display = 'block';
 }
 
+// Width the question and passage images are shown at: the 800px card less
+// its padding, or the whole screen on phones
+const IMAGE_SIZES = '(max-width: 800px) 100vw, 740px';
+
+// Size and smaller copies of an image, from the shard's "images" map
+// (written by image_variants.py), or undefined
+function getImageInfo(testData, src) {
+    return testData && testData.images && src ? testData.images[src] : undefined;
+}
+
+function imageSrcset(info) {
+    return info.variants.map(([src, width]) => `${src} ${width}w`).join(', ');
+}
+
+// width/height reserve the image's space before it downloads (the CSS keeps
+// height: auto), and srcset lets a phone take a smaller copy
+function imageAttributes(info) {
+    if (!info || !info.width) return '';
+    let attributes = ` width="${info.width}" height="${info.height}"`;
+    if (info.variants && info.variants.length) {
+        attributes += ` srcset="${imageSrcset(info)}" sizes="${IMAGE_SIZES}"`;
+    }
+    return attributes;
+}
+
+// Images already requested ahead of their question
+const prefetchedImages = new Set();
+
+// Start downloading the next question's image while the current one is being
+// read, choosing the same copy its <img> will so the request is reused
+function prefetchQuestionImage(testData, question) {
+    if (!question) return;
+    const src = question.sprite ? question.sprite.src : question.image;
+    if (!src || prefetchedImages.has(src)) return;
+    prefetchedImages.add(src);
+
+    const image = new Image();
+    const info = question.sprite ? undefined : getImageInfo(testData, src);
+    if (info && info.variants && info.variants.length) {
+        image.sizes = IMAGE_SIZES;
+        image.srcset = imageSrcset(info);
+    }
+    image.src = src;
+    // Decode off the main thread too, so showing it is instant
+    if (image.decode) {
+        image.decode().catch(() => prefetchedImages.delete(src));
+    }
+}
+
+// Question image markup: a plain <img>, or a window onto a sprite atlas
+// (built by generate_nvr_json.py --atlas) scaled to the container width
+function renderQuestionImage(question, altText, info = question.imageInfo) {
+    const sprite = question.sprite;
+    if (!sprite) {
+        return `<img src="${question.image}"${imageAttributes(info)} alt="${altText}">`;
+    }
+
+    const sizeX = (sprite.atlasWidth / sprite.width) * 100;
+    const sizeY = (sprite.atlasHeight / sprite.height) * 100;
+    const posX = sprite.atlasWidth === sprite.width ? 0 : (sprite.x / (sprite.atlasWidth - sprite.width)) * 100;
+    const posY = sprite.atlasHeight === sprite.height ? 0 : (sprite.y / (sprite.atlasHeight - sprite.height)) * 100;
+
+    return `<div class="question-sprite" role="img" aria-label="${altText}" style="` +
+        `background-image: url('${sprite.src}'); ` +
+        `background-size: ${sizeX}% ${sizeY}%; ` +
+        `background-position: ${posX}% ${posY}%; ` +
+        `aspect-ratio: ${sprite.width} / ${sprite.height}; ` +
+        `max-width: ${sprite.width}px;"></div>`;
+}
+
 function escapeHtml(text) {
     const div = document.createElement('div');
     div.textContent = text;
@@ -1978,19 +2292,25 @@ function saveTestResultToHistory() {
         const isCorrect = isAnswered && areAnswersCorrect(question, selections);
 
         if (isAnswered && !isCorrect) {
+            // The rest (text, options, image, category) is looked up from the
+            // exam index and the test's questions when the mistake is shown
             incorrectQuestions.push({
                 id: question.id,
-                question: question.question,
-                category: question.category || 'Uncategorized',
-                correctAnswer: question.correctAnswer,
-                userAnswer: selections.join(', '),
-                options: question.options,
-                instruction: question.instruction,
-                image: question.image
+                userAnswer: selections.join(', ')
             });
         }
     });
 
+    // Time spent per category, summed from the per-question timings
+    const categoryTimes = {};
+    currentQuestions.forEach(question => {
+        const timeMs = questionTimings && questionTimings[question.id];
+        if (timeMs) {
+            const category = question.category || 'Uncategorized';
+            categoryTimes[category] = (categoryTimes[category] || 0) + timeMs;
+        }
+    });
+
     const testResult = {
         timestamp: Date.now(),
         date: new Date().toISOString(),
@@ -2004,6 +2324,7 @@ function saveTestResultToHistory() {
         timerTargetMs: timerTargetMs || 0,
         timerEnabled: timerEnabled || false,
         questionTimings: questionTimings || {},
+        categoryTimes: categoryTimes,
         categoryBreakdown: {},
         incorrectQuestions: incorrectQuestions
     };
@@ -2021,62 +2342,447 @@ function saveTestResultToHistory() {
         };
     });
 
-    // Get existing history
-    let history = [];
+    // Send the result to results_server.py, with this test's option selections
+    queueResultEvent('test_completed', {
+        exam_type: currentExam,
+        test_key: currentTest,
+        total_questions: totalQuestions,
+        correct_count: correctCount,
+        time_ms: testResult.timeTakenMs || null,
+        categories: Object.fromEntries(Object.entries(categoryStats)
+            .map(([category, stats]) => [category, [stats.correct, stats.total]])),
+        questions: currentQuestions.map(question => {
+            const selections = getUserSelections(question.id);
+            return [question.id, selections.length === 0 ? null : (areAnswersCorrect(question, selections) ? 1 : 0)];
+        })
+    }, testResult.timestamp);
+    flushResultEvents();
+
+    return appendTestResult(testResult)
+        .then(() => console.log('Test result saved to history'))
+        .catch(error => console.error('Failed to save test history:', error));
+}
+
+// Class results upload (results_server.py). Events wait in localStorage until
+// a batch is accepted, so results taken offline are sent on a later visit.
+const RESULTS_ENDPOINT = 'api/events';
+const PENDING_EVENTS_KEY = 'elevenPlusPendingEvents';
+const CLIENT_ID_KEY = 'elevenPlusClientId';
+// Oldest events are dropped beyond this, e.g. on a host without the endpoint
+const PENDING_EVENTS_LIMIT = 2000;
+let resultsUploadAvailable = window.location.protocol !== 'file:';
+let resultsFlushing = false;
+
+function getClientId() {
+    let clientId = localStorage.getItem(CLIENT_ID_KEY);
+    if (!clientId) {
+        clientId = typeof crypto !== 'undefined' && crypto.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+        localStorage.setItem(CLIENT_ID_KEY, clientId);
+    }
+    return clientId;
+}
+
+function readPendingEvents() {
     try {
-        const stored = localStorage.getItem(HISTORY_STORAGE_KEY);
-        if (stored) {
-            history = JSON.parse(stored);
-        }
+        return JSON.parse(localStorage.getItem(PENDING_EVENTS_KEY)) || [];
     } catch (error) {
-        console.error('Failed to load test history:', error);
+        return [];
     }
+}
 
-    // Add new result
-    history.push(testResult);
-
-    // Keep only last 100 test results to avoid storage limits
-    if (history.length > 100) {
-        history = history.slice(-100);
+function queueResultEvent(event, params, timestamp = Date.now()) {
+    if (!resultsUploadAvailable) {
+        return;
     }
-
-    // Save back to localStorage
     try {
-        localStorage.setItem(HISTORY_STORAGE_KEY, JSON.stringify(history));
-        console.log('Test result saved to history');
+        const pending = readPendingEvents();
+        pending.push({ event, client_id: getClientId(), timestamp, params });
+        localStorage.setItem(PENDING_EVENTS_KEY, JSON.stringify(pending.slice(-PENDING_EVENTS_LIMIT)));
     } catch (error) {
-        console.error('Failed to save test history:', error);
+        console.warn('Failed to queue result event:', error);
     }
 }
 
-function getTestHistory(examType = null) {
+// Send every queued event in one request; they stay queued if it fails
+async function flushResultEvents() {
+    const pending = readPendingEvents();
+    if (!resultsUploadAvailable || resultsFlushing || pending.length === 0) {
+        return;
+    }
+    resultsFlushing = true;
+    try {
+        const response = await fetch(RESULTS_ENDPOINT, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ events: pending })
+        });
+        if (response.ok) {
+            // Keep anything queued while the request was in flight
+            localStorage.setItem(PENDING_EVENTS_KEY, JSON.stringify(readPendingEvents().slice(pending.length)));
+        } else if ([404, 405, 501].includes(response.status)) {
+            // Served by a static host: stop collecting
+            resultsUploadAvailable = false;
+            localStorage.removeItem(PENDING_EVENTS_KEY);
+        } else if (response.status === 400) {
+            console.warn('Result events rejected:', await response.text());
+            localStorage.removeItem(PENDING_EVENTS_KEY);
+        }
+    } catch (error) {
+        // Offline: try again on the next test or visit
+    } finally {
+        resultsFlushing = false;
+    }
+}
+
+// Test history storage: one IndexedDB record per result, indexed by exam,
+// test and date. Saves append a single record and update the matching
+// rollups; pages read both once with loadTestHistory() and getTestHistory()
+// and getRollupBuckets() serve them from memory.
+let historyDbRequest = null;
+let historyCache = null;
+let historyCacheRequest = null;
+// `${scope}|${aggregation}` -> rollups sorted by startTs; scope is an exam or 'all'
+let historyRollups = null;
+
+function requestToPromise(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function transactionDone(transaction) {
+    return new Promise((resolve, reject) => {
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = () => reject(transaction.error);
+        transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+function readLegacyHistory() {
     try {
         const stored = localStorage.getItem(HISTORY_STORAGE_KEY);
-        if (!stored) {
-            return [];
+        return stored ? JSON.parse(stored) : [];
+    } catch (error) {
+        console.error('Failed to load test history:', error);
+        return [];
+    }
+}
+
+// Copy the old localStorage blob into the store, then remove it
+async function migrateLegacyHistory(db) {
+    const legacy = readLegacyHistory();
+    if (legacy.length > 0) {
+        const transaction = db.transaction(HISTORY_STORE, 'readwrite');
+        const store = transaction.objectStore(HISTORY_STORE);
+        legacy.forEach(result => store.add(result));
+        await transactionDone(transaction);
+        console.log(`Migrated ${legacy.length} test results to IndexedDB`);
+    }
+    localStorage.removeItem(HISTORY_STORAGE_KEY);
+}
+
+// Open (and on first use create and migrate) the history database; resolves
+// to null where IndexedDB is unavailable, and history falls back to localStorage
+function openHistoryDb() {
+    if (!historyDbRequest) {
+        historyDbRequest = new Promise((resolve, reject) => {
+            if (typeof indexedDB === 'undefined') {
+                resolve(null);
+                return;
+            }
+            const request = indexedDB.open(HISTORY_DB_NAME, HISTORY_DB_VERSION);
+            request.onupgradeneeded = event => {
+                const db = request.result;
+                if (event.oldVersion < 1) {
+                    const store = db.createObjectStore(HISTORY_STORE, { keyPath: 'id', autoIncrement: true });
+                    store.createIndex('timestamp', 'timestamp');
+                    store.createIndex('exam', ['examType', 'timestamp']);
+                    store.createIndex('test', ['examType', 'testKey', 'timestamp']);
+                }
+                if (event.oldVersion < 2) {
+                    // Filled from the existing results by ensureRollups()
+                    db.createObjectStore(ROLLUP_STORE, { keyPath: ['scope', 'aggregation', 'startTs'] });
+                }
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        })
+            .then(async db => {
+                if (db) {
+                    await migrateLegacyHistory(db);
+                    await ensureRollups(db);
+                }
+                return db;
+            })
+            .catch(error => {
+                console.warn('IndexedDB unavailable, keeping history in localStorage:', error);
+                return null;
+            });
+    }
+    return historyDbRequest;
+}
+
+// Read the whole history into memory (oldest first); later calls share the result
+function loadTestHistory() {
+    if (!historyCacheRequest) {
+        historyCacheRequest = openHistoryDb()
+            .then(async db => {
+                if (!db) {
+                    const history = readLegacyHistory();
+                    return { history, rollups: buildRollups(history) };
+                }
+                const transaction = db.transaction([HISTORY_STORE, ROLLUP_STORE]);
+                const [history, rollups] = await Promise.all([
+                    requestToPromise(transaction.objectStore(HISTORY_STORE).index('timestamp').getAll()),
+                    requestToPromise(transaction.objectStore(ROLLUP_STORE).getAll())
+                ]);
+                return { history, rollups };
+            })
+            .catch(error => {
+                console.error('Failed to load test history:', error);
+                return { history: [], rollups: [] };
+            })
+            .then(({ history, rollups }) => {
+                historyCache = history;
+                indexRollups(rollups);
+                return history;
+            });
+    }
+    return historyCacheRequest;
+}
+
+async function appendTestResult(testResult) {
+    const db = await openHistoryDb();
+    if (db) {
+        // The result and its rollups are written together or not at all
+        const transaction = db.transaction([HISTORY_STORE, ROLLUP_STORE], 'readwrite');
+        const rollupStore = transaction.objectStore(ROLLUP_STORE);
+        testResult.id = await requestToPromise(transaction.objectStore(HISTORY_STORE).add(testResult));
+        for (const [scope, aggregation, start] of rollupSlots(testResult)) {
+            const stored = await requestToPromise(rollupStore.get([scope, aggregation, start.getTime()]));
+            const rollup = stored || emptyRollup(scope, aggregation, start);
+            addToRollup(rollup, testResult);
+            rollupStore.put(rollup);
         }
+        await transactionDone(transaction);
+    } else {
+        // Keep only the most recent results to stay within localStorage limits
+        const history = readLegacyHistory();
+        history.push(testResult);
+        localStorage.setItem(HISTORY_STORAGE_KEY, JSON.stringify(history.slice(-HISTORY_FALLBACK_LIMIT)));
+    }
+    if (historyCache) {
+        historyCache.push(testResult);
+        rollupSlots(testResult).forEach(([scope, aggregation, start]) => {
+            const buckets = historyRollups.get(`${scope}|${aggregation}`) || [];
+            let rollup = buckets.find(bucket => bucket.startTs === start.getTime());
+            if (!rollup) {
+                rollup = emptyRollup(scope, aggregation, start);
+                buckets.push(rollup);
+                buckets.sort((a, b) => a.startTs - b.startTs);
+                historyRollups.set(`${scope}|${aggregation}`, buckets);
+            }
+            addToRollup(rollup, testResult);
+        });
+    }
+}
 
-        let history = JSON.parse(stored);
+// The rollups a result counts towards: each aggregation, for its exam and for 'all'
+function rollupSlots(result) {
+    const slots = [];
+    ['all', result.examType].forEach(scope => {
+        ROLLUP_AGGREGATIONS.forEach(aggregation => {
+            slots.push([scope, aggregation, getBucketStart(new Date(result.timestamp), aggregation)]);
+        });
+    });
+    return slots;
+}
+
+function emptyRollup(scope, aggregation, start) {
+    return {
+        scope,
+        aggregation,
+        startTs: start.getTime(),
+        endTs: getBucketEnd(start, aggregation).getTime(),
+        tests: 0,
+        scoreSum: 0,
+        totalQuestions: 0,
+        correctCount: 0,
+        timedTests: 0,
+        timeSumMs: 0,
+        fastestMs: null,
+        lastTimestamp: 0,
+        categories: {}
+    };
+}
 
-        // Filter by exam type if specified
-        if (examType) {
-            history = history.filter(result => result.examType === examType);
+function addToRollup(rollup, result) {
+    rollup.tests += 1;
+    rollup.scoreSum += result.percentage;
+    rollup.totalQuestions += result.totalQuestions || 0;
+    rollup.correctCount += result.correctCount || 0;
+    if (result.timeTakenMs > 0) {
+        rollup.timedTests += 1;
+        rollup.timeSumMs += result.timeTakenMs;
+        rollup.fastestMs = rollup.fastestMs === null ? result.timeTakenMs : Math.min(rollup.fastestMs, result.timeTakenMs);
+    }
+    rollup.lastTimestamp = Math.max(rollup.lastTimestamp, result.timestamp);
+
+    const categoryTimes = getCategoryTimes(result);
+    Object.entries(result.categoryBreakdown || {}).forEach(([category, stats]) => {
+        const totals = rollup.categories[category] || (rollup.categories[category] = {
+            correct: 0,
+            total: 0,
+            totalTimeMs: 0,
+            questionCount: 0
+        });
+        totals.correct += stats.correct;
+        totals.total += stats.total;
+
+        if (categoryTimes) {
+            totals.totalTimeMs += categoryTimes[category] || 0;
+            totals.questionCount += stats.total;
+        } else if (result.questionTimings && result.timeTakenMs && result.totalQuestions > 0) {
+            // No per-category times for this result: distribute total time proportionally
+            totals.totalTimeMs += result.timeTakenMs * (stats.total / result.totalQuestions);
+            totals.questionCount += stats.total;
         }
+    });
+}
 
-        // Sort by timestamp (oldest first)
-        history.sort((a, b) => a.timestamp - b.timestamp);
+function buildRollups(history) {
+    const rollups = new Map();
+    history.forEach(result => {
+        rollupSlots(result).forEach(([scope, aggregation, start]) => {
+            const key = `${scope}|${aggregation}|${start.getTime()}`;
+            if (!rollups.has(key)) {
+                rollups.set(key, emptyRollup(scope, aggregation, start));
+            }
+            addToRollup(rollups.get(key), result);
+        });
+    });
+    return Array.from(rollups.values());
+}
 
-        return history;
-    } catch (error) {
-        console.error('Failed to load test history:', error);
-        return [];
+function indexRollups(rollups) {
+    historyRollups = new Map();
+    rollups.forEach(rollup => {
+        const key = `${rollup.scope}|${rollup.aggregation}`;
+        if (!historyRollups.has(key)) {
+            historyRollups.set(key, []);
+        }
+        historyRollups.get(key).push(rollup);
+    });
+    historyRollups.forEach(buckets => buckets.sort((a, b) => a.startTs - b.startTs));
+}
+
+// Build the rollups once from results saved before they existed
+async function ensureRollups(db) {
+    const transaction = db.transaction([HISTORY_STORE, ROLLUP_STORE]);
+    const [results, rollups] = await Promise.all([
+        requestToPromise(transaction.objectStore(HISTORY_STORE).count()),
+        requestToPromise(transaction.objectStore(ROLLUP_STORE).count())
+    ]);
+    if (results === 0 || rollups > 0) {
+        return;
+    }
+
+    const history = await requestToPromise(db.transaction(HISTORY_STORE).objectStore(HISTORY_STORE).getAll());
+    // Older results have no categoryTimes; the exam indexes give exact ones
+    const examTypes = new Set(history.map(result => result.examType));
+    await Promise.all(Array.from(examTypes).map(examType => loadExamIndex(examType).catch(() => null)));
+
+    const write = db.transaction(ROLLUP_STORE, 'readwrite');
+    buildRollups(history).forEach(rollup => write.objectStore(ROLLUP_STORE).put(rollup));
+    await transactionDone(write);
+}
+
+// Rollups for an exam (or 'all') at an aggregation, oldest first
+function getRollupBuckets(scope, aggregation) {
+    return (historyRollups && historyRollups.get(`${scope}|${aggregation}`)) || [];
+}
+
+/**
+ * Read one page of history, newest first, without loading the rest.
+ * @param {Object} options - examType and testKey narrow the query; before is
+ *   an exclusive timestamp bound (the nextBefore of the previous page)
+ * @returns {Promise<{results: Array, nextBefore: number|null}>} nextBefore is
+ *   null on the last page
+ */
+async function queryTestHistory({ examType = null, testKey = null, before = Infinity, limit = 20 } = {}) {
+    const db = await openHistoryDb();
+    let results;
+    if (db) {
+        const store = db.transaction(HISTORY_STORE).objectStore(HISTORY_STORE);
+        let source = store.index('timestamp');
+        let range = IDBKeyRange.upperBound(before, true);
+        if (examType && testKey) {
+            source = store.index('test');
+            range = IDBKeyRange.bound([examType, testKey, -Infinity], [examType, testKey, before], false, true);
+        } else if (examType) {
+            source = store.index('exam');
+            range = IDBKeyRange.bound([examType, -Infinity], [examType, before], false, true);
+        }
+        results = [];
+        await new Promise((resolve, reject) => {
+            const request = source.openCursor(range, 'prev');
+            request.onsuccess = () => {
+                const cursor = request.result;
+                if (!cursor || results.length > limit) {
+                    resolve();
+                    return;
+                }
+                results.push(cursor.value);
+                cursor.continue();
+            };
+            request.onerror = () => reject(request.error);
+        });
+    } else {
+        results = readLegacyHistory()
+            .filter(result => (!examType || result.examType === examType)
+                && (!testKey || result.testKey === testKey)
+                && result.timestamp < before)
+            .sort((a, b) => b.timestamp - a.timestamp)
+            .slice(0, limit + 1);
+    }
+    // One extra record was read to tell whether another page follows
+    const hasMore = results.length > limit;
+    results = results.slice(0, limit);
+    return {
+        results,
+        nextBefore: hasMore ? results[results.length - 1].timestamp : null
+    };
+}
+
+function getTestHistory(examType = null) {
+    // Pages call loadTestHistory() before rendering
+    let history = historyCache || [];
+
+    // Filter by exam type if specified
+    if (examType) {
+        history = history.filter(result => result.examType === examType);
     }
+
+    // Sort by timestamp (oldest first)
+    return history.slice().sort((a, b) => a.timestamp - b.timestamp);
 }
 
-function clearTestHistory() {
+async function clearTestHistory() {
     if (confirm('Are you sure you want to clear all performance history? This cannot be undone.')) {
         try {
+            const db = await openHistoryDb();
+            if (db) {
+                const transaction = db.transaction([HISTORY_STORE, ROLLUP_STORE], 'readwrite');
+                transaction.objectStore(HISTORY_STORE).clear();
+                transaction.objectStore(ROLLUP_STORE).clear();
+                await transactionDone(transaction);
+            }
             localStorage.removeItem(HISTORY_STORAGE_KEY);
+            historyCache = [];
+            historyRollups = new Map();
             alert('Performance history cleared successfully.');
             // Close trends modal if open
             const trendsModal = document.getElementById('trends-modal');
@@ -2107,7 +2813,7 @@ function showPerformanceTrends() {
 
     applyTrendsPreferences(currentExam);
 
-    updateTrendsView();
+    loadTestHistory().then(updateTrendsView);
 
     // Track in Google Analytics
     if (typeof gtag !== 'undefined') {
@@ -2142,15 +2848,8 @@ function updateTrendsView() {
     const examType = examFilter === 'all' ? null : examFilter;
     saveTrendsPreferences();
 
-    // Get filtered history
-    let history = getTestHistory(examType);
-
-    if (history.length === 0) {
-        displayNoDataMessage();
-        return;
-    }
-
-    const buckets = buildTimeBuckets(history, currentTimeAggregation);
+    // Precomputed buckets, maintained as results are saved
+    const buckets = getRollupBuckets(examType || 'all', currentTimeAggregation);
     if (buckets.length === 0) {
         displayNoDataMessage();
         return;
@@ -2161,13 +2860,18 @@ function updateTrendsView() {
     const startIndex = Math.floor((timeRangeStart / 100) * totalBuckets);
     const endIndex = Math.ceil((timeRangeEnd / 100) * totalBuckets);
     const visibleBuckets = buckets.slice(startIndex, endIndex);
-    const filteredHistory = visibleBuckets.flatMap(bucket => bucket.tests);
 
-    if (filteredHistory.length === 0) {
+    if (visibleBuckets.length === 0) {
         displayNoDataMessage();
         return;
     }
 
+    // The individual results in range, for the recent-versus-older comparisons
+    const rangeStart = visibleBuckets[0].startTs;
+    const rangeEnd = visibleBuckets[visibleBuckets.length - 1].endTs;
+    const filteredHistory = getTestHistory(examType)
+        .filter(test => test.timestamp >= rangeStart && test.timestamp <= rangeEnd);
+
     currentTrendsData = filteredHistory;
 
     // Update time range label
@@ -2181,7 +2885,7 @@ function updateTrendsView() {
         document.getElementById('time-end').textContent = endDate;
     }
 
-    renderTrendsSummary(filteredHistory);
+    renderTrendsSummary(visibleBuckets, filteredHistory);
     renderHeatMap(visibleBuckets, currentTimeAggregation, examFilter);
     renderInsights(filteredHistory);
 
@@ -2248,29 +2952,6 @@ function applyTrendsPreferences(fallbackExam) {
     currentTimeAggregation = aggregationValue;
 }
 
-function buildTimeBuckets(history, aggregation) {
-    const buckets = new Map();
-
-    history.forEach(test => {
-        const start = getBucketStart(new Date(test.timestamp), aggregation);
-        const key = start.getTime();
-
-        if (!buckets.has(key)) {
-            const end = getBucketEnd(start, aggregation);
-            buckets.set(key, {
-                startTs: start.getTime(),
-                endTs: end.getTime(),
-                label: formatBucketLabel(start, end, aggregation),
-                tests: []
-            });
-        }
-
-        buckets.get(key).tests.push(test);
-    });
-
-    return Array.from(buckets.values()).sort((a, b) => a.startTs - b.startTs);
-}
-
 function getBucketStart(date, aggregation) {
     const start = new Date(date);
     start.setHours(0, 0, 0, 0);
@@ -2321,70 +3002,56 @@ function formatAggregationLabel(aggregation) {
     return 'Date';
 }
 
-function aggregateCategoryBreakdown(tests) {
-    const totals = {};
-
-    tests.forEach(test => {
-        Object.entries(test.categoryBreakdown).forEach(([category, stats]) => {
-            if (!totals[category]) {
-                totals[category] = {
-                    correct: 0,
-                    total: 0,
-                    totalTimeMs: 0,
-                    questionCount: 0
-                };
-            }
-
-            totals[category].correct += stats.correct;
-            totals[category].total += stats.total;
-
-            // Calculate time spent on this category's questions
-            if (test.questionTimings) {
-                const categoryQuestions = Object.keys(test.questionTimings).filter(qId => {
-                    // Find if this question belongs to this category
-                    // We need to check the actual question data
-                    return true; // For now, distribute time evenly
-                });
-
-                // Distribute total time proportionally to this category
-                if (test.timeTakenMs && test.totalQuestions > 0) {
-                    const categoryRatio = stats.total / test.totalQuestions;
-                    const estimatedTime = test.timeTakenMs * categoryRatio;
-                    totals[category].totalTimeMs += estimatedTime;
-                    totals[category].questionCount += stats.total;
-                }
-            }
-        });
+// Time spent per category in one test: saved with the result, or summed from
+// its per-question timings and the exam index; null when neither is available
+function getCategoryTimes(test) {
+    if (test.categoryTimes) {
+        return test.categoryTimes;
+    }
+    if (!test.questionTimings || !examIndexes[test.examType] || !test.testKey) {
+        return null;
+    }
+    const times = {};
+    Object.entries(test.questionTimings).forEach(([questionId, timeMs]) => {
+        const entry = lookupQuestion(test.examType, test.testKey, questionId);
+        const category = entry ? entry.category : 'Uncategorized';
+        times[category] = (times[category] || 0) + timeMs;
     });
+    return times;
+}
 
-    Object.values(totals).forEach(stats => {
-        stats.percentage = stats.total === 0 ? 0 : Math.round((stats.correct / stats.total) * 100);
-        stats.avgTimePerQuestion = stats.questionCount > 0
-            ? Math.round(stats.totalTimeMs / stats.questionCount)
-            : 0;
+// Percentages and average times for a rollup's category totals
+function summarizeCategories(categories) {
+    const summary = {};
+    Object.entries(categories).forEach(([category, stats]) => {
+        summary[category] = {
+            ...stats,
+            percentage: stats.total === 0 ? 0 : Math.round((stats.correct / stats.total) * 100),
+            avgTimePerQuestion: stats.questionCount > 0 ? Math.round(stats.totalTimeMs / stats.questionCount) : 0
+        };
     });
-
-    return totals;
+    return summary;
 }
 
-function renderTrendsSummary(history) {
+function renderTrendsSummary(buckets, history) {
     const summaryDiv = document.getElementById('trends-summary');
 
-    if (history.length === 0) {
+    const total = (field) => buckets.reduce((sum, bucket) => sum + bucket[field], 0);
+    const totalTests = total('tests');
+
+    if (totalTests === 0) {
         summaryDiv.innerHTML = '';
         return;
     }
 
-    const avgScore = Math.round(
-        history.reduce((sum, test) => sum + test.percentage, 0) / history.length
-    );
+    const avgScore = Math.round(total('scoreSum') / totalTests);
 
-    const totalTests = history.length;
-    const totalQuestions = history.reduce((sum, test) => sum + (test.totalQuestions || 0), 0);
-    const totalCorrect = history.reduce((sum, test) => sum + (test.correctCount || 0), 0);
+    const totalQuestions = total('totalQuestions');
+    const totalCorrect = total('correctCount');
     const totalIncorrect = Math.max(0, totalQuestions - totalCorrect);
-    const lastUpdated = history[history.length - 1]?.timestamp
-        ? new Date(history[history.length - 1].timestamp).toLocaleDateString('en-US', {
+    const lastTimestamp = Math.max(...buckets.map(bucket => bucket.lastTimestamp));
+    const lastUpdated = lastTimestamp
+        ? new Date(lastTimestamp).toLocaleDateString('en-US', {
             month: 'short',
             day: 'numeric',
             year: 'numeric'
@@ -2392,19 +3059,19 @@ function renderTrendsSummary(history) {
         : 'N/A';
 
     // Calculate time statistics
-    const testsWithTime = history.filter(t => t.timeTakenMs && t.timeTakenMs > 0);
+    const timedTests = total('timedTests');
     let avgTime = '--';
     let fastestTime = '--';
     let timeImprovement = null;
 
-    if (testsWithTime.length > 0) {
-        const avgTimeMs = testsWithTime.reduce((sum, t) => sum + t.timeTakenMs, 0) / testsWithTime.length;
-        avgTime = formatDurationFromMs(avgTimeMs);
+    if (timedTests > 0) {
+        avgTime = formatDurationFromMs(total('timeSumMs') / timedTests);
 
-        const fastestMs = Math.min(...testsWithTime.map(t => t.timeTakenMs));
+        const fastestMs = Math.min(...buckets.filter(bucket => bucket.timedTests > 0).map(bucket => bucket.fastestMs));
         fastestTime = formatDurationFromMs(fastestMs);
 
         // Calculate time improvement (recent vs older)
+        const testsWithTime = history.filter(t => t.timeTakenMs && t.timeTakenMs > 0);
         if (testsWithTime.length >= 4) {
             const recentTests = testsWithTime.slice(-3);
             const olderTests = testsWithTime.slice(0, Math.min(3, testsWithTime.length - 3));
@@ -2492,8 +3159,8 @@ function renderHeatMap(buckets, aggregation, examFilter) {
     }
 
     const summarizedBuckets = buckets.map(bucket => ({
-        ...bucket,
-        breakdown: aggregateCategoryBreakdown(bucket.tests)
+        label: formatBucketLabel(new Date(bucket.startTs), new Date(bucket.endTs), aggregation),
+        breakdown: summarizeCategories(bucket.categories)
     }));
 
     // Collect all categories across all buckets
@@ -2691,8 +3358,13 @@ function getAllIncorrectQuestions(examFilter = null) {
     history.forEach(test => {
         if (test.incorrectQuestions && test.incorrectQuestions.length > 0) {
             test.incorrectQuestions.forEach(q => {
+                // Older history entries carry a full copy of the question
+                const entry = q.category ? null : lookupQuestion(test.examType, test.testKey, q.id);
                 mistakes.push({
+                    category: entry ? entry.category : 'Uncategorized',
+                    correctAnswer: entry ? entry.correctAnswer : undefined,
                     ...q,
+                    testKey: test.testKey,
                     testName: test.testName,
                     examType: test.examType,
                     date: test.date,
@@ -2748,9 +3420,52 @@ function applyMistakesFiltersFromQuery() {
     }
 }
 
-function updateMistakesView() {
+// Fill in the question text, options and image of mistakes saved without them,
+// fetching only the tests those mistakes come from
+async function loadMistakeQuestions(mistakes) {
+    const missing = mistakes.filter(mistake => mistake.question === undefined && mistake.testKey);
+    const testKeys = new Set(missing.map(mistake => `${mistake.examType}/${mistake.testKey}`));
+
+    await Promise.all(Array.from(testKeys).map(async key => {
+        const [examType, testKey] = key.split('/');
+        try {
+            await fetchQuestionManifest();
+            await loadTestShard(examType, testKey);
+        } catch (error) {
+            console.warn(`Questions unavailable for ${key}:`, error);
+        }
+    }));
+
+    const byTest = {};
+    missing.forEach(mistake => {
+        const key = `${mistake.examType}/${mistake.testKey}`;
+        const testData = questionDatabase[mistake.examType] && questionDatabase[mistake.examType][mistake.testKey];
+        if (!byTest[key] && testData) {
+            byTest[key] = new Map(testData.questions.map(question => [question.id, question]));
+        }
+        const question = byTest[key] && byTest[key].get(mistake.id);
+        if (question) {
+            Object.assign(mistake, {
+                question: question.question,
+                options: question.options,
+                instruction: question.instruction,
+                image: question.image,
+                imageInfo: getImageInfo(testData, question.image),
+                sprite: question.sprite
+            });
+        } else {
+            mistake.question = 'Question text unavailable offline.';
+            mistake.options = [];
+        }
+    });
+}
+
+async function updateMistakesView() {
     const examFilter = document.getElementById('mistakes-exam-filter').value;
 
+    await loadTestHistory();
+    await loadHistoryIndexes();
+
     const allMistakes = getAllIncorrectQuestions(examFilter === 'all' ? null : examFilter);
 
     // Update category filter options
@@ -2779,6 +3494,8 @@ function updateMistakesView() {
         filteredMistakes = allMistakes.filter(m => m.category === categoryFilter);
     }
 
+    await loadMistakeQuestions(filteredMistakes);
+
     // Update stats
     const statsDiv = document.getElementById('mistakes-stats');
     statsDiv.innerHTML = `
@@ -2950,10 +3667,10 @@ function showQuestionDetail(mistakeIndex) {
         html += `<div class="question-detail-instruction">${mistake.instruction}</div>`;
     }
 
-    if (mistake.image) {
+    if (mistake.image || mistake.sprite) {
         html += `
             <div class="question-detail-image">
-                <img src="${mistake.image}" alt="Question diagram">
+                ${renderQuestionImage(mistake, 'Question diagram')}
             </div>
         `;
     }
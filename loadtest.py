@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Simulate a class of students starting a test at the same moment.
+Usage: python3 loadtest.py [--url http://localhost:8000] [--students 30,100,200] [--output report.json]
+
+Each simulated student replays what the app fetches when a test starts: the
+page shell (index.html, css/style.css, js/app.js), data/manifest.json, one
+test shard (or question pack) and every image that test references (question images, sprite
+atlases and passage images). The request mix is read from the files on disk,
+so it follows whatever the generators currently produce.
+
+Two scenarios are run for each class size:
+    cold  - empty browser cache: every file is downloaded
+    warm  - a repeat visit: immutable responses are not requested again and
+            the rest are revalidated with If-None-Match / If-Modified-Since
+
+Start the server to measure first (e.g. ./serve.sh or python3 -m http.server),
+then point --url at it. Results are printed and written as JSON.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+from question_bank import test_asset_paths
+
+SHELL_PATHS = ["index.html", "css/style.css", "js/app.js", "data/manifest.json"]
+DEFAULT_STUDENTS = "30,100,200"
+DEFAULT_OUTPUT = "loadtest-report.json"
+
+# Browsers open up to 6 connections per host; images are fetched over these in parallel
+CONNECTIONS_PER_STUDENT = 6
+
+
+def test_assets(root, shard_path):
+    """Return the image paths a test shard references, in first-use order."""
+    with open(os.path.join(root, shard_path), encoding="utf-8") as f:
+        return test_asset_paths(json.load(f))
+
+
+def build_sessions(root, exam=None, test=None):
+    """
+    Build one request list per available test from the manifest on disk.
+
+    Returns:
+        List of (label, [path, ...]) pairs; students are spread across them
+    """
+    with open(os.path.join(root, "data", "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    sessions = []
+    for exam_key, entry in manifest["exams"].items():
+        if exam and exam_key != exam:
+            continue
+        for test_key, summary in entry["tests"].items():
+            if (test and test_key != test) or summary["questionCount"] == 0:
+                continue
+            # The app fetches the question pack instead of the shard when there is one
+            if "pack" in summary:
+                shard_url = f"{summary['pack']}?v={summary['packHash']}"
+            else:
+                shard_url = f"{summary['shard']}?v={summary['hash']}"
+            paths = SHELL_PATHS + [shard_url] + test_assets(root, summary["shard"])
+            sessions.append((f"{exam_key}/{test_key}", paths))
+
+    if not sessions:
+        raise SystemExit("No tests match the requested --exam/--test")
+    return sessions
+
+
+class Client:
+    """A simulated browser: a few keep-alive connections and an HTTP cache."""
+
+    def __init__(self, host, port, accept_encoding):
+        self.host = host
+        self.port = port
+        self.accept_encoding = accept_encoding
+        self.cache = {}  # path -> (etag, last-modified, immutable)
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self._local.conn = conn
+        return conn
+
+    def fetch(self, path, warm):
+        """
+        Fetch one path.
+
+        Returns:
+            Dict with status, latency and bytes, or None if served from cache
+        """
+        cached = self.cache.get(path)
+        if warm and cached and cached[2]:
+            return None
+
+        headers = {"Accept-Encoding": self.accept_encoding}
+        if warm and cached:
+            if cached[0]:
+                headers["If-None-Match"] = cached[0]
+            if cached[1]:
+                headers["If-Modified-Since"] = cached[1]
+
+        start = time.perf_counter()
+        for attempt in (1, 2):
+            conn = self.connection()
+            try:
+                conn.request("GET", "/" + quote(path, safe="/?=&"), headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The server closed a kept-alive connection; reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    return {"status": 0, "latency": time.perf_counter() - start, "bytes": 0}
+        latency = time.perf_counter() - start
+
+        if response.status == 200:
+            cache_control = response.getheader("Cache-Control", "")
+            self.cache[path] = (
+                response.getheader("ETag"),
+                response.getheader("Last-Modified"),
+                "immutable" in cache_control,
+            )
+        if response.getheader("Connection", "").lower() == "close" or response.version == 10:
+            conn.close()
+            self._local.conn = None
+
+        return {"status": response.status, "latency": latency, "bytes": len(body)}
+
+
+def run_student(client, paths, warm):
+    """Fetch the shell first (as the page does), then the test's assets in parallel."""
+    start = time.perf_counter()
+    results = [client.fetch(path, warm) for path in paths[:len(SHELL_PATHS) + 1]]
+    with ThreadPoolExecutor(max_workers=CONNECTIONS_PER_STUDENT) as pool:
+        results.extend(pool.map(lambda path: client.fetch(path, warm), paths[len(SHELL_PATHS) + 1:]))
+    return [r for r in results if r is not None], time.perf_counter() - start
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def run_scenario(name, clients, sessions, warm):
+    """Start every student at once and summarise the results."""
+    barrier = threading.Barrier(len(clients))
+
+    def student(index):
+        barrier.wait()
+        return run_student(clients[index], sessions[index % len(sessions)][1], warm)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        outcomes = list(pool.map(student, range(len(clients))))
+    elapsed = time.perf_counter() - start
+
+    requests = [r for results, _ in outcomes for r in results]
+    latencies = [r["latency"] * 1000 for r in requests]
+    session_times = [duration * 1000 for _, duration in outcomes]
+    statuses = {}
+    for r in requests:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    total_bytes = sum(r["bytes"] for r in requests)
+    errors = sum(1 for r in requests if r["status"] == 0 or r["status"] >= 400)
+
+    return {
+        "scenario": name,
+        "students": len(clients),
+        "requests": len(requests),
+        "errors": errors,
+        "statuses": statuses,
+        "elapsedSeconds": round(elapsed, 3),
+        "requestsPerSecond": round(len(requests) / elapsed, 1) if elapsed else 0.0,
+        "bytes": total_bytes,
+        "megabytesPerSecond": round(total_bytes / elapsed / 1e6, 2) if elapsed else 0.0,
+        "latencyMs": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(max(latencies, default=0.0), 1),
+        },
+        "sessionMs": {
+            "p50": round(percentile(session_times, 50), 1),
+            "p95": round(percentile(session_times, 95), 1),
+            "max": round(max(session_times, default=0.0), 1),
+        },
+    }
+
+
+def print_result(result):
+    latency = result["latencyMs"]
+    print(f"  {result['scenario']:<5} {result['students']:>4} students  "
+          f"{result['requests']:>6} req  {result['errors']:>4} err  "
+          f"{result['requestsPerSecond']:>8.1f} req/s  {result['bytes'] / 1e6:>8.2f} MB  "
+          f"p50 {latency['p50']:>7.1f} ms  p95 {latency['p95']:>7.1f} ms  p99 {latency['p99']:>7.1f} ms  "
+          f"session p95 {result['sessionMs']['p95'] / 1000:>6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app's serving path.")
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the running server")
+    parser.add_argument("--students", default=DEFAULT_STUDENTS,
+                        help=f"Comma-separated class sizes to simulate (default: {DEFAULT_STUDENTS})")
+    parser.add_argument("--exam", help="Only simulate tests from this exam, e.g. non-verbal-reasoning")
+    parser.add_argument("--test", help="Only simulate this test key, e.g. test1")
+    parser.add_argument("--accept-encoding", default="gzip, br", help="Accept-Encoding header to send")
+    parser.add_argument("--root", default=".", help="App directory to read the request mix from")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    target = urlsplit(args.url)
+    sessions = build_sessions(args.root, args.exam, args.test)
+    class_sizes = [int(size) for size in args.students.split(",")]
+
+    print(f"Load testing {args.url} with {len(sessions)} test(s), "
+          f"{sum(len(paths) for _, paths in sessions) // len(sessions)} requests per student on average")
+
+    results = []
+    for size in class_sizes:
+        clients = [Client(target.hostname, target.port or 80, args.accept_encoding) for _ in range(size)]
+        for name, warm in (("cold", False), ("warm", True)):
+            result = run_scenario(name, clients, sessions, warm)
+            results.append(result)
+            print_result(result)
+
+    report = {
+        "url": args.url,
+        "generatedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "acceptEncoding": args.accept_encoding,
+        "sessions": [{"test": label, "requests": len(paths)} for label, paths in sessions],
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Write precompressed .gz (and .br, if the brotli package is installed) copies of
+the app's text assets for server.py to serve.
+Usage: python3 precompress.py [--force]
+
+Files are only recompressed when the source is newer than its compressed copy,
+and a variant is dropped if compression does not make the file smaller.
+"""
+import argparse
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # optional: .gz alone is still a large win
+    brotli = None
+
+# Files and directories served by the app; under images/ only the SVG crops
+# (and JSON) match COMPRESSIBLE_EXTENSIONS
+ASSET_ROOTS = ["index.html", "performance.html", "mistakes.html", "sw.js", "js", "css", "data", "images"]
+COMPRESSIBLE_EXTENSIONS = (".html", ".js", ".css", ".json", ".svg")
+
+# Responses smaller than this gain nothing from compression
+MIN_SIZE = 512
+
+
+def iter_assets(roots=ASSET_ROOTS):
+    for root in roots:
+        if os.path.isfile(root):
+            yield root
+            continue
+        for dirpath, _, filenames in os.walk(root):
+            for name in sorted(filenames):
+                if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                    yield os.path.join(dirpath, name)
+
+
+def compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+def precompress(path, force=False):
+    """
+    Write compressed variants of one file.
+
+    Returns:
+        Dict of suffix -> compressed size for variants that were (re)written
+    """
+    written = {}
+    source_mtime = os.path.getmtime(path)
+    data = None
+
+    for suffix, compress in compressors():
+        target = path + suffix
+        if not force and os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+            continue
+
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+
+        compressed = compress(data)
+        if len(data) < MIN_SIZE or len(compressed) >= len(data):
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+
+        tmp_path = target + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, target)
+        written[suffix] = len(compressed)
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompress text assets for server.py.")
+    parser.add_argument("--force", action="store_true", help="Recompress every file")
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli not installed; writing .gz variants only (pip install brotli for .br)")
+
+    count = 0
+    for path in iter_assets():
+        written = precompress(path, args.force)
+        if written:
+            count += 1
+            sizes = ", ".join(f"{suffix} {size / 1024:.1f} KB" for suffix, size in written.items())
+            print(f"✓ {path} ({os.path.getsize(path) / 1024:.1f} KB -> {sizes})")
+
+    print(f"\n{count} files compressed")
+
+
+if __name__ == "__main__":
+    main()
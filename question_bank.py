@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Split the question bank into per-test shards and write data/manifest.json.
+Usage: python3 question_bank.py [--packs json|binary|none]
+
+The app loads only the small manifest (test titles, question counts and
+categories) at startup and fetches a test's shard when the test starts, so the
+landing page does not wait for the whole bank. Each exam also gets an index
+(data/<exam>/index.json: category, answer and image per question, and the
+questions in each category) so the performance and mistakes pages can look
+questions up without loading any shard. Run this after editing any
+data/*.json file; generate_nvr_json.py runs it automatically.
+
+The data files always name images by their extracted paths. When
+asset_store.py has merged duplicates or published a content-addressed store,
+data/image-map.json maps those paths to the files to serve, and the shards,
+indexes and packs are written with the mapped paths.
+
+Each shard also gets an "images" map with the size of every image the test
+shows, from images/variants.json (see image_variants.py), so the app can set
+width/height and reserve the space. The smaller copies themselves are not
+committed: build_assets.py generates them and rewrites the shards in dist/
+with each image's copies for srcset.
+
+With --packs each test is also compiled into a question pack (see
+question_pack.py) and the app loads the pack instead of the shard. Packs are
+much smaller uncompressed but not after gzip, so they only help on hosts that
+do not compress JSON. The choice is remembered in the manifest.
+"""
+import argparse
+import hashlib
+import json
+import os
+
+from question_pack import encode_test, pack_json, to_binary
+
+DATA_DIR = "data"
+MANIFEST_PATH = os.path.join(DATA_DIR, "manifest.json")
+
+# Exams in the order they appear in the app
+EXAMS = ["maths", "english", "verbal-reasoning", "non-verbal-reasoning", "verbal-skills"]
+
+PACK_FORMATS = ("none", "json", "binary")
+PACK_EXTENSIONS = {"json": ".pack.json", "binary": ".qpk"}
+
+# Image sizes and width variants, written by image_variants.py
+IMAGE_INFO_PATH = "images/variants.json"
+
+# Extracted image path -> served path, written by asset_store.py
+IMAGE_MAP_PATH = os.path.join(DATA_DIR, "image-map.json")
+
+
+def compact_json(data):
+    """Serialise data without whitespace; shards are only read by the app."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def shard_path(exam, test_key):
+    return f"{DATA_DIR}/{exam}/{test_key}.json"
+
+
+def write_if_changed(path, text):
+    """Write text (or bytes) to path unless the file already holds it."""
+    data = text.encode("utf-8") if isinstance(text, str) else text
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def category_counts(questions):
+    counts = {}
+    for question in questions:
+        category = question.get("category", "Uncategorized")
+        counts[category] = counts.get(category, 0) + 1
+    return counts
+
+
+def test_asset_paths(test):
+    """Return the image paths a test references (passage, question images, sprite atlases)."""
+    paths = []
+    passage_images = test.get("passageImage") or []
+    paths.extend(passage_images if isinstance(passage_images, list) else [passage_images])
+    for question in test.get("questions", []):
+        if question.get("sprite"):
+            paths.append(question["sprite"]["src"])
+        elif question.get("image"):
+            paths.append(question["image"])
+    return list(dict.fromkeys(paths))
+
+
+def load_image_map(path=IMAGE_MAP_PATH):
+    """
+    Return extracted image path -> served path from asset_store.py, or {}.
+
+    Duplicates resolve to their canonical copy first, then to its store file.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        image_map = json.load(f)
+    duplicates = image_map.get("duplicates", {})
+    store = image_map.get("store", {})
+    resolved = {}
+    for image in set(duplicates) | set(store):
+        canonical = duplicates.get(image, image)
+        resolved[image] = store.get(canonical, canonical)
+    return {image: target for image, target in resolved.items() if target != image}
+
+
+def map_images(value, image_map):
+    """Replace every string in a test (or any JSON value) that image_map has an entry for."""
+    if isinstance(value, str):
+        return image_map.get(value, value)
+    if isinstance(value, list):
+        return [map_images(item, image_map) for item in value]
+    if isinstance(value, dict):
+        return {key: map_images(item, image_map) for key, item in value.items()}
+    return value
+
+
+def load_exam(exam, image_map=None):
+    """Read data/<exam>.json with its image paths mapped as the shards serve them."""
+    with open(os.path.join(DATA_DIR, f"{exam}.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    image_map = load_image_map() if image_map is None else image_map
+    return map_images(data, image_map) if image_map else data
+
+
+def load_image_info(path=IMAGE_INFO_PATH):
+    """Return image path -> size and variants from image_variants.py, or {}."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["images"]
+
+
+def test_images(test, image_info, variants=False):
+    """
+    Build a shard's "images" map for the images a test references.
+
+    Args:
+        test: Test dict
+        image_info: load_image_info() result
+        variants: Also list each image's smaller copies (only where they have
+            been generated, as in dist/)
+
+    Returns:
+        Dict of image path -> {"width", "height"}, plus "variants" ([[path,
+        width], ...]) when variants is set
+    """
+    images = {}
+    for path in test_asset_paths(test):
+        entry = image_info.get(path)
+        if entry:
+            images[path] = {"width": entry["width"], "height": entry["height"]}
+            if variants and entry["variants"]:
+                images[path]["variants"] = [[variant, width] for variant, width, _ in entry["variants"]]
+    return images
+
+
+def shard_test(test, image_info, variants=False):
+    """Return a test as written to its shard and pack: the data file's test plus its "images" map."""
+    images = test_images(test, image_info, variants)
+    return dict(test, images=images) if images else test
+
+
+def question_asset(question):
+    """Return the image a question displays (its sprite atlas or image), or None."""
+    if question.get("sprite"):
+        return question["sprite"]["src"]
+    return question.get("image")
+
+
+def build_exam_index(data):
+    """
+    Build the lookup index the performance and mistakes pages use.
+
+    Returns:
+        Dict with "categories" (name, count and "test/id" keys per category, in
+        first-use order) and "questions" ("test/id" -> [category index,
+        answer, asset]); the answer is a list for multi-answer questions
+    """
+    categories = []
+    category_index = {}
+    questions = {}
+    for test_key, test in data.items():
+        for question in test.get("questions", []):
+            category = question.get("category", "Uncategorized")
+            if category not in category_index:
+                category_index[category] = len(categories)
+                categories.append({"name": category, "count": 0, "questions": []})
+            key = f"{test_key}/{question['id']}"
+            entry = categories[category_index[category]]
+            entry["count"] += 1
+            entry["questions"].append(key)
+            answer = question.get("correctAnswers") or question.get("correctAnswer")
+            questions[key] = [category_index[category], answer, question_asset(question)]
+    return {"categories": categories, "questions": questions}
+
+
+def write_exam_shards(exam, data, packs="none", image_info=None, variants=False):
+    """
+    Write one shard (and optionally a pack) per test, plus the exam's question
+    index, and return the exam's manifest entry.
+
+    Args:
+        exam: Exam key, e.g. "maths"
+        data: Exam data as stored in data/<exam>.json (test key -> test)
+        packs: One of PACK_FORMATS
+        image_info: load_image_info() result, copied into each shard
+        variants: Include the images' smaller copies (see test_images())
+    """
+    tests = {}
+    for test_key, test in data.items():
+        test = shard_test(test, image_info or {}, variants)
+        text = compact_json(test)
+        path = shard_path(exam, test_key)
+        write_if_changed(path, text)
+
+        questions = test.get("questions", [])
+        tests[test_key] = {
+            "title": test.get("title", test_key),
+            "questionCount": len(questions),
+            "categories": category_counts(questions),
+            "shard": path,
+            "hash": hashlib.sha256(text.encode("utf-8")).hexdigest()[:12],
+        }
+
+        if packs != "none":
+            pack = encode_test(test)
+            pack_data = to_binary(pack) if packs == "binary" else pack_json(pack).encode("utf-8")
+            pack_path = f"{DATA_DIR}/{exam}/{test_key}{PACK_EXTENSIONS[packs]}"
+            write_if_changed(pack_path, pack_data)
+            tests[test_key]["pack"] = pack_path
+            tests[test_key]["packHash"] = hashlib.sha256(pack_data).hexdigest()[:12]
+
+    index_text = compact_json(build_exam_index(data))
+    index_path = f"{DATA_DIR}/{exam}/index.json"
+    write_if_changed(index_path, index_text)
+    return {
+        "index": index_path,
+        "indexHash": hashlib.sha256(index_text.encode("utf-8")).hexdigest()[:12],
+        "tests": tests,
+    }
+
+
+def write_manifest(exams=EXAMS, packs=None, variants=False):
+    """
+    Shard every exam's data file and write data/manifest.json.
+
+    Args:
+        exams: Exam keys to include
+        packs: One of PACK_FORMATS, or None to keep the manifest's current choice
+        variants: List the images' smaller copies in the shards (build_assets.py)
+
+    Returns:
+        The manifest dict
+    """
+    if packs is None:
+        packs = "none"
+        if os.path.exists(MANIFEST_PATH):
+            with open(MANIFEST_PATH, encoding="utf-8") as f:
+                packs = json.load(f).get("packs", "none")
+
+    manifest = {"exams": {}}
+    if packs != "none":
+        manifest["packs"] = packs
+    image_info = load_image_info()
+    image_map = load_image_map()
+    for exam in exams:
+        manifest["exams"][exam] = write_exam_shards(exam, load_exam(exam, image_map), packs, image_info, variants)
+
+    write_if_changed(MANIFEST_PATH, json.dumps(manifest, indent=2, ensure_ascii=False) + "\n")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shard the question bank and write the manifest.")
+    parser.add_argument("--packs", choices=PACK_FORMATS,
+                        help="Also compile question packs for the app to load (default: keep the current setting)")
+    args = parser.parse_args()
+
+    manifest = write_manifest(packs=args.packs)
+    for exam, entry in manifest["exams"].items():
+        counts = ", ".join(f"{key} ({test['questionCount']})" for key, test in entry["tests"].items())
+        print(f"✓ {exam}: {counts}")
+    print(f"\nManifest: {MANIFEST_PATH} ({os.path.getsize(MANIFEST_PATH)} bytes)")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Compile tests into compact question packs and check they decode exactly.
+Usage: python3 question_pack.py [--exam non-verbal-reasoning]
+
+A pack stores a test's questions column by column instead of as one object
+per question:
+    strings    - every question string once, most used first, so repeated
+                 instructions and categories become small integers
+    templates  - distinct option lists as [letter, text] string indexes; the
+                 240 NVR questions share one A-E template
+    columns    - [name, type, data, missing] per question key, where type is
+                   range   - consecutive integers (data is the first one)
+                   chars   - single-character strings joined, e.g. "BEAC..."
+                   str     - string-table indexes
+                   options - template indexes
+                   raw     - plain JSON values
+                 and missing lists the rows that do not have the key
+
+question_bank.py --packs json writes a pack beside each shard
+(data/<exam>/testN.pack.json; --packs binary writes testN.qpk) and the app
+loads it instead of the shard. The
+binary form is the same pack with the integer columns moved out of the JSON
+header into little-endian arrays.
+
+Run this to verify that every pack on disk decodes to its source test and to
+compare sizes and parse times.
+"""
+import argparse
+import gzip
+import json
+import struct
+import time
+
+PACK_FORMAT = "question-pack"
+PACK_VERSION = 1
+
+BINARY_MAGIC = b"QPK1"
+# Array element widths by struct code
+WIDTHS = {1: "B", 2: "H", 4: "I"}
+
+
+def intern_strings(questions):
+    """Return the string table: every string value, most frequent first."""
+    counts = {}
+    for question in questions:
+        for key, value in question.items():
+            values = [value] if isinstance(value, str) else []
+            if key == "options" and isinstance(value, list):
+                values = [text for option in value for text in option.values() if isinstance(text, str)]
+            for text in values:
+                counts[text] = counts.get(text, 0) + 1
+    # Stable on first appearance for equal counts
+    return sorted(counts, key=lambda text: -counts[text])
+
+
+def is_option_list(value):
+    return isinstance(value, list) and all(
+        isinstance(option, dict) and list(option) == ["letter", "text"]
+        and isinstance(option["letter"], str) and isinstance(option["text"], str)
+        for option in value
+    )
+
+
+def encode_column(key, values, present, index, templates, template_index):
+    """
+    Encode one question key as a column.
+
+    Args:
+        key: Question key
+        values: Value per question (None where the key is missing)
+        present: Whether each question has the key
+        index: String -> string-table index
+        templates: Option template list, extended in place
+        template_index: Template JSON -> template index, extended in place
+    """
+    missing = [row for row, has in enumerate(present) if not has]
+    found = [value for value, has in zip(values, present) if has]
+
+    if not missing and found and all(type(v) is int for v in found) and \
+            found == list(range(found[0], found[0] + len(found))):
+        return [key, "range", found[0]]
+
+    if found and all(isinstance(v, str) and len(v) == 1 for v in found):
+        column = [key, "chars", "".join(v if has else "-" for v, has in zip(values, present))]
+    elif found and all(isinstance(v, str) for v in found):
+        column = [key, "str", [index[v] if has else 0 for v, has in zip(values, present)]]
+    elif key == "options" and all(is_option_list(v) for v in found):
+        data = []
+        for value, has in zip(values, present):
+            if not has:
+                data.append(0)
+                continue
+            template = [[index[o["letter"]], index[o["text"]]] for o in value]
+            signature = json.dumps(template)
+            if signature not in template_index:
+                template_index[signature] = len(templates)
+                templates.append(template)
+            data.append(template_index[signature])
+        column = [key, "options", data]
+    else:
+        column = [key, "raw", values]
+
+    if missing:
+        column.append(missing)
+    return column
+
+
+def encode_test(test):
+    """
+    Encode a test (title, questions and any passage fields) as a pack dict.
+    """
+    questions = test.get("questions", [])
+    strings = intern_strings(questions)
+    index = {text: i for i, text in enumerate(strings)}
+
+    keys = []
+    for question in questions:
+        keys.extend(key for key in question if key not in keys)
+
+    templates, template_index = [], {}
+    columns = [
+        encode_column(key, [q.get(key) for q in questions], [key in q for q in questions],
+                      index, templates, template_index)
+        for key in keys
+    ]
+
+    return {
+        "format": PACK_FORMAT,
+        "version": PACK_VERSION,
+        "meta": {key: value for key, value in test.items() if key != "questions"},
+        # None when the test has no questions list at all
+        "count": len(questions) if "questions" in test else None,
+        "strings": strings,
+        "templates": templates,
+        "columns": columns,
+    }
+
+
+def decode_test(pack):
+    """Rebuild the test dict from a pack dict."""
+    if pack.get("format") != PACK_FORMAT or pack.get("version") != PACK_VERSION:
+        raise ValueError(f"Not a version {PACK_VERSION} question pack")
+    strings = pack["strings"]
+    templates = pack["templates"]
+    questions = [{} for _ in range(pack["count"] or 0)]
+
+    for column in pack["columns"]:
+        key, kind, data = column[:3]
+        missing = set(column[3]) if len(column) > 3 else set()
+        for row, question in enumerate(questions):
+            if row in missing:
+                continue
+            if kind == "range":
+                question[key] = data + row
+            elif kind == "chars":
+                question[key] = data[row]
+            elif kind == "str":
+                question[key] = strings[data[row]]
+            elif kind == "options":
+                question[key] = [{"letter": strings[l], "text": strings[t]} for l, t in templates[data[row]]]
+            else:
+                question[key] = data[row]
+
+    test = dict(pack["meta"])
+    if pack["count"] is not None:
+        test["questions"] = questions
+    return test
+
+
+def pack_json(pack):
+    """Serialise a pack as minified JSON."""
+    return json.dumps(pack, ensure_ascii=False, separators=(",", ":"))
+
+
+def _array(values):
+    width = 1 if max(values, default=0) < 1 << 8 else 2 if max(values) < 1 << 16 else 4
+    return width, struct.pack(f"<{len(values)}{WIDTHS[width]}", *values)
+
+
+def to_binary(pack):
+    """
+    Serialise a pack in the binary form.
+
+    Layout: magic "QPK1", a uint32 header length, the JSON header, then the
+    arrays it points at. Integer columns and the flattened templates become
+    {"offset", "count", "width"} references into the array section.
+    """
+    header = dict(pack)
+    blobs = []
+    offset = 0
+
+    def place(values):
+        nonlocal offset
+        width, blob = _array(values)
+        # Keep every array aligned to its element size for typed-array views
+        padding = -offset % width
+        blobs.append(b"\0" * padding + blob)
+        offset += padding
+        ref = {"offset": offset, "count": len(values), "width": width}
+        offset += len(blob)
+        return ref
+
+    header["columns"] = [
+        column[:2] + [place(column[2])] + column[3:] if column[1] in ("str", "options") else column
+        for column in pack["columns"]
+    ]
+    header["templates"] = {
+        "lengths": place([len(t) for t in pack["templates"]]),
+        "pairs": place([i for t in pack["templates"] for pair in t for i in pair]),
+    }
+    header_bytes = pack_json(header).encode("utf-8")
+    # Pad the header so the array section starts 4-byte aligned
+    header_bytes += b" " * (-(len(header_bytes) + 8) % 4)
+    return BINARY_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + b"".join(blobs)
+
+
+def from_binary(data):
+    """Parse the binary form back into a pack dict."""
+    if data[:4] != BINARY_MAGIC:
+        raise ValueError("Not a binary question pack")
+    (length,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8:8 + length])
+    base = 8 + length
+
+    def read(ref):
+        return list(struct.unpack_from(f"<{ref['count']}{WIDTHS[ref['width']]}", data, base + ref["offset"]))
+
+    pack = dict(header)
+    pack["columns"] = [
+        column[:2] + [read(column[2])] + column[3:] if isinstance(column[2], dict) else column
+        for column in header["columns"]
+    ]
+    lengths = read(header["templates"]["lengths"])
+    pairs = read(header["templates"]["pairs"])
+    templates, position = [], 0
+    for length in lengths:
+        flat = pairs[position:position + 2 * length]
+        templates.append([flat[i:i + 2] for i in range(0, len(flat), 2)])
+        position += 2 * length
+    pack["templates"] = templates
+    return pack
+
+
+def load_pack(path):
+    """Read a pack file in either form and return the decoded test."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] == BINARY_MAGIC:
+        return decode_test(from_binary(data))
+    return decode_test(json.loads(data))
+
+
+def best_time(function, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    # Imported here: question_bank imports this module to write the packs
+    from question_bank import EXAMS, MANIFEST_PATH, compact_json, load_exam, load_image_info, shard_test
+
+    parser = argparse.ArgumentParser(description="Verify question packs and report their size.")
+    parser.add_argument("--exam", help="Only check this exam")
+    args = parser.parse_args()
+
+    with open(MANIFEST_PATH, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    image_info = load_image_info()
+    failures = 0
+    print(f"{'test':<30} {'shard':>8} {'pack':>8} {'binary':>8} {'shard.gz':>9} {'pack.gz':>8} "
+          f"{'parse shard':>12} {'parse pack':>11}")
+    for exam in EXAMS:
+        if args.exam and exam != args.exam:
+            continue
+        for test_key, test in load_exam(exam).items():
+            test = shard_test(test, image_info)
+            pack = encode_test(test)
+            text = pack_json(pack)
+            binary = to_binary(pack)
+            shard = compact_json(test)
+
+            checks = {
+                "json": json.loads(text),
+                "binary": from_binary(binary),
+            }
+            summary = manifest["exams"][exam]["tests"].get(test_key, {})
+            problems = [form for form, decoded in checks.items() if decode_test(decoded) != test]
+            if "pack" in summary and load_pack(summary["pack"]) != test:
+                problems.append(f"{summary['pack']} on disk")
+
+            parse_shard = best_time(lambda: json.loads(shard))
+            parse_pack = best_time(lambda: decode_test(json.loads(text)))
+            label = f"{exam}/{test_key}"
+            print(f"{label:<30} {len(shard.encode()):>8} {len(text.encode()):>8} {len(binary):>8} "
+                  f"{len(gzip.compress(shard.encode(), 9)):>9} {len(gzip.compress(text.encode(), 9)):>8} "
+                  f"{parse_shard * 1000:>9.2f} ms {parse_pack * 1000:>8.2f} ms")
+            if problems:
+                failures += 1
+                print(f"  ✗ does not round-trip: {', '.join(problems)}")
+
+    if failures:
+        raise SystemExit(f"\n✗ {failures} test(s) failed to round-trip")
+    print("\n✓ Every pack decodes to its source test")
+
+
+if __name__ == "__main__":
+    main()
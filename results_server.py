@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Serve the app and collect class results in SQLite.
+Usage: python3 results_server.py [port] [--db results.db] [--bind ADDRESS] [--quiet]
+
+This is server.py with an /api/ endpoint the app posts its events to when it
+is served from here (on a static host the upload is switched off after the
+first 404):
+    POST /api/events      - {"events": [...]}, a batch of test_completed and
+                            option_selected events (see analytics.md)
+    GET  /api/summary     - tests taken, students and average score per exam
+    GET  /api/categories  - accuracy per category (?exam=maths)
+    GET  /api/questions   - per-question difficulty, hardest first
+                            (?exam=maths&test=test1&limit=20)
+
+Writes go through one writer thread. Request threads validate their batch
+and queue it; the writer drains everything queued and inserts it in a single
+transaction, so a class submitting at once costs a handful of commits rather
+than one per request. A request is answered only after its batch commits,
+and events carry their own keys, so a retried batch is not counted twice.
+
+The database and its -wal/-shm files answer 404 like any missing file, so
+the default results.db in the served directory is never handed out.
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from server import DEFAULT_PORT, StaticHandler, StaticServer
+
+DEFAULT_DB = "results.db"
+
+# Largest accepted POST body and the most events in one batch
+MAX_BODY = 1 << 20
+MAX_EVENTS = 2000
+# Queued batches the writer commits together
+MAX_BATCH = 500
+# Seconds a request waits for its batch to commit before answering 503
+WRITE_TIMEOUT = 30
+# The database and the journal files SQLite keeps beside it; none of them is
+# ever served, even when --db sits inside the served --directory
+DB_SUFFIXES = ("", "-wal", "-shm", "-journal")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    client_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    exam TEXT NOT NULL,
+    test TEXT NOT NULL,
+    total_questions INTEGER NOT NULL,
+    correct_count INTEGER NOT NULL,
+    time_ms INTEGER,
+    PRIMARY KEY (client_id, timestamp, exam, test)
+);
+CREATE TABLE IF NOT EXISTS category_results (
+    client_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    exam TEXT NOT NULL,
+    test TEXT NOT NULL,
+    category TEXT NOT NULL,
+    correct INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    PRIMARY KEY (client_id, timestamp, exam, test, category)
+);
+CREATE TABLE IF NOT EXISTS question_results (
+    client_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    exam TEXT NOT NULL,
+    test TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    correct INTEGER,
+    PRIMARY KEY (client_id, timestamp, exam, test, question_id)
+);
+CREATE TABLE IF NOT EXISTS selections (
+    client_id TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    exam TEXT NOT NULL,
+    test TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    option_letter TEXT NOT NULL,
+    PRIMARY KEY (client_id, timestamp, exam, test, question_id, option_letter)
+);
+-- Covering indexes for the aggregate endpoints
+CREATE INDEX IF NOT EXISTS results_by_exam ON results (exam, client_id, correct_count, total_questions);
+CREATE INDEX IF NOT EXISTS categories_by_exam ON category_results (exam, category, correct, total);
+CREATE INDEX IF NOT EXISTS questions_by_test ON question_results (exam, test, question_id, correct);
+CREATE INDEX IF NOT EXISTS selections_by_test ON selections (exam, test, question_id);
+"""
+
+INSERTS = {
+    "results": "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "category_results": "INSERT OR IGNORE INTO category_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "question_results": "INSERT OR IGNORE INTO question_results VALUES (?, ?, ?, ?, ?, ?)",
+    "selections": "INSERT OR IGNORE INTO selections VALUES (?, ?, ?, ?, ?, ?)",
+}
+
+
+def connect(path, readonly=False):
+    if readonly:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=WRITE_TIMEOUT)
+    conn = sqlite3.connect(path, timeout=WRITE_TIMEOUT)
+    # Readers never block the writer, and commits do not wait for fsync of the WAL
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _int(value, name):
+    # SQLite stores signed 64-bit integers; anything larger fails the insert
+    if isinstance(value, bool) or not isinstance(value, int) or not -(1 << 63) <= value < (1 << 63):
+        raise ValueError(f"{name} must be an integer")
+    return value
+
+
+def _str(value, name):
+    if not isinstance(value, str) or not value or len(value) > 200:
+        raise ValueError(f"{name} must be a non-empty string")
+    return value
+
+
+def event_rows(payload):
+    """
+    Validate a batch and turn it into rows per table.
+
+    Each event is {"event", "client_id", "timestamp", "params"}; the params
+    use the names in analytics.md:
+        test_completed  - exam_type, test_key, total_questions, correct_count,
+                          time_ms, categories {name: [correct, total]},
+                          questions [[question_id, 1 | 0 | null], ...]
+        option_selected - exam_type, test_key, question_id, option_letter
+
+    Returns:
+        Table name -> list of row tuples
+
+    Raises:
+        ValueError: If the batch or any event in it is malformed
+    """
+    events = payload.get("events") if isinstance(payload, dict) else None
+    if not isinstance(events, list) or not events:
+        raise ValueError('Expected {"events": [...]}')
+    if len(events) > MAX_EVENTS:
+        raise ValueError(f"At most {MAX_EVENTS} events per batch")
+
+    rows = {table: [] for table in INSERTS}
+    for event in events:
+        if not isinstance(event, dict) or not isinstance(event.get("params"), dict):
+            raise ValueError("Each event needs event, client_id, timestamp and params")
+        params = event["params"]
+        key = (
+            _str(event.get("client_id"), "client_id"),
+            _int(event.get("timestamp"), "timestamp"),
+            _str(params.get("exam_type"), "exam_type"),
+            _str(params.get("test_key"), "test_key"),
+        )
+
+        if event.get("event") == "test_completed":
+            time_ms = params.get("time_ms")
+            rows["results"].append(key + (
+                _int(params.get("total_questions"), "total_questions"),
+                _int(params.get("correct_count"), "correct_count"),
+                None if time_ms is None else _int(time_ms, "time_ms"),
+            ))
+            categories = params.get("categories") or {}
+            questions = params.get("questions") or []
+            if not isinstance(categories, dict):
+                raise ValueError("categories must be an object")
+            if not isinstance(questions, list):
+                raise ValueError("questions must be a list")
+            for category, counts in categories.items():
+                if not isinstance(counts, list) or len(counts) != 2:
+                    raise ValueError("categories values must be [correct, total]")
+                rows["category_results"].append(key + (
+                    _str(category, "category"), _int(counts[0], "correct"), _int(counts[1], "total"),
+                ))
+            for question in questions:
+                if not isinstance(question, list) or len(question) != 2 or question[1] not in (0, 1, None):
+                    raise ValueError("questions entries must be [question_id, 1 | 0 | null]")
+                rows["question_results"].append(key + (_int(question[0], "question_id"), question[1]))
+        elif event.get("event") == "option_selected":
+            rows["selections"].append(key + (
+                _int(params.get("question_id"), "question_id"),
+                _str(params.get("option_letter"), "option_letter"),
+            ))
+        else:
+            raise ValueError(f"Unsupported event: {event.get('event')!r}")
+    return rows
+
+
+class EventWriter(threading.Thread):
+    """The only thread that writes to the database; commits queued batches together."""
+
+    def __init__(self, path, max_batch=MAX_BATCH):
+        super().__init__(name="event-writer", daemon=True)
+        self.path = path
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        conn = connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def submit(self, rows):
+        """Queue a batch; the returned Future resolves once it is committed."""
+        future = Future()
+        self.queue.put((rows, future))
+        return future
+
+    def stop(self):
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        conn = connect(self.path)
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            # Everything that arrived while the last transaction committed
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(None)
+                    break
+                batch.append(item)
+
+            try:
+                self.insert(conn, batch)
+            except sqlite3.Error:
+                # One bad batch must not fail the others it was grouped with
+                for item in batch:
+                    try:
+                        self.insert(conn, [item])
+                    except sqlite3.Error as error:
+                        item[1].set_exception(error)
+                    else:
+                        item[1].set_result(None)
+            else:
+                for _, future in batch:
+                    future.set_result(None)
+        conn.close()
+
+    @staticmethod
+    def insert(conn, batch):
+        """Insert the rows of several batches in one transaction."""
+        with conn:
+            for table, sql in INSERTS.items():
+                table_rows = [row for rows, _ in batch for row in rows[table]]
+                if table_rows:
+                    conn.executemany(sql, table_rows)
+
+
+SUMMARY_SQL = """
+SELECT exam, COUNT(*), COUNT(DISTINCT client_id),
+       ROUND(100.0 * SUM(correct_count) / MAX(SUM(total_questions), 1), 1)
+FROM results WHERE (:exam IS NULL OR exam = :exam)
+GROUP BY exam ORDER BY exam
+"""
+
+CATEGORIES_SQL = """
+SELECT exam, category, COUNT(*), SUM(correct), SUM(total),
+       ROUND(100.0 * SUM(correct) / MAX(SUM(total), 1), 1) AS accuracy
+FROM category_results WHERE (:exam IS NULL OR exam = :exam)
+GROUP BY exam, category ORDER BY accuracy, exam, category
+"""
+
+QUESTIONS_SQL = """
+SELECT q.exam, q.test, q.question_id, COUNT(*), COUNT(q.correct), SUM(q.correct),
+       ROUND(100.0 * SUM(q.correct) / COUNT(*), 1) AS accuracy,
+       (SELECT COUNT(*) FROM selections s
+        WHERE s.exam = q.exam AND s.test = q.test AND s.question_id = q.question_id)
+FROM question_results q
+WHERE (:exam IS NULL OR q.exam = :exam) AND (:test IS NULL OR q.test = :test)
+GROUP BY q.exam, q.test, q.question_id
+ORDER BY accuracy, q.exam, q.test, q.question_id
+LIMIT :limit
+"""
+
+
+class ResultsHandler(StaticHandler):
+    """StaticHandler plus the /api/ routes."""
+
+    db_path = DEFAULT_DB
+    writer = None
+
+    def is_database(self, path):
+        database = os.path.realpath(self.db_path)
+        return os.path.realpath(path) in {database + suffix for suffix in DB_SUFFIXES}
+
+    def send_head(self):
+        if self.is_database(self.translate_path(self.path)):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        return super().send_head()
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/api/events":
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self.send_json(HTTPStatus.LENGTH_REQUIRED, {"error": "Content-Length required"})
+            return
+        if length > MAX_BODY:
+            self.close_connection = True
+            self.send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": f"Body over {MAX_BODY} bytes"})
+            return
+
+        try:
+            rows = event_rows(json.loads(self.rfile.read(length)))
+        except (ValueError, UnicodeDecodeError) as error:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(error)})
+            return
+
+        try:
+            self.writer.submit(rows).result(timeout=WRITE_TIMEOUT)
+        except (FutureTimeout, sqlite3.Error) as error:
+            self.log_error("Failed to store events: %s", error)
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "Could not store events, retry later"})
+            return
+        self.send_json(HTTPStatus.OK, {"accepted": sum(len(table) for table in rows.values())})
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if not parts.path.startswith("/api/"):
+            super().do_GET()
+            return
+
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        params = {"exam": query.get("exam"), "test": query.get("test")}
+        routes = {
+            "/api/summary": (SUMMARY_SQL, "exams", ["exam", "tests", "students", "averageScore"]),
+            "/api/categories": (CATEGORIES_SQL, "categories",
+                                ["exam", "category", "attempts", "correct", "total", "accuracy"]),
+            "/api/questions": (QUESTIONS_SQL, "questions",
+                               ["exam", "test", "questionId", "attempts", "answered", "correct",
+                                "accuracy", "selections"]),
+        }
+        if parts.path not in routes:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+        try:
+            params["limit"] = int(query.get("limit", 50))
+        except ValueError:
+            self.send_json(HTTPStatus.BAD_REQUEST, {"error": "limit must be an integer"})
+            return
+
+        sql, name, columns = routes[parts.path]
+        conn = connect(self.db_path, readonly=True)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        self.send_json(HTTPStatus.OK, {name: [dict(zip(columns, row)) for row in rows]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the app and store class results in SQLite.")
+    parser.add_argument("port", nargs="?", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"SQLite database file (default: {DEFAULT_DB})")
+    parser.add_argument("--bind", default="", help="Address to bind (default: all interfaces)")
+    parser.add_argument("--directory", default=os.getcwd(), help="Directory to serve")
+    parser.add_argument("--quiet", action="store_true", help="Do not log each request")
+    args = parser.parse_args()
+
+    writer = EventWriter(args.db)
+    writer.start()
+    ResultsHandler.quiet = args.quiet
+    ResultsHandler.db_path = args.db
+    ResultsHandler.writer = writer
+
+    handler = partial(ResultsHandler, directory=args.directory)
+    with StaticServer((args.bind, args.port), handler) as httpd:
+        host = args.bind or "localhost"
+        print(f"Serving {args.directory} on http://{host}:{args.port}, results in {args.db}")
+        print("Press Ctrl+C to stop")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopped")
+        finally:
+            writer.stop()
+
+
+if __name__ == "__main__":
+    main()
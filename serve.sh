@@ -1,11 +1,18 @@
 #!/bin/bash
-# Simple HTTP server for local testing
-# This starts a web server on http://localhost:8000
+# Local web server for testing and classroom use
+# This starts a threaded web server on http://localhost:8000
+# (see server.py for caching and compression details)
 
 PORT=${1:-8000}
 
+# Refresh the service worker's precache manifest (file hashes for offline use)
+python3 build_precache.py > /dev/null
+
+# Refresh the .gz/.br copies of the JSON/JS/CSS so they are served compressed
+python3 precompress.py > /dev/null
+
 echo "Starting local server on http://localhost:$PORT"
 echo "Press Ctrl+C to stop"
 echo ""
 
-python3 -m http.server $PORT
+python3 server.py $PORT
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Threaded static server for running the app for a whole class.
+Usage: python3 server.py [port] [--bind ADDRESS] [--quiet]
+
+Compared with `python3 -m http.server` this:
+    - handles each connection on its own thread, with HTTP/1.1 keep-alive
+    - serves the .br/.gz files written by precompress.py when the browser accepts them
+    - sends ETag/Last-Modified and answers If-None-Match/If-Modified-Since with 304
+    - supports single byte-range requests (206 Partial Content)
+    - marks fingerprinted assets (a content hash in the name, or a ?v= query)
+      as immutable, and everything else as revalidate-on-use
+"""
+import argparse
+import email.utils
+import json
+import os
+import re
+import socket
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_PORT = 8000
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Precompressed variants in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# Names with a content hash of exactly the length our tools write: a 10-digit
+# segment from build_assets.py (js/app.132291ec5a.js) or a 16-digit store
+# name from asset_store.py (images/store/3f9c2a1b4d5e6f70.png). Other
+# hex-looking names such as images/20240101.png are not fingerprints
+FINGERPRINT_RE = re.compile(r"(?:\.[0-9a-f]{10}|/images/store/[0-9a-f]{16})\.[A-Za-z0-9]+$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class StaticHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    extensions_map = {
+        **SimpleHTTPRequestHandler.extensions_map,
+        ".js": "text/javascript",
+        ".json": "application/json",
+        ".webp": "image/webp",
+        ".avif": "image/avif",
+        ".svg": "image/svg+xml",
+    }
+
+    quiet = False
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle's
+        # algorithm and delayed ACKs stall every keep-alive response by ~40 ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data):
+        body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def is_immutable(self):
+        parts = urlsplit(self.path)
+        return "v" in parse_qs(parts.query) or bool(FINGERPRINT_RE.search(parts.path))
+
+    def choose_encoding(self, path):
+        """Return (file to send, content-encoding) honouring Accept-Encoding."""
+        accepted = {
+            token.split(";")[0].strip()
+            for token in self.headers.get("Accept-Encoding", "").split(",")
+        }
+        source_mtime = os.path.getmtime(path)
+        for encoding, suffix in ENCODINGS:
+            variant = path + suffix
+            # Ignore variants older than their source; precompress.py has not been re-run
+            if encoding in accepted and os.path.isfile(variant) and os.path.getmtime(variant) >= source_mtime:
+                return variant, encoding
+        return path, None
+
+    def send_common_headers(self, etag, stat):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(stat.st_mtime))
+        self.send_header("Cache-Control", IMMUTABLE_CACHE if self.is_immutable() else REVALIDATE_CACHE)
+        self.send_header("Vary", "Accept-Encoding")
+
+    def not_modified(self, etag, stat):
+        """Return True if the request's conditional headers match the current file."""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(stat.st_mtime) <= since
+        return False
+
+    def parse_range(self, size):
+        """
+        Parse a single-range Range header.
+
+        Returns:
+            (start, end) inclusive, None for no/ignored range, or False if unsatisfiable
+        """
+        header = self.headers.get("Range")
+        if not header:
+            return None
+        match = RANGE_RE.match(header.strip())
+        if not match or match.groups() == ("", ""):
+            return None  # multi-range or malformed: send the whole file
+
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(size - int(last), 0)
+            end = size - 1
+        if start >= size or start > end:
+            return False
+        return start, end
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+
+        if os.path.isdir(path):
+            parts = urlsplit(self.path)
+            if not parts.path.endswith("/"):
+                self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+                self.send_header("Location", parts.path + "/" + (f"?{parts.query}" if parts.query else ""))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            path = os.path.join(path, "index.html")
+
+        if not os.path.isfile(path) or path.endswith((".br", ".gz")):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        content_type = self.guess_type(path)
+        send_path, encoding = self.choose_encoding(path)
+        stat = os.stat(send_path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+
+        if self.not_modified(etag, stat):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_common_headers(etag, stat)
+            self.end_headers()
+            return None
+
+        # Ranges only apply to the identity encoding
+        byte_range = self.parse_range(stat.st_size) if encoding is None else None
+        if self.headers.get("If-Range") not in (None, etag):
+            byte_range = None
+
+        if byte_range is False:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{stat.st_size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        f = open(send_path, "rb")
+        try:
+            if byte_range:
+                start, end = byte_range
+                f.seek(start)
+                self.copy_length = end - start + 1
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{stat.st_size}")
+            else:
+                self.copy_length = stat.st_size
+                self.send_response(HTTPStatus.OK)
+
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(self.copy_length))
+            self.send_header("Accept-Ranges", "bytes")
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self.send_common_headers(etag, stat)
+            self.end_headers()
+            return f
+        except BaseException:
+            f.close()
+            raise
+
+    def copyfile(self, source, outputfile):
+        remaining = self.copy_length
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+class StaticServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Let a whole class connect at the same moment without refused connections
+    request_queue_size = 256
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the app for local or classroom use.")
+    parser.add_argument("port", nargs="?", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--bind", default="", help="Address to bind (default: all interfaces)")
+    parser.add_argument("--directory", default=os.getcwd(), help="Directory to serve")
+    parser.add_argument("--quiet", action="store_true", help="Do not log each request")
+    args = parser.parse_args()
+
+    StaticHandler.quiet = args.quiet
+    handler = partial(StaticHandler, directory=args.directory)
+    with StaticServer((args.bind, args.port), handler) as httpd:
+        host = args.bind or "localhost"
+        print(f"Serving {args.directory} on http://{host}:{args.port}")
+        print("Press Ctrl+C to stop")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Pack question images into sprite atlases.
+
+Used by generate_nvr_json.py --atlas so a test downloads a handful of atlas
+images instead of one file per question. Images are packed onto shelves (rows)
+no wider than max_width; the NVR strips are all the same width, so in practice
+each atlas is a single column of questions.
+"""
+from PIL import Image
+
+from image_codec import write_image
+
+DEFAULT_MAX_WIDTH = 2048
+
+# Gap between sprites so a scaled background never bleeds a neighbouring
+# question's edge into view
+SPRITE_PADDING = 2
+
+
+def pack(sizes, max_width=DEFAULT_MAX_WIDTH, padding=SPRITE_PADDING):
+    """
+    Place rectangles onto shelves, tallest first.
+
+    Args:
+        sizes: Dict of key -> (width, height)
+        max_width: Maximum atlas width in pixels (widened to fit the widest item)
+        padding: Gap in pixels between neighbouring rectangles
+
+    Returns:
+        Tuple of (positions dict of key -> (x, y), atlas width, atlas height)
+    """
+    max_width = max([max_width] + [width for width, _ in sizes.values()])
+    order = sorted(sizes, key=lambda key: sizes[key][1], reverse=True)
+
+    positions = {}
+    x = y = shelf_height = atlas_width = 0
+    for key in order:
+        width, height = sizes[key]
+        if x and x + width > max_width:
+            y += shelf_height + padding
+            x = shelf_height = 0
+        positions[key] = (x, y)
+        atlas_width = max(atlas_width, x + width)
+        shelf_height = max(shelf_height, height)
+        x += width + padding
+
+    return positions, atlas_width, y + shelf_height
+
+
+def build_atlas(image_paths, output_path, max_width=DEFAULT_MAX_WIDTH):
+    """
+    Pack images into one atlas file.
+
+    Args:
+        image_paths: List of image paths to pack
+        output_path: Atlas PNG path
+        max_width: Maximum atlas width in pixels
+
+    Returns:
+        Dict of image path -> sprite dict with the atlas src, the sprite's pixel
+        rectangle (x, y, width, height) and the atlas size
+    """
+    images = {}
+    for path in image_paths:
+        with Image.open(path) as image:
+            images[path] = image.convert("RGB")
+
+    sizes = {path: image.size for path, image in images.items()}
+    positions, atlas_width, atlas_height = pack(sizes, max_width)
+
+    atlas = Image.new("RGB", (atlas_width, atlas_height), "white")
+    for path, (x, y) in positions.items():
+        atlas.paste(images[path], (x, y))
+    write_image(atlas, output_path)
+
+    return {
+        path: {
+            "src": output_path,
+            "x": x,
+            "y": y,
+            "width": sizes[path][0],
+            "height": sizes[path][1],
+            "atlasWidth": atlas_width,
+            "atlasHeight": atlas_height,
+        }
+        for path, (x, y) in positions.items()
+    }
@@ -0,0 +1,195 @@
+// Service worker: serves the app shell and previously used tests from cache so
+// repeat sessions start without network round-trips and work offline.
+//
+// precache-manifest.json (written by build_precache.py) lists every file with a
+// content hash. The shell is cached on install; a test's shard and images are
+// cached when the app posts a 'precache-test' message. After a deploy only the
+// entries whose hash changed are fetched again.
+
+const PRECACHE_MANIFEST_URL = 'precache-manifest.json';
+const CACHE_NAME = 'elevenplus-precache';
+// url -> hash of the copy currently in CACHE_NAME
+const HASHES_KEY = 'precache-hashes.json';
+const META_CACHE_NAME = 'elevenplus-precache-meta';
+// Check for a new manifest at most this often while the app is in use
+const SYNC_INTERVAL_MS = 60 * 1000;
+
+// images/variants/<path>-<width>w.<ext> is a smaller copy of images/<path>.<ext>
+// (see image_variants.py). Only the originals are precached, so offline a
+// variant is answered with its original.
+const VARIANT_PATTERN = /\/images\/variants\/(.+)-\d+w(\.\w+)$/;
+
+let manifestPromise = null;
+let lastSyncTime = 0;
+
+function toAbsoluteUrl(url) {
+    return new URL(url, self.registration.scope).href;
+}
+
+function originalImageUrl(url) {
+    const parsed = new URL(url);
+    if (!VARIANT_PATTERN.test(parsed.pathname)) {
+        return null;
+    }
+    parsed.pathname = parsed.pathname.replace(VARIANT_PATTERN, '/images/$1$2');
+    return parsed.href;
+}
+
+// The shell is precached as index.html, but launching the app at the site root
+// (or any directory) navigates to '/', which would never match it
+function cacheKey(request) {
+    const url = new URL(request.url);
+    if (request.mode === 'navigate' && url.pathname.endsWith('/')) {
+        url.pathname += 'index.html';
+        return url.href;
+    }
+    return request;
+}
+
+async function fetchManifest() {
+    const response = await fetch(PRECACHE_MANIFEST_URL, { cache: 'no-cache' });
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    return response.json();
+}
+
+async function loadHashes() {
+    const metaCache = await caches.open(META_CACHE_NAME);
+    const response = await metaCache.match(HASHES_KEY);
+    return response ? response.json() : {};
+}
+
+async function saveHashes(hashes) {
+    const metaCache = await caches.open(META_CACHE_NAME);
+    await metaCache.put(HASHES_KEY, new Response(JSON.stringify(hashes), {
+        headers: { 'Content-Type': 'application/json' }
+    }));
+}
+
+// Make sure every entry is cached at its manifest hash, fetching only the
+// ones that are missing or stale
+async function precacheEntries(entries) {
+    const cache = await caches.open(CACHE_NAME);
+    const hashes = await loadHashes();
+
+    const stale = entries.filter(entry => hashes[toAbsoluteUrl(entry.url)] !== entry.hash);
+    await Promise.all(stale.map(async entry => {
+        const url = toAbsoluteUrl(entry.url);
+        // Bypass the HTTP cache so a changed file is never replaced by an old copy
+        const response = await fetch(url, { cache: 'reload' });
+        if (response.ok) {
+            await cache.put(url, response);
+            hashes[url] = entry.hash;
+        }
+    }));
+
+    if (stale.length > 0) {
+        await saveHashes(hashes);
+    }
+    return stale.length;
+}
+
+// Fetch the latest manifest, refresh changed entries that are already cached
+// and drop entries that no longer exist
+async function syncManifest() {
+    const manifest = await fetchManifest();
+    const cache = await caches.open(CACHE_NAME);
+    const hashes = await loadHashes();
+
+    const allEntries = new Map();
+    manifest.shell.forEach(entry => allEntries.set(toAbsoluteUrl(entry.url), entry));
+    Object.values(manifest.tests).forEach(group => {
+        group.forEach(entry => allEntries.set(toAbsoluteUrl(entry.url), entry));
+    });
+
+    // Only update tests the student has already used, plus the shell
+    const cachedUrls = new Set(Object.keys(hashes));
+    const toRefresh = manifest.shell.concat(
+        [...allEntries.values()].filter(entry => cachedUrls.has(toAbsoluteUrl(entry.url)))
+    );
+
+    const removed = [...cachedUrls].filter(url => !allEntries.has(url));
+    await Promise.all(removed.map(url => cache.delete(url)));
+    if (removed.length > 0) {
+        removed.forEach(url => delete hashes[url]);
+        await saveHashes(hashes);
+    }
+
+    await precacheEntries(toRefresh);
+    manifestPromise = Promise.resolve(manifest);
+    lastSyncTime = Date.now();
+    return manifest;
+}
+
+function getManifest() {
+    if (!manifestPromise) {
+        manifestPromise = fetchManifest().catch(error => {
+            manifestPromise = null;
+            throw error;
+        });
+    }
+    return manifestPromise;
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        getManifest()
+            .then(manifest => precacheEntries(manifest.shell))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(self.clients.claim());
+});
+
+self.addEventListener('message', event => {
+    const data = event.data || {};
+    if (data.type === 'precache-test') {
+        const testKey = `${data.examType}/${data.testKey}`;
+        event.waitUntil(
+            getManifest()
+                .then(manifest => precacheEntries(manifest.tests[testKey] || []))
+                .catch(error => console.warn('Precache failed for', testKey, error))
+        );
+    }
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET' || new URL(request.url).origin !== self.location.origin) {
+        return;
+    }
+    if (new URL(request.url).pathname.endsWith(PRECACHE_MANIFEST_URL)) {
+        return;
+    }
+
+    // Serve from the precache (shards are requested with a ?v= hash, so match
+    // without the query); fall back to the network for anything not cached
+    event.respondWith(
+        caches.open(CACHE_NAME).then(cache =>
+            cache.match(cacheKey(request), { ignoreSearch: true })
+                .then(cached => cached || fetch(request).catch(error => {
+                    const original = originalImageUrl(request.url);
+                    if (!original) {
+                        throw error;
+                    }
+                    return cache.match(original).then(response => {
+                        if (!response) {
+                            throw error;
+                        }
+                        return response;
+                    });
+                }))
+        )
+    );
+
+    // On page loads, pick up a new deploy in the background for next time
+    if (request.mode === 'navigate' && Date.now() - lastSyncTime > SYNC_INTERVAL_MS) {
+        lastSyncTime = Date.now();
+        event.waitUntil(syncManifest().catch(() => {
+            // Offline: keep serving the cached copy
+        }));
+    }
+});
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Export a crop rectangle of a PDF page as a small SVG instead of a raster.
+Usage: python3 vector_export.py BOOKLET.pdf PAGE LEFT TOP RIGHT BOTTOM [--output crop.svg]
+
+MuPDF's own SVG device writes the whole page and only hides what lies outside
+the clip, so a third-of-a-page crop costs as much as the page. This instead
+walks the page's vector drawings (page.get_drawings()) and text spans and
+writes only those that touch the crop, translated to the crop's origin:
+    - paths with the same style are merged into one <path>, coordinates are
+      rounded to PRECISION decimal places of a point
+    - text becomes <text> with textLength set to the span's width, so labels
+      line up with the artwork whatever font the browser substitutes; rotated
+      lines (axis titles) keep their angle with a rotate() transform
+
+Scanned pages (any image under the crop) cannot be expressed this way;
+is_vector_clip() reports them so callers fall back to a raster. extract.py
+uses this for crops with "format": "svg". Clipping paths inside the page are
+not reproduced, so check hatched or masked figures after the first export.
+"""
+import argparse
+import math
+import os
+from xml.sax.saxutils import escape
+
+import fitz  # PyMuPDF
+
+# Decimal places kept for coordinates, in PDF points (0.1 pt is well under a
+# pixel even at 3x zoom)
+PRECISION = 1
+
+# Span flag bits from PyMuPDF's text extraction
+FLAG_ITALIC = 2
+FLAG_SERIF = 4
+FLAG_MONO = 8
+FLAG_BOLD = 16
+
+LINE_CAPS = {1: "round", 2: "square"}
+LINE_JOINS = {1: "round", 2: "bevel"}
+
+
+def _fmt(value):
+    text = f"{value:.{PRECISION}f}".rstrip("0").rstrip(".")
+    return "0" if text in ("-0", "") else text
+
+
+def _color(rgb):
+    """Hex colour for a PyMuPDF colour (float tuple, or sRGB int for text)."""
+    if isinstance(rgb, int):
+        r, g, b = (rgb >> 16) & 255, (rgb >> 8) & 255, rgb & 255
+    else:
+        r, g, b = (round(channel * 255) for channel in rgb[:3])
+    text = f"#{r:02x}{g:02x}{b:02x}"
+    # Short form when each channel repeats its digit
+    return f"#{text[1]}{text[3]}{text[5]}" if text[1::2] == text[2::2] else text
+
+
+def _touches(bbox, clip):
+    """Overlap test that keeps zero-width and zero-height shapes (straight lines)."""
+    x0, y0, x1, y1 = bbox
+    return x0 <= clip.x1 and x1 >= clip.x0 and y0 <= clip.y1 and y1 >= clip.y0
+
+
+def is_vector_clip(page, clip):
+    """Return False if any image (e.g. a scanned page) lies under the clip."""
+    return not any(_touches(info["bbox"], clip) for info in page.get_image_info())
+
+
+def path_data(items, origin):
+    """Build SVG path data for one drawing's items, relative to origin."""
+    ox, oy = origin
+    commands = []
+    current = None
+
+    def point(p):
+        return f"{_fmt(p.x - ox)} {_fmt(p.y - oy)}"
+
+    for item in items:
+        kind = item[0]
+        if kind == "re":
+            rect = item[1]
+            commands.append(f"M{point(rect.tl)}h{_fmt(rect.width)}v{_fmt(rect.height)}h{_fmt(-rect.width)}Z")
+            current = None
+            continue
+        if kind == "qu":
+            quad = item[1]
+            commands.append(f"M{point(quad.ul)}L{point(quad.ur)} {point(quad.lr)} {point(quad.ll)}Z")
+            current = None
+            continue
+        start = item[1]
+        if current is None or abs(current.x - start.x) > 1e-3 or abs(current.y - start.y) > 1e-3:
+            commands.append(f"M{point(start)}")
+        if kind == "l":
+            commands.append(f"L{point(item[2])}")
+            current = item[2]
+        elif kind == "c":
+            commands.append(f"C{point(item[2])} {point(item[3])} {point(item[4])}")
+            current = item[4]
+    return "".join(commands)
+
+
+def path_style(drawing):
+    """Return the SVG presentation attributes for a drawing, as a string."""
+    attributes = []
+    fill = drawing.get("fill")
+    stroke = drawing.get("color") if "s" in drawing.get("type", "") else None
+    attributes.append(f'fill="{_color(fill)}"' if fill is not None else 'fill="none"')
+    if fill is not None and drawing.get("even_odd"):
+        attributes.append('fill-rule="evenodd"')
+    if fill is not None and drawing.get("fill_opacity") is not None and drawing["fill_opacity"] < 1:
+        attributes.append(f'fill-opacity="{_fmt(drawing["fill_opacity"])}"')
+    if stroke is not None:
+        attributes.append(f'stroke="{_color(stroke)}"')
+        attributes.append(f'stroke-width="{_fmt(max(drawing.get("width") or 1, 0.1))}"')
+        cap = drawing.get("lineCap") or (0,)
+        cap = cap[0] if isinstance(cap, (tuple, list)) else cap
+        if LINE_CAPS.get(int(cap)):
+            attributes.append(f'stroke-linecap="{LINE_CAPS[int(cap)]}"')
+        if LINE_JOINS.get(int(drawing.get("lineJoin") or 0)):
+            attributes.append(f'stroke-linejoin="{LINE_JOINS[int(drawing["lineJoin"])]}"')
+        dashes = (drawing.get("dashes") or "").strip()
+        if dashes.startswith("[") and not dashes.startswith("[]"):
+            pattern = dashes[1:dashes.index("]")].split()
+            attributes.append(f'stroke-dasharray="{",".join(_fmt(float(v)) for v in pattern)}"')
+        if drawing.get("stroke_opacity") is not None and drawing["stroke_opacity"] < 1:
+            attributes.append(f'stroke-opacity="{_fmt(drawing["stroke_opacity"])}"')
+    return " ".join(attributes)
+
+
+def text_element(span, origin, direction=(1, 0)):
+    """
+    Return a <text> element for one span, or "" for whitespace.
+
+    direction is the line's writing direction (line["dir"]); rotated labels
+    such as axis titles are turned about their baseline origin to match.
+    """
+    text = span["text"].strip()
+    if not text:
+        return ""
+    ox, oy = origin
+    flags = span.get("flags", 0)
+    x0, y0, x1, y1 = span["bbox"]
+    cos, sin = direction
+    horizontal = abs(sin) < 1e-3 and cos > 0
+    # Horizontal text starts at its box; rotated text at its baseline origin
+    x = x0 if horizontal else span["origin"][0]
+    family = "monospace" if flags & FLAG_MONO else "serif" if flags & FLAG_SERIF else "sans-serif"
+    attributes = [
+        f'x="{_fmt(x - ox)}"', f'y="{_fmt(span["origin"][1] - oy)}"',
+        f'font-size="{_fmt(span["size"])}"', f'font-family="{family}"',
+    ]
+    if not horizontal:
+        angle = math.degrees(math.atan2(sin, cos))
+        attributes.append(f'transform="rotate({_fmt(angle)} {_fmt(x - ox)} {_fmt(span["origin"][1] - oy)})"')
+    if flags & FLAG_BOLD:
+        attributes.append('font-weight="bold"')
+    if flags & FLAG_ITALIC:
+        attributes.append('font-style="italic"')
+    if span.get("color"):
+        attributes.append(f'fill="{_color(span["color"])}"')
+    # Trimmed text is narrower than the span's box only by its outer spaces
+    if text == span["text"]:
+        length = abs((x1 - x0) * cos) + abs((y1 - y0) * sin)
+        attributes.append(f'textLength="{_fmt(length)}" lengthAdjust="spacingAndGlyphs"')
+    return f"<text {' '.join(attributes)}>{escape(text)}</text>"
+
+
+def clip_to_svg(page, clip, drawings=None, text=None):
+    """
+    Write the vector content of a page region as an SVG document.
+
+    Args:
+        page: fitz.Page
+        clip: fitz.Rect in PDF points
+        drawings: page.get_drawings(), when the caller caches it per page
+        text: The page's text dict (engine.text_dict); read from the page if None
+
+    Returns:
+        SVG text
+    """
+    origin = (clip.x0, clip.y0)
+    elements = []
+
+    # Consecutive drawings with the same style share one <path>
+    style, data = None, []
+    for drawing in page.get_drawings() if drawings is None else drawings:
+        if not _touches(tuple(drawing["rect"]), clip):
+            continue
+        drawing_style = path_style(drawing)
+        if drawing_style != style and data:
+            elements.append(f'<path {style} d="{"".join(data)}"/>')
+            data = []
+        style = drawing_style
+        data.append(path_data(drawing["items"], origin))
+    if data:
+        elements.append(f'<path {style} d="{"".join(data)}"/>')
+
+    text = text or page.get_text("dict")
+    for block in text["blocks"]:
+        if block.get("type") != 0 or not _touches(block["bbox"], clip):
+            continue
+        for line in block["lines"]:
+            for span in line["spans"]:
+                if _touches(span["bbox"], clip):
+                    element = text_element(span, origin, line.get("dir", (1, 0)))
+                    if element:
+                        elements.append(element)
+
+    width, height = _fmt(clip.width), _fmt(clip.height)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'width="{width}" height="{height}">'
+        f'<rect width="100%" height="100%" fill="#fff"/>'
+        + "".join(elements) + "</svg>\n"
+    )
+
+
+def write_svg(svg, output_path):
+    """Write SVG text atomically, like image_codec.save_atomic()."""
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tmp_path = os.path.join(output_dir, f".{os.path.basename(output_path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(svg)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a page region as a minimal SVG.")
+    parser.add_argument("pdf")
+    parser.add_argument("page", type=int, help="Page number (0-indexed)")
+    parser.add_argument("rect", nargs=4, type=float, help="left top right bottom, as fractions of the page")
+    parser.add_argument("--output", default="crop.svg")
+    args = parser.parse_args()
+
+    # Imported here: the engine imports this module for extract_svg()
+    from extract_engine import clip_rect
+
+    with fitz.open(args.pdf) as doc:
+        page = doc[args.page]
+        clip = clip_rect(page.rect, args.rect)
+        if not is_vector_clip(page, clip):
+            raise SystemExit("✗ The region contains a raster image (scanned page); use extract.py")
+        svg = clip_to_svg(page, clip)
+    write_svg(svg, args.output)
+    print(f"✓ {args.output} ({len(svg.encode()) / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()